@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+
+"""Analyses of the control flow graph (cfg.CFG): predecessors, dominators,
+dominance frontiers and natural loops. The basic blocks are identified by their position in
+the CFG, and the results are lists indexed by it.
+A CFG usually holds a single function, but the graph can have more than one
+entry: besides the first block of each function (CFG.entries), every block
+with no predecessors is dominated only by itself. The entry blocks hang from
+a virtual root, which is None in the results."""
+
+
+def block_index(cfg):
+    """BasicBlock -> its position in the CFG"""
+    return {bb: i for i, bb in enumerate(cfg)}
+
+
+def successors(cfg, index=None):
+    """block -> list of its successors"""
+    if index is None:
+        index = block_index(cfg)
+    res = []
+    for bb in cfg:
+        succ = []
+        for s in bb.succ():
+            if index[s] not in succ:
+                succ.append(index[s])
+        res.append(succ)
+    return res
+
+
+def predecessors(succ):
+    """block -> list of its predecessors, from the lists of successors"""
+    res = [[] for s in succ]
+    for b, bsucc in enumerate(succ):
+        for s in bsucc:
+            res[s].append(b)
+    return res
+
+
+def depth_first_order(succ, preds, roots=()):
+    """The entry blocks, and the blocks in post-order of a depth first visit
+    from them: the roots first, then the blocks without predecessors. A cycle
+    not reachable from any of them gets an entry of its own, so that every
+    block is visited"""
+    entries = []
+    order = []
+    visited = [False] * len(succ)
+    candidates = list(roots) + [b for b in range(len(succ)) if not preds[b]] + list(range(len(succ)))
+    for root in candidates:
+        if visited[root]:
+            continue
+        entries.append(root)
+        visited[root] = True
+        stack = [(root, iter(succ[root]))]
+        while stack:
+            b, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+                order.append(b)
+            elif not visited[child]:
+                visited[child] = True
+                stack.append((child, iter(succ[child])))
+    return entries, order
+
+
+class Dominators(object):
+    """Dominator analysis, with the algorithm of Cooper, Harvey and Kennedy
+    ("A Simple, Fast Dominance Algorithm"). idom[b] is the immediate
+    dominator of block b, None for the entry blocks; index maps each
+    BasicBlock to its position."""
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.index = block_index(cfg)
+        self.succ = successors(cfg, self.index)
+        self.preds = predecessors(self.succ)
+        roots = [self.index[bb] for bb in cfg.entries.values()]
+        self.entries, postorder = depth_first_order(self.succ, self.preds, roots)
+        self.rpo = postorder[::-1]
+
+        n = len(self.succ)
+        root = n  # the virtual root, after every block in post-order
+        number = [0] * (n + 1)
+        for i, b in enumerate(postorder):
+            number[b] = i
+        number[root] = n
+        idom = [None] * (n + 1)
+        for e in self.entries:
+            idom[e] = root
+
+        def intersect(a, b):
+            while a != b:
+                while number[a] < number[b]:
+                    a = idom[a]
+                while number[b] < number[a]:
+                    b = idom[b]
+            return a
+
+        entries = set(self.entries)
+        changed = True
+        while changed:
+            changed = False
+            for b in self.rpo:
+                if b in entries:
+                    continue
+                new = None
+                for p in self.preds[b]:
+                    if idom[p] is not None:
+                        new = p if new is None else intersect(p, new)
+                if idom[b] != new:
+                    idom[b] = new
+                    changed = True
+        self.idom = [None if d == root else d for d in idom[:n]]
+
+    def children(self):
+        """The dominator tree: block -> the blocks it immediately dominates"""
+        res = [[] for b in self.idom]
+        for b in self.rpo:
+            if self.idom[b] is not None:
+                res[self.idom[b]].append(b)
+        return res
+
+    def dominates(self, a, b):
+        """Whether block a dominates block b"""
+        while b is not None:
+            if a == b:
+                return True
+            b = self.idom[b]
+        return False
+
+    def frontiers(self):
+        """Dominance frontier of each block, as a set of blocks. An entry
+        block is also reached from the virtual root, so with a single
+        predecessor (e.g. a loop right at the start of a procedure) it is
+        already a join point"""
+        df = [set() for b in self.idom]
+        entries = set(self.entries)
+        for b, preds in enumerate(self.preds):
+            if len(preds) + (b in entries) < 2:
+                continue
+            for p in preds:
+                runner = p
+                while runner is not None and runner != self.idom[b]:
+                    df[runner].add(b)
+                    runner = self.idom[runner]
+        return df
+
+
+class Loop(object):
+    """A natural loop: the header, the blocks of the loop (header included)
+    and the latches, i.e. the blocks with a back edge to the header. parent is
+    the innermost loop containing this one, None for an outermost loop;
+    depth is 1 for an outermost loop."""
+
+    def __init__(self, header):
+        self.header = header
+        self.blocks = {header}
+        self.latches = []
+        self.parent = None
+        self.children = []
+        self.depth = 1
+
+    def __repr__(self):
+        return 'Loop(header BB' + repr(self.header) + ', ' + repr(len(self.blocks)) + ' blocks, depth ' + \
+               repr(self.depth) + ')'
+
+
+class LoopNest(object):
+    """The natural loops of a CFG, from its Dominators. The back edges to the
+    same header make a single loop, so two loops are either nested or
+    disjoint. loops are sorted outer first; loop_of[b] is the innermost loop
+    containing block b and depth[b] its depth (0 outside of any loop)."""
+
+    def __init__(self, dom):
+        headers = {}
+        for b in dom.rpo:
+            for h in dom.succ[b]:
+                if dom.dominates(h, b):
+                    if h not in headers:
+                        headers[h] = Loop(h)
+                    loop = headers[h]
+                    loop.latches.append(b)
+                    # the blocks reaching the latch without going through the header
+                    work = [b]
+                    while work:
+                        x = work.pop()
+                        if x not in loop.blocks:
+                            loop.blocks.add(x)
+                            work.extend(dom.preds[x])
+
+        position = {b: i for i, b in enumerate(dom.rpo)}
+        self.loops = sorted(headers.values(), key=lambda l: (-len(l.blocks), position[l.header]))
+        self.loop_of = [None] * len(dom.idom)
+        self.depth = [0] * len(dom.idom)
+        for loop in self.loops:  # outer loops first, so the inner ones overwrite them
+            loop.parent = self.loop_of[loop.header]
+            if loop.parent is not None:
+                loop.parent.children.append(loop)
+                loop.depth = loop.parent.depth + 1
+            for b in loop.blocks:
+                self.loop_of[b] = loop
+                self.depth[b] = loop.depth
+
+    def __len__(self):
+        return len(self.loops)
+
+    def __iter__(self):
+        return iter(self.loops)
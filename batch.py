@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+"""Batch compiler driver. Compiles many programs in parallel, using a pool of
+worker processes so that interpreter startup and imports are paid once per
+worker instead of once per file.
+Usage: batch.py [-j JOBS] [-o OUTDIR] FILE_OR_DIRECTORY...
+Every directory is searched for *.pl0 files; the assembly of src/foo.pl0 is
+written to OUTDIR/foo.s, so two files with the same name in different
+directories are refused."""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+
+def collect_sources(paths):
+    """Expand directories into the list of *.pl0 files they contain. A file
+    given more than once (e.g. also through its directory) is listed once"""
+    res = []
+    seen = set()
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith('.pl0'))
+        else:
+            files = [path]
+        for f in files:
+            if os.path.realpath(f) not in seen:
+                seen.add(os.path.realpath(f))
+                res.append(f)
+    return res
+
+
+def output_name(source, outdir):
+    return os.path.join(outdir, os.path.splitext(os.path.basename(source))[0] + '.s')
+
+
+def check_outputs(sources, outdir):
+    """Raise ValueError if two sources would be compiled to the same output
+    file, i.e. if they have the same name in different directories"""
+    outputs = {}
+    for source in sources:
+        other = outputs.setdefault(output_name(source, outdir), source)
+        if other != source:
+            raise ValueError('{} and {} would both be compiled to {}'.format(
+                other, source, output_name(source, outdir)))
+
+
+def compile_one(job):
+    """Worker: compile a single file. Never raises, the outcome is reported in
+    the returned dictionary"""
+    source, outdir, cache_dir = job
+    from main import compile_cached
+    from cache import CompileCache
+    from lexer import read_source
+
+    output = output_name(source, outdir)
+    cache = CompileCache(cache_dir) if cache_dir else None
+    start = time.perf_counter()
+    try:
+        code = compile_cached(read_source(source), cache)
+        with open(output, 'w') as outf:
+            outf.write(code)
+        error = None
+    except Exception as e:
+        error = type(e).__name__ + ': ' + str(e)
+    return {'source': source, 'output': output, 'ok': error is None, 'error': error,
+            'time': time.perf_counter() - start, 'cached': bool(cache and cache.hits and not cache.misses)}
+
+
+def compile_batch(sources, outdir, jobs=None, cache_dir=None):
+    """Compile all the sources with a pool of jobs processes (default: one per
+    core). Yields the result of each file, in the same order as sources.
+    The workers share the compile cache in cache_dir, if given.
+    See check_outputs() for the ValueError raised before compiling anything."""
+    check_outputs(sources, outdir)
+    os.makedirs(outdir, exist_ok=True)
+    jobs = jobs or os.cpu_count() or 1
+    # send files in chunks, to amortize the communication with the workers
+    chunksize = max(1, len(sources) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        yield from pool.map(compile_one, [(s, outdir, cache_dir) for s in sources], chunksize=chunksize)
+
+
+def batch_main():
+    argp = argparse.ArgumentParser(description="PL/0 batch compiler")
+    argp.add_argument("sources", nargs="+", metavar="FILE_OR_DIRECTORY")
+    argp.add_argument("-o", dest="outdir", default="obj", help="output directory (default: obj)")
+    argp.add_argument("-j", dest="jobs", type=int, default=None,
+                      help="number of worker processes (default: number of cores)")
+    argp.add_argument("--cache-dir", metavar="DIR", default=os.environ.get("PL0_CACHE_DIR"),
+                      help="compile cache shared by the workers (default: $PL0_CACHE_DIR)")
+    args = argp.parse_args()
+
+    sources = collect_sources(args.sources)
+    try:
+        check_outputs(sources, args.outdir)
+    except ValueError as e:
+        print('error:', e, file=sys.stderr)
+        return 2
+    start = time.perf_counter()
+    nfail = 0
+    cputime = 0.0
+    for res in compile_batch(sources, args.outdir, args.jobs, args.cache_dir):
+        cputime += res['time']
+        if res['ok']:
+            print('{} {:8.3f}s {} -> {}'.format('hit ' if res['cached'] else 'ok  ', res['time'],
+                                               res['source'], res['output']))
+        else:
+            nfail += 1
+            print('FAIL {:8.3f}s {}: {}'.format(res['time'], res['source'], res['error']))
+    elapsed = time.perf_counter() - start
+    print('{} files, {} failed, {:.3f}s compiling, {:.3f}s wall clock'.format(
+        len(sources), nfail, cputime, elapsed))
+    return 1 if nfail else 0
+
+
+if __name__ == "__main__":
+    sys.exit(batch_main())
@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+
+"""Benchmarks for the compiler.
+Usage: bench.py <benchmark> [arguments]
+Every benchmark works on synthetic PL/0 programs produced by generate_program,
+so that the numbers can be compared across versions of the compiler."""
+
+import os
+import random
+import sys
+import time
+
+
+def generate_statement(rnd, names, depth=0):
+    """Random statement using only the subset of PL/0 that the compiler
+    actually handles"""
+    v = rnd.choice(names)
+    k = rnd.randrange(6 if depth < 2 else 3)
+    if k == 0:
+        return v + " := " + rnd.choice(names) + " + " + repr(rnd.randrange(300))
+    if k == 1:
+        return v + " := x * " + repr(rnd.randrange(1, 9)) + " - y / 3"
+    if k == 2:
+        return "print " + v
+    if k == 3:
+        return "if " + v + " < " + repr(rnd.randrange(50)) + " then " + \
+               generate_statement(rnd, names, depth + 1) + " else " + \
+               generate_statement(rnd, names, depth + 1)
+    if k == 4:
+        return "while " + v + " > " + repr(rnd.randrange(9)) + " do begin " + \
+               generate_statement(rnd, names, depth + 1) + "; " + v + " := " + v + " - 1 end"
+    return "begin " + generate_statement(rnd, names, depth + 1) + "; " + \
+           generate_statement(rnd, names, depth + 1) + " end"
+
+
+def generate_program(nstats, nprocs=0, seed=0):
+    """Generate a program with nprocs procedures, each one (and the main body)
+    containing nstats top level statements"""
+    rnd = random.Random(seed)
+    out = ["VAR x, y, z;"]
+    for p in range(nprocs):
+        local = ["a" + repr(p), "b" + repr(p)]
+        out.append("PROCEDURE p" + repr(p) + "(q" + repr(p) + ")")
+        out.append("VAR " + ", ".join(local) + ";")
+        body = [generate_statement(rnd, ["x", "y", "z"] + local) for i in range(nstats)]
+        out.append("BEGIN\n  " + ";\n  ".join(body) + "\nEND")
+    body = ["x := 1"] + ["call p" + repr(p) for p in range(nprocs)] + ["y := 2"]
+    body += [generate_statement(rnd, ["x", "y", "z"]) for i in range(nstats)]
+    out.append("BEGIN\n  " + ";\n  ".join(body) + "\nEND.")
+    return "\n".join(out) + "\n"
+
+
+def generate_source_of_size(megabytes, seed=0):
+    """Generate a syntactically valid program of (at least) the given size"""
+    nstats = 1000
+    text = generate_program(nstats, seed=seed)
+    while len(text) < megabytes * 1024 * 1024:
+        nstats *= 2
+        text = generate_program(nstats, seed=seed)
+    return text
+
+
+def bench_lexer(megabytes="4"):
+    """Lexer throughput on a multi-megabyte source"""
+    import lexer
+
+    text = generate_source_of_size(float(megabytes))
+    start = time.perf_counter()
+    ntokens = 0
+    for t in lexer.Lexer(text).tokens():
+        ntokens += 1
+    elapsed = time.perf_counter() - start
+    mb = len(text) / (1024 * 1024)
+    print('lexer: {:.2f} MB, {} tokens in {:.3f} s ({:.2f} MB/s, {:.0f} tokens/s)'.format(
+        mb, ntokens, elapsed, mb / elapsed, ntokens / elapsed))
+
+
+def lex_file(path, mapped):
+    import lexer
+
+    if mapped:
+        with lexer.MappedLexer.open(path) as lex:
+            for t in lex.tokens():
+                pass
+    else:
+        with open(path) as f:
+            for t in lexer.Lexer(f.read()).tokens():
+                pass
+
+
+def bench_mapped_lexer(megabytes="4"):
+    """Time and peak memory of lexing a file read in a str vs mapped with mmap"""
+    import os
+    import tempfile
+    import tracemalloc
+
+    fd, path = tempfile.mkstemp(suffix='.pl0')
+    with os.fdopen(fd, 'w') as f:
+        f.write(generate_source_of_size(float(megabytes)))
+    try:
+        for mapped in [False, True]:
+            start = time.perf_counter()
+            lex_file(path, mapped)
+            elapsed = time.perf_counter() - start
+            # tracemalloc slows everything down, so measure memory separately
+            tracemalloc.start()
+            lex_file(path, mapped)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print('{}: {:.3f} s, peak {:.2f} MB'.format(
+                'mmap' if mapped else 'read', elapsed, peak / (1024 * 1024)))
+    finally:
+        os.unlink(path)
+
+
+def bench_tracing(nstats="300", level="3"):
+    """Compile time with tracing disabled vs enabled (to /dev/null)"""
+    import os
+    import tracing
+    from main import compile_program
+
+    text = generate_program(int(nstats), nprocs=4)
+    with open(os.devnull, 'w') as devnull:
+        tracing.stream = devnull
+        for spec in ['all=0', 'all=' + level]:
+            tracing.set_levels(spec)
+            start = time.perf_counter()
+            compile_program(text)
+            elapsed = time.perf_counter() - start
+            print('tracing {}: {:.3f} s'.format(spec, elapsed))
+        tracing.disable()
+        tracing.stream = None
+
+
+def bench_memory(sizes="10000"):
+    """Memory used by the IR (bytes per node) and peak memory of the
+    compilation up to liveness analysis, for programs of the given numbers of
+    statements"""
+    import tracemalloc
+    import lexer
+    import parser
+    from context import CompilationContext
+    from datalayout import perform_data_layout
+    from ir import preorder
+    from units import split_units
+
+    for size in sizes.split(','):
+        # split in procedures of 100 statements, as real programs would be
+        text = generate_program(100, nprocs=max(0, int(size) // 100 - 1))
+        start = time.perf_counter()
+        tracemalloc.start()
+        ctx = CompilationContext()
+        program = parser.Parser(lexer.Lexer(text), ctx).program()
+        nodes = sum(1 for n in preorder(program))
+        parsed = tracemalloc.get_traced_memory()[0]
+        units = split_units(program, ctx)
+        for unit in units:
+            unit.lower()
+        lowered_nodes = sum(1 for n in preorder(program))
+        lowered = tracemalloc.get_traced_memory()[0]
+        perform_data_layout(program)
+        for unit in units:
+            unit.build_cfg().liveness()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print('{} statements: parsed {} nodes, {:.0f} bytes/node; lowered {} nodes, {:.0f} bytes/node; '
+              'with liveness {:.1f} MB, peak {:.1f} MB ({:.1f} s)'.format(
+                  size, nodes, parsed / nodes, lowered_nodes, lowered / lowered_nodes,
+                  current / (1024 * 1024), peak / (1024 * 1024), time.perf_counter() - start))
+        del program, units
+
+
+def bench_nodes(sizes="1000,10000,100000"):
+    """Time to collect all the nodes and all the StatLists of a tree, for
+    programs of the given numbers of statements (the time per node should
+    not grow with the size)"""
+    import lexer
+    import parser
+    from context import CompilationContext
+    from ir import StatList
+    from support import get_node_list
+
+    for size in sizes.split(','):
+        text = generate_program(100, nprocs=max(0, int(size) // 100 - 1))
+        program = parser.Parser(lexer.Lexer(text), CompilationContext()).program()
+        start = time.perf_counter()
+        nodes = len(get_node_list(program))
+        all_time = time.perf_counter() - start
+        start = time.perf_counter()
+        statlists = len(get_node_list(program, StatList))
+        statlist_time = time.perf_counter() - start
+        print('{} statements: {} nodes in {:.3f} s ({:.0f} ns/node), {} StatLists in {:.3f} s ({:.0f} ns/node)'.format(
+            size, nodes, all_time, all_time / nodes * 1e9, statlists, statlist_time, statlist_time / nodes * 1e9))
+
+
+def bench_lowering(sizes="1000,4000,16000"):
+    """Time to lower a single procedure of the given numbers of statements
+    (the time per statement should not grow with the size)"""
+    import lexer
+    import parser
+    from context import CompilationContext
+    from support import count_nodes
+    from units import split_units
+
+    for size in sizes.split(','):
+        text = generate_program(int(size))
+        ctx = CompilationContext()
+        program = parser.Parser(lexer.Lexer(text), ctx).program()
+        unit = split_units(program, ctx)[0]
+        start = time.perf_counter()
+        unit.lower()
+        lower_time = time.perf_counter() - start
+        print('{} statements: lowering {:.3f} s ({:.1f} us/stat), {} nodes after lowering'.format(
+            size, lower_time, lower_time / int(size) * 1e6, count_nodes(unit.root())))
+
+
+def bench_tac(sizes="2000,10000"):
+    """Time, allocated memory and allocated blocks of the backend analyses
+    (CFG, liveness, register allocation) on the Stat objects and on the
+    three-address code of tac.py, for programs of the given numbers of
+    statements"""
+    import tracemalloc
+    import lexer
+    import parser
+    from context import CompilationContext
+    from datalayout import perform_data_layout
+    from units import split_units
+
+    for size in sizes.split(','):
+        text = generate_program(100, nprocs=max(0, int(size) // 100 - 1))
+        for tac in (False, True):
+            ctx = CompilationContext()
+            program = parser.Parser(lexer.Lexer(text), ctx).program()
+            units = split_units(program, ctx)
+            for unit in units:
+                unit.lower()
+            perform_data_layout(program)
+            start = time.perf_counter()
+            tracemalloc.start()
+            snapshot = tracemalloc.take_snapshot()
+            for unit in units:
+                unit.build_cfg(tac).liveness()
+                unit.allocate_registers(11)
+            stats = tracemalloc.take_snapshot().compare_to(snapshot, 'filename')
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            elapsed = time.perf_counter() - start
+            start = time.perf_counter()
+            for unit in units:
+                unit.build_cfg(tac).liveness()
+                unit.allocate_registers(11)
+            untraced = time.perf_counter() - start
+            print('{} statements, {}: {:.3f} s, {:.1f} MB retained, {:.1f} MB peak, {} blocks allocated '
+                  '(traced: {:.1f} s)'.format(size, 'tac' if tac else 'stat', untraced,
+                                              sum(s.size_diff for s in stats) / (1024 * 1024),
+                                              peak / (1024 * 1024), sum(s.count_diff for s in stats), elapsed))
+
+
+def bench_serialize(sizes="2000,10000"):
+    """Time and size of dumping and loading the lowered units (serialize.py),
+    compared with parsing, lowering and laying out the source again, for
+    programs of the given numbers of statements"""
+    import lexer
+    import parser
+    from context import CompilationContext
+    from datalayout import perform_data_layout
+    from serialize import dump_unit, load_unit
+    from units import split_units
+
+    for size in sizes.split(','):
+        text = generate_program(100, nprocs=max(0, int(size) // 100 - 1))
+        start = time.perf_counter()
+        ctx = CompilationContext()
+        program = parser.Parser(lexer.Lexer(text), ctx).program()
+        units = split_units(program, ctx)
+        for unit in units:
+            unit.lower()
+        perform_data_layout(program)
+        frontend = time.perf_counter() - start
+        start = time.perf_counter()
+        blobs = [dump_unit(unit) for unit in units]
+        dump = time.perf_counter() - start
+        start = time.perf_counter()
+        for blob in blobs:
+            load_unit(blob)
+        load = time.perf_counter() - start
+        print('{} statements: frontend {:.3f} s, dump {:.3f} s, load {:.3f} s, {:.1f} KB ({:.1f} bytes per '
+              'statement)'.format(size, frontend, dump, load, sum(map(len, blobs)) / 1024,
+                                  sum(map(len, blobs)) / int(size)))
+
+
+def bench_cfg(sizes="1000,4000,16000"):
+    """Time to build the CFG of a single procedure of the given numbers of
+    statements (the time per block should not grow with the size)"""
+    import lexer
+    import parser
+    from context import CompilationContext
+    from datalayout import perform_data_layout
+    from units import split_units
+
+    for size in sizes.split(','):
+        text = generate_program(int(size))
+        ctx = CompilationContext()
+        program = parser.Parser(lexer.Lexer(text), ctx).program()
+        unit = split_units(program, ctx)[0]
+        unit.lower()
+        perform_data_layout(program)
+        start = time.perf_counter()
+        cfg = unit.build_cfg()
+        heads = cfg.heads()
+        cfg_time = time.perf_counter() - start
+        print('{} statements: {} blocks, {} entries in {:.3f} s ({:.1f} us/block)'.format(
+            size, len(cfg), len(heads), cfg_time, cfg_time / len(cfg) * 1e6))
+
+
+def bench_parallel(nprocs="16", nstats="500", jobs="1,2,4"):
+    """Wall clock time of compiling a program of nprocs procedures of nstats
+    statements each, with the backend in the given numbers of worker
+    processes (1: in the main process)"""
+    from main import compile_program
+
+    text = generate_program(int(nstats), nprocs=int(nprocs))
+    serial = None
+    for n in jobs.split(','):
+        start = time.perf_counter()
+        code = compile_program(text, jobs=int(n))
+        elapsed = time.perf_counter() - start
+        if serial is None:
+            serial = code, elapsed
+        elif code != serial[0]:
+            raise RuntimeError('the code generated with {} jobs is different'.format(n))
+        print('{} procedures of {} statements, {} jobs: {:.3f} s ({:.2f}x), {} cores'.format(
+            nprocs, nstats, n, elapsed, serial[1] / elapsed, os.cpu_count()))
+
+
+def sweep_liveness(cfg):
+    """The liveness analysis CFG.liveness() replaced: sets of symbols, all
+    the blocks visited again until nothing changes. Returns the number of
+    blocks visited"""
+    for bb in cfg:
+        bb.gen, bb.kill = set(), set()
+        for i in bb.instrs:
+            bb.gen |= set(i.collect_uses()) - bb.kill
+            bb.kill |= set(i.collect_kills())
+        bb.live_in, bb.live_out = set(), set()
+    visits = 0
+    changed = True
+    while changed:
+        changed = False
+        for bb in cfg:
+            visits += 1
+            lin, lout = len(bb.live_in), len(bb.live_out)
+            if bb.succ():
+                bb.live_out = set().union(*[s.live_in for s in bb.succ()])
+            elif bb.get_function() != 'global':
+                bb.live_out = set(bb.get_function().get_global_symbols())
+            bb.live_in = bb.gen | (bb.live_out - bb.kill)
+            changed |= lin != len(bb.live_in) or lout != len(bb.live_out)
+    for bb in cfg:
+        bb.compute_instr_level_liveness()
+    return visits
+
+
+def bench_liveness(sizes="1000,4000,16000"):
+    """Blocks visited and time of the liveness analysis of a single
+    procedure of the given numbers of statements, with sets swept until
+    nothing changes (the old algorithm) and with the worklist on bitsets of
+    CFG.liveness()"""
+    import gc
+    import lexer
+    import parser
+    from context import CompilationContext
+    from datalayout import perform_data_layout
+    from units import split_units
+
+    for size in sizes.split(','):
+        text = generate_program(int(size))
+        ctx = CompilationContext()
+        program = parser.Parser(lexer.Lexer(text), ctx).program()
+        unit = split_units(program, ctx)[0]
+        unit.lower()
+        perform_data_layout(program)
+        cfg = unit.build_cfg().functions[0]  # the main program
+        gc.collect()
+        start = time.perf_counter()
+        visits = sweep_liveness(cfg)
+        sweep = time.perf_counter() - start
+        start = time.perf_counter()
+        cfg.liveness()
+        worklist = time.perf_counter() - start
+        print('{} statements, {} blocks, {} variables live across blocks: sets {:.3f} s ({} visits), bitsets {:.3f} s '
+              '({} visits)'.format(size, len(cfg), len(cfg.symbols), sweep, visits, worklist, cfg.liveness_visits))
+
+
+# maximum time for importing the compiler (main.py), in milliseconds
+IMPORT_BUDGET_MS = 25
+
+
+def import_times(module, runs):
+    """Cumulative import time in ms (median over runs) of module and of every
+    module it imports, measured with python -X importtime in a new process.
+    The bytecode is cached in a temporary directory, and a first run fills the
+    cache: this is the cost paid by every invocation of the compiler."""
+    import os
+    import statistics
+    import subprocess
+    import tempfile
+
+    srcdir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    samples = {}
+    with tempfile.TemporaryDirectory() as pycache:
+        cmd = [sys.executable, '-X', 'importtime', '-X', 'pycache_prefix=' + pycache, '-c', 'import ' + module]
+        for i in range(runs + 1):
+            res = subprocess.run(cmd, cwd=srcdir, env=env, stderr=subprocess.PIPE,
+                                 universal_newlines=True, check=True)
+            if i == 0:
+                continue
+            # import time: self [us] | cumulative | imported package
+            for line in res.stderr.splitlines():
+                fields = line.split('|')
+                if not line.startswith('import time:') or len(fields) != 3 or 'cumulative' in line:
+                    continue
+                samples.setdefault(fields[2].strip(), []).append(int(fields[1]) / 1000)
+    return {name: statistics.median(t) for name, t in samples.items()}
+
+
+def bench_importtime(budget=str(IMPORT_BUDGET_MS), runs="9"):
+    """Import time of the compiler; fails if it is over budget (in ms)"""
+    import os
+
+    times = import_times('main', int(runs))
+    srcdir = os.path.dirname(os.path.abspath(__file__))
+    ours = [f[:-3] for f in os.listdir(srcdir) if f.endswith('.py')]
+    for name, t in sorted(times.items(), key=lambda x: -x[1])[:15]:
+        print('{:8.2f} ms  {}{}'.format(t, name, ' *' if name in ours else ''))
+    total = times['main']
+    print('importing main: {:.2f} ms (budget {} ms)'.format(total, budget))
+    if total > float(budget):
+        print('over budget!')
+        sys.exit(1)
+
+
+BENCHMARKS = {
+    'lexer': bench_lexer,
+    'lexer-mmap': bench_mapped_lexer,
+    'tracing': bench_tracing,
+    'importtime': bench_importtime,
+    'memory': bench_memory,
+    'nodes': bench_nodes,
+    'lowering': bench_lowering,
+    'tac': bench_tac,
+    'serialize': bench_serialize,
+    'cfg': bench_cfg,
+    'parallel': bench_parallel,
+    'liveness': bench_liveness,
+}
+
+
+def usage():
+    print(__doc__)
+    print('Available benchmarks:')
+    for name, fun in BENCHMARKS.items():
+        print('  ' + name + ': ' + fun.__doc__)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        usage()
+        sys.exit(1)
+    BENCHMARKS[sys.argv[1]](*sys.argv[2:])
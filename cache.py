@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+
+"""Content-addressed on-disk cache of generated assembly.
+The key of an entry is the hash of the source text, of the compiler version
+(i.e. of the sources of the compiler itself) and of the options that affect the
+generated code. Entries are written atomically (write to a temporary file, then
+rename), so any number of processes can share the same cache directory; the
+total size is bounded by evicting the least recently used entries.
+Usage: cache.py stats|clear DIRECTORY"""
+
+import fcntl
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+from contextlib import contextmanager
+
+# bump when the layout of the cache changes
+CACHE_FORMAT = 1
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+_compiler_version = None
+
+# "import x, y" or "from x import ...", also inside functions
+_IMPORT = re.compile(r'^[ \t]*(?:from[ \t]+(\w+)[ \t]+import|import[ \t]+(\w+(?:[ \t]*,[ \t]*\w+)*))', re.MULTILINE)
+
+
+def compiler_modules():
+    """The modules of this directory that main imports, directly or through
+    other modules, at startup or on demand: all those that can change the
+    generated code. The drivers, benchmarks and tools are left out, unless
+    the compiler imports them"""
+    srcdir = os.path.dirname(os.path.abspath(__file__))
+    found = set()
+    todo = ['main']
+    while todo:
+        name = todo.pop()
+        path = os.path.join(srcdir, name + '.py')
+        if name in found or not os.path.isfile(path):
+            continue
+        found.add(name)
+        with open(path, 'r', encoding='utf-8') as f:
+            for frm, imports in _IMPORT.findall(f.read()):
+                todo += [frm] if frm else [m.strip() for m in imports.split(',')]
+    return sorted(found)
+
+
+def compiler_version():
+    """Hash of the sources of the compiler (see compiler_modules()). Any
+    change to the compiler invalidates the whole cache, which is conservative
+    but always correct."""
+    global _compiler_version
+    if _compiler_version is None:
+        h = hashlib.sha256(repr(CACHE_FORMAT).encode())
+        srcdir = os.path.dirname(os.path.abspath(__file__))
+        for name in compiler_modules():
+            with open(os.path.join(srcdir, name + '.py'), 'rb') as f:
+                h.update(name.encode() + b'\0' + f.read() + b'\0')
+        _compiler_version = h.hexdigest()
+    return _compiler_version
+
+
+class CompileCache(object):
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, source, options=None):
+        """source can be a str or any bytes-like object (e.g. an mmap). A
+        source file read by lexer.read_source() has the same key as its
+        mmap"""
+        h = hashlib.sha256(compiler_version().encode())
+        h.update(json.dumps(options or {}, sort_keys=True).encode() + b'\0')
+        h.update(source.encode('utf-8', 'surrogateescape') if isinstance(source, str) else source)
+        return h.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.s')
+
+    def get(self, key):
+        """Return the cached assembly, or None"""
+        path = self.path(key)
+        try:
+            with open(path, 'r') as f:
+                code = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            self.update_stats(misses=1)
+            return None
+        try:
+            os.utime(path)  # most recently used
+        except FileNotFoundError:
+            pass  # evicted in the meantime by someone else
+        self.hits += 1
+        self.update_stats(hits=1)
+        return code
+
+    def put(self, key, code, evict=True):
+        """Store an entry. With evict=False, the caller is expected to call
+        evict() after storing a batch of entries"""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(code)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        if evict:
+            self.evict()
+
+    def entries(self):
+        """(last use, size, path) of every entry"""
+        res = []
+        for sub in os.listdir(self.directory):
+            subdir = os.path.join(self.directory, sub)
+            if not os.path.isdir(subdir):
+                continue
+            for name in os.listdir(subdir):
+                if not name.endswith('.s'):
+                    continue
+                path = os.path.join(subdir, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                res.append((st.st_mtime, st.st_size, path))
+        return res
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in
+        max_bytes"""
+        with self.locked():
+            entries = self.entries()
+            total = sum(e[1] for e in entries)
+            if total <= self.max_bytes:
+                return 0
+            entries.sort()
+            evicted = 0
+            for mtime, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                evicted += 1
+        self.update_stats(evictions=evicted)
+        return evicted
+
+    def clear(self):
+        with self.locked():
+            for mtime, size, path in self.entries():
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+    @contextmanager
+    def locked(self):
+        """Exclusive lock on the whole cache, for eviction and statistics"""
+        with open(os.path.join(self.directory, 'lock'), 'w') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def stats(self):
+        """Statistics accumulated by all the processes using this cache"""
+        try:
+            with open(os.path.join(self.directory, 'stats.json'), 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def update_stats(self, **deltas):
+        with self.locked():
+            stats = self.stats()
+            for k, v in deltas.items():
+                stats[k] = stats.get(k, 0) + v
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(stats, f)
+            os.replace(tmp, os.path.join(self.directory, 'stats.json'))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] not in ('stats', 'clear'):
+        print(__doc__)
+        sys.exit(1)
+    cache = CompileCache(sys.argv[2])
+    if sys.argv[1] == 'clear':
+        cache.clear()
+    stats = cache.stats()
+    entries = cache.entries()
+    print('entries: {}, size: {} bytes'.format(len(entries), sum(e[1] for e in entries)))
+    print('hits: {hits}, misses: {misses}, evictions: {evictions}'.format(
+        **{'hits': 0, 'misses': 0, 'evictions': 0, **stats}))
@@ -3,51 +3,50 @@
 __doc__ = '''Control Flow Graph implementation
 Includes cfg construction and liveness analysis.'''
 
-from functools import reduce
+from ir import BranchStat, BinStat, UnaryStat, LoadStat
+from support import iter_nodes, Visitor
+from tracing import tracer
 
-from support import get_node_list
+_trace = tracer('cfg')
 
 
 class BasicBlock(object):
+    __slots__ = ('next', 'instrs', 'target', 'labels', 'target_bb', 'preds', 'live_in', 'live_out', 'kill', 'gen',
+                 'total_vars_used')
+
     def __init__(self, next=None, instrs=None, labels=None):
         """Structure:
         Zero, one (next) or two (next, target_bb) successors
         Keeps information on labels (list of labels that refer to this BB)
+        and on the predecessors (preds, filled by CFG)
         """
         self.next = next
         if instrs:
             self.instrs = instrs
         else:
             self.instrs = []
-        try:
-            self.target = self.instrs[-1].target # exclude case with call as last instruction
-        except Exception:
+        last = self.instrs[-1] if self.instrs else None
+        if isinstance(last, BranchStat) and not last.returns:  # a call is not an edge
+            self.target = last.target
+        else:
             self.target = None
         if labels:
             self.labels = labels
         else:
             self.labels = []
         self.target_bb = None
+        self.preds = []
 
         # liveness in respect to the whole cfg
         self.live_in = set([])
         self.live_out = set([])
 
-        # compute kill and gen set for this block, as if it was a black box
-        self.kill = set([])  # assigned
-        self.gen = set([])  # use before assign
-        for i in instrs:
-            uses = set(i.collect_uses())
-            try:
-                kills = set(i.collect_kills())
-            except AttributeError:
-                kills = set()
-            #print(i.human_repr(), uses, kills)
-            uses.difference_update(self.kill)
-            self.gen.update(uses)
-            self.kill |= kills
+        # the variables assigned (kill) and used before being assigned (gen)
+        # in this block, as if it was a black box; computed by CFG.liveness()
+        self.kill = set([])
+        self.gen = set([])
         # Total number of registers needed
-        self.total_vars_used = len(self.gen.union(self.kill))
+        self.total_vars_used = 0
 
     def __repr__(self):
         """Print in graphviz dot format"""
@@ -67,31 +66,20 @@ class BasicBlock(object):
     def succ(self):
         return [s for s in [self.target_bb, self.next] if s]
 
-    def liveness_iteration(self):
-        """Compute live_in and live_out approximation
-        Returns: check of fixed point"""
-        lin = len(self.live_in)
-        lout = len(self.live_out)
-        if self.next or self.target_bb:
-            self.live_out = reduce(lambda x, y: x.union(y), [s.live_in for s in self.succ()], set([]))
-        else:  # Consider live out all the global vars
-            func = self.get_function()
-            if func != 'global':
-                self.live_out = set(func.get_global_symbols())
-        self.live_in = self.gen.union(self.live_out - self.kill)
-        return not (lin == len(self.live_in) and lout == len(self.live_out))
-
     def compute_instr_level_liveness(self):
-        """Compute live_in and live_out for each instruction"""
-        currently_alive = self.live_out
+        """Compute live_in and live_out for each instruction.
+        The live_out set of an instruction is the live_in set of the next one:
+        the same set object is shared between the two, so these sets must not
+        be modified in place."""
+        currently_alive = set(self.live_out)
         for i in reversed(self.instrs):
-            i.live_out = set(currently_alive)
+            i.live_out = currently_alive
             try:
-                currently_alive -= set(i.collect_kills())
+                currently_alive = currently_alive - set(i.collect_kills())
             except AttributeError:
-                pass
+                currently_alive = set(currently_alive)
             currently_alive |= set(i.collect_uses())
-            i.live_in = set(currently_alive)
+            i.live_in = currently_alive
         if not currently_alive == self.live_in:
             raise Exception('Instruction level liveness or block level liveness incorrect')
 
@@ -109,7 +97,6 @@ class BasicBlock(object):
 
 def stat_list_to_bb(sl):
     """Support function for converting AST StatList to BBs"""
-    from ir import BranchStat
     bbs = []
     newbb = []  # accumulator for stmts to be inserted in the next BB
     labels = []  # accumulator for the labels that refer to this BB
@@ -152,93 +139,528 @@ def remove_non_regs(set):
 
 
 class CFG(list):
-    """Control Flow Graph representation"""
+    """Control Flow Graph representation.
+    Usually the CFG of a single function (see function_cfgs()): then entry is
+    its first block, and exit is an empty block which is not in the list,
+    whose predecessors are the blocks leaving the function."""
 
-    def __init__(self, root):
+    def __init__(self, root, function=None):
+        """Build the basic blocks of all the StatLists under root (or of the
+        StatLists in root, if it is a list), in linear time: the labels are
+        looked up in a map, and the predecessors and the entry block of each
+        function are recorded along the way. function is the FunctionDef
+        (or 'global') all the StatLists belong to, if there is one"""
         super().__init__()
         from ir import StatList
-        stat_lists = [n for n in get_node_list(root) if isinstance(n, StatList)]
-        self += sum([stat_list_to_bb(sl) for sl in stat_lists], [])
+        self.function = function
+        self.label_bb = {}  # label -> the BasicBlock it refers to
+        self.entries = {}  # FunctionDef (or 'global') -> its first BasicBlock
+        stat_lists = root if isinstance(root, list) else iter_nodes(root, StatList)
+        for sl in stat_lists:
+            bbs = stat_list_to_bb(sl)
+            if bbs and bbs[0].instrs and bbs[0].get_function() not in self.entries:
+                self.entries[bbs[0].get_function()] = bbs[0]
+            for bb in bbs:
+                for label in bb.labels:
+                    self.label_bb[label] = bb
+            self += bbs
         for bb in self:
             if bb.target:
                 bb.target_bb = self.find_target_bb(bb.target)
             bb.remove_useless_next()
+        self.entry = self[0] if self else None
+        self.exit = BasicBlock()
+        for bb in self:
+            for s in bb.succ():
+                if bb not in s.preds:
+                    s.preds.append(bb)
+            if not bb.succ() and bb.instrs:
+                self.exit.preds.append(bb)
+        self._dominators = None
+        self._loops = None
+        self._dataflow = {}
+        self.symbols = []  # bit i of the bitsets of liveness() -> symbol
+        self.symbol_ids = {}
+        self.liveness_visits = 0
+
+    def dominators(self):
+        """analysis.Dominators of this CFG, computed on the first call. Call
+        invalidate() after changing the edges between the blocks"""
+        if self._dominators is None:
+            from analysis import Dominators
+            self._dominators = Dominators(self)
+        return self._dominators
+
+    def loops(self):
+        """analysis.LoopNest of this CFG, computed on the first call"""
+        if self._loops is None:
+            from analysis import LoopNest
+            self._loops = LoopNest(self.dominators())
+        return self._loops
+
+    def loop_depth(self, bb):
+        """How many loops contain the BasicBlock bb"""
+        return self.loops().depth[self.dominators().index[bb]]
+
+    def predecessors(self, bb):
+        """The BasicBlocks that branch or fall through to bb"""
+        return bb.preds
+
+    def dataflow(self, analysis):
+        """The DataFlow subclass analysis (e.g. ReachingDefinitions), solved on
+        this CFG on the first call"""
+        if analysis not in self._dataflow:
+            self._dataflow[analysis] = analysis(self).solve()
+        return self._dataflow[analysis]
+
+    def invalidate(self):
+        self._dominators = None
+        self._loops = None
+        self._dataflow = {}
 
     def heads(self):
-        """Get bbs that are only reached via function call or global entry point"""
-        defs = []
-        for bb1 in self:
-            head = True
-            for bb2 in self:
-                if bb2.next == bb1 or bb2.target_bb == bb1:
-                    head = False
-                    break
-            if head:
-                defs.append(bb1)
-        from ir import FunctionDef
-        res = {}
-        for bb in defs:
-            first = bb.instrs[0]
-            parent = first.parent
-            while parent and type(parent) != FunctionDef:
-                parent = parent.parent
-            if not parent:
-                res['global'] = bb
-            else:
-                res[parent] = bb
-        return res
+        """The entry block of each function (FunctionDef -> BasicBlock, and
+        'global' for the main program), i.e. the blocks only reached via
+        function call or global entry point"""
+        return dict(self.entries)
 
     def print_cfg_to_dot(self, filename):
         """Print the CFG in graphviz dot to file"""
-        f = open(filename, "w")
-        f.write("digraph G {\n")
-        for n in self:
-            f.write(repr(n))
-        h = self.heads()
-        for p in h:
-            bb = h[p]
-            if p == 'global':
-                f.write('main [shape=box];\n')
-                f.write('main -> ' + repr(id(bb)) + ' [label="' + repr(bb.live_in) + '"];\n')
-            else:
-                f.write(p.symbol.name + ' [shape=box];\n')
-                f.write(p.symbol.name + ' -> ' + repr(id(bb)) + ' [label="' + repr(bb.live_in) + '"];\n')
-        f.write("}\n")
-        f.close()
+        from dotty import print_cfgs_to_dot
+        print_cfgs_to_dot([self], filename)
 
     def print_liveness(self):
-        print('Liveness sets')
+        self.compute_instr_level_liveness()
+        _trace('Liveness sets')
         for bb in self:
-            print(bb)
-            print('gen:', bb.gen)
-            print('kill:', bb.kill)
-            print('live_in:', bb.live_in)
-            print('live_out:', bb.live_out)
-        print()
-        print('Instruction liveness')
+            _trace(bb)
+            _trace('gen:', bb.gen)
+            _trace('kill:', bb.kill)
+            _trace('live_in:', bb.live_in)
+            _trace('live_out:', bb.live_out)
+        _trace('Instruction liveness')
         for bb in self:
-            print('BASIC BLOCK:')
-            print(bb)
-            print()
+            _trace('BASIC BLOCK:')
+            _trace(bb)
             for i in bb.instrs:
-                print('inst={:80} live_in={:200} live_out={:80}'.format(repr(i), repr(i.live_in), repr(i.live_out)))
+                _trace('inst={:80} live_in={:200} live_out={:80}'.format(repr(i), repr(i.live_in), repr(i.live_out)))
 
     def find_target_bb(self, label):
         """Return the BB that contains a given label;
         Support function for creating/exploring the CFG"""
-        for bb in self:
-            if label in bb.labels:
-                return bb
-        raise Exception(repr(label) + ' not found in any BB!')
+        try:
+            return self.label_bb[label]
+        except KeyError:
+            raise Exception(repr(label) + ' not found in any BB!')
 
     def liveness(self):
-        """Standard live variable analysis"""
-        out = []
-        for bb in self:
-            out.append(bb.liveness_iteration())
-        while sum(out) != False:
-            out = []
-            for bb in self:
-                out.append(bb.liveness_iteration())
+        """Live variable analysis, with a worklist. Only the variables used in
+        some block before being assigned in it can be live across blocks:
+        they are numbered densely (see symbol_set()) and the analysis works
+        on int bitsets of them, then live_in and live_out are turned into
+        sets of symbols. The blocks are visited in post-order (i.e. in
+        reverse post-order of the reversed graph), so that most of the time
+        their successors have already been visited. The blocks with no
+        successors leave the function, so the global symbols are live
+        there. The liveness of each instruction is computed only on request,
+        by compute_instr_level_liveness()."""
+        from analysis import successors, predecessors, depth_first_order
+        self.symbols = []
+        self.symbol_ids = {}
+        bits = self.bitset
+        n = len(self)
+        succ = successors(self)
+        exit_live = [0] * n
+        for b, bb in enumerate(self):
+            bb.gen = set()  # used before being assigned
+            bb.kill = set()  # assigned
+            for i in bb.instrs:
+                for var in i.collect_uses():
+                    if var not in bb.kill:
+                        bb.gen.add(var)
+                try:
+                    bb.kill.update(i.collect_kills())
+                except AttributeError:
+                    pass
+            bb.total_vars_used = len(bb.gen | bb.kill)
+            if not succ[b] and bb.instrs:
+                func = bb.get_function()
+                if func != 'global':
+                    exit_live[b] = bits(func.get_global_symbols())
+        gen = [bits(bb.gen) for bb in self]
+        ids = self.symbol_ids
+        kill = [bits(var for var in bb.kill if var in ids) for bb in self]
+
+        preds = predecessors(succ)
+        entries, postorder = depth_first_order(succ, preds)
+        live_in = [0] * n
+        live_out = [0] * n
+        work = postorder[::-1]  # popped from the end
+        queued = [True] * n
+        visits = 0
+        while work:
+            b = work.pop()
+            queued[b] = False
+            visits += 1
+            if succ[b]:
+                out = 0
+                for s in succ[b]:
+                    out |= live_in[s]
+            else:
+                out = exit_live[b]
+            live_out[b] = out
+            new = gen[b] | (out & ~kill[b])
+            if new != live_in[b]:
+                live_in[b] = new
+                for p in preds[b]:
+                    if not queued[p]:
+                        queued[p] = True
+                        work.append(p)
+        self.liveness_visits = visits  # blocks visited, for the benchmarks
+
+        for b, bb in enumerate(self):
+            bb.live_in = self.symbol_set(live_in[b])
+            bb.live_out = self.symbol_set(live_out[b])
+
+    def bitset(self, symbols):
+        """Bitset of some symbols, numbering those never seen before"""
+        ids = self.symbol_ids
+        res = 0
+        for s in symbols:
+            i = ids.get(s)
+            if i is None:
+                i = ids[s] = len(self.symbols)
+                self.symbols.append(s)
+            res |= 1 << i
+        return res
+
+    def symbol_set(self, bits):
+        """The symbols in a bitset"""
+        res = set()
+        while bits:
+            low = bits & -bits
+            res.add(self.symbols[low.bit_length() - 1])
+            bits ^= low
+        return res
+
+    def compute_instr_level_liveness(self):
+        """live_in and live_out of every instruction, from those of the blocks"""
         for bb in self:
             bb.compute_instr_level_liveness()
+
+
+def function_cfgs(root):
+    """One CFG for each function under root (the FunctionDefs, and 'global'
+    for the main program), in the order of their code"""
+    from ir import StatList
+    stat_lists = {}  # function -> its StatLists
+    for sl in iter_nodes(root, StatList):
+        stat_lists.setdefault(sl.get_function(), []).append(sl)
+    return [CFG(sls, function) for function, sls in stat_lists.items()]
+
+
+class UnitCFG(list):
+    """The basic blocks of all the functions of a unit (see units.py), in the
+    order of their code, with a CFG of their own for each function
+    (functions). The analyses run on each function separately, so their
+    cost depends on the size of each function and not on the whole unit."""
+
+    def __init__(self, root):
+        super().__init__()
+        self.functions = function_cfgs(root)
+        for cfg in self.functions:
+            self += cfg
+
+    def heads(self):
+        res = {}
+        for cfg in self.functions:
+            res.update(cfg.heads())
+        return res
+
+    def liveness(self):
+        for cfg in self.functions:
+            cfg.liveness()
+
+    def dominators(self):
+        return [cfg.dominators() for cfg in self.functions]
+
+    def dataflow(self, analysis):
+        return [cfg.dataflow(analysis) for cfg in self.functions]
+
+    def invalidate(self):
+        for cfg in self.functions:
+            cfg.invalidate()
+
+    def print_cfg_to_dot(self, filename):
+        from dotty import print_cfgs_to_dot
+        print_cfgs_to_dot(self.functions, filename)
+
+    def print_liveness(self):
+        for cfg in self.functions:
+            cfg.print_liveness()
+
+
+class DataFlow(Visitor):
+    """Monotone dataflow analysis on the blocks of a CFG, solved with a
+    worklist on int bitsets of facts (see bit() and fact_set()).
+    A subclass sets the direction (forward) and the meet (may: union of what
+    comes from the predecessors, or from the successors when going backwards;
+    otherwise intersection), and defines the transfer function of each class
+    of statements as a visit_<class> method returning the bitsets (gen, kill)
+    of a statement: what holds after it (before it, going backwards) is
+    gen | (what holds before it & ~kill). The statements with no such method
+    change nothing. boundary() is what holds where the function is entered
+    (left, going backwards).
+    After solve(), ins[b] and outs[b] are the bitsets at the beginning and at
+    the end of block b, and stat_facts(b) gives those around each statement."""
+
+    forward = True
+    may = True
+
+    def __init__(self, cfg):
+        super().__init__()
+        self.cfg = cfg
+        self.facts = []  # bit i -> fact
+        self.fact_ids = {}
+        self.ins = []
+        self.outs = []
+        self.visits = 0  # blocks visited by solve()
+
+    def bit(self, fact):
+        """The bit of a fact, numbering it if it was never seen before"""
+        i = self.fact_ids.get(fact)
+        if i is None:
+            i = self.fact_ids[fact] = len(self.facts)
+            self.facts.append(fact)
+        return 1 << i
+
+    def bits(self, facts):
+        res = 0
+        for f in facts:
+            res |= self.bit(f)
+        return res
+
+    def fact_set(self, bits):
+        """The facts in a bitset"""
+        res = set()
+        while bits:
+            low = bits & -bits
+            res.add(self.facts[low.bit_length() - 1])
+            bits ^= low
+        return res
+
+    def generic_visit(self, stat):
+        return 0, 0
+
+    def boundary(self, bb):
+        return 0
+
+    def block_transfer(self, bb):
+        """gen and kill of a whole block, from those of its statements"""
+        gen = kill = 0
+        for stat in (bb.instrs if self.forward else reversed(bb.instrs)):
+            g, k = self.dispatch(stat)
+            gen = g | (gen & ~k)
+            kill |= k
+        return gen, kill
+
+    def solve(self):
+        from analysis import successors, predecessors, depth_first_order
+        n = len(self.cfg)
+        succ = successors(self.cfg)
+        preds = predecessors(succ)
+        entries, order = depth_first_order(succ, preds)
+        if self.forward:
+            src, dst = preds, succ
+            work = order  # popped from the end: reverse post-order
+        else:
+            src, dst = succ, preds
+            work = order[::-1]
+        transfer = [self.block_transfer(bb) for bb in self.cfg]
+        boundary = [0 if src[b] else self.boundary(bb) for b, bb in enumerate(self.cfg)]
+        top = 0 if self.may else (1 << len(self.facts)) - 1
+        before = [0] * n
+        after = [top] * n
+        queued = [True] * n
+        visits = 0
+        while work:
+            b = work.pop()
+            queued[b] = False
+            visits += 1
+            if src[b]:
+                x = after[src[b][0]]
+                for p in src[b][1:]:
+                    x = x | after[p] if self.may else x & after[p]
+            else:
+                x = boundary[b]
+            before[b] = x
+            gen, kill = transfer[b]
+            x = gen | (x & ~kill)
+            if x != after[b]:
+                after[b] = x
+                for s in dst[b]:
+                    if not queued[s]:
+                        queued[s] = True
+                        work.append(s)
+        self.visits = visits
+        if self.forward:
+            self.ins, self.outs = before, after
+        else:
+            self.ins, self.outs = after, before
+        return self
+
+    def stat_facts(self, b):
+        """(statement, bitset before it, bitset after it) for each statement
+        of block b, in order"""
+        res = []
+        if self.forward:
+            x = self.ins[b]
+            for stat in self.cfg[b].instrs:
+                gen, kill = self.dispatch(stat)
+                res.append((stat, x, gen | (x & ~kill)))
+                x = res[-1][2]
+        else:
+            x = self.outs[b]
+            for stat in reversed(self.cfg[b].instrs):
+                gen, kill = self.dispatch(stat)
+                res.append((stat, gen | (x & ~kill), x))
+                x = res[-1][1]
+            res.reverse()
+        return res
+
+
+def memory_symbols(cfg):
+    """The variables in memory used or assigned in a CFG"""
+    res = set()
+    for bb in cfg:
+        for stat in bb.instrs:
+            res.update(s for s in stat.collect_uses() if s.alloct != 'reg')
+            res.update(s for s in stat.collect_kills() if s.alloct != 'reg')
+    return res
+
+
+class ReachingDefinitions(DataFlow):
+    """The facts are the statements assigning a variable: those that can be
+    the last assignment of some variable at each point. A call may assign
+    any variable in memory, so it has a fact for each of them, (call,
+    variable): an assignment to one variable must not kill the call for the
+    others. A store through a pointer assigns only part of the array
+    (killhint), and a call may assign nothing, so neither kills the other
+    definitions"""
+
+    def __init__(self, cfg):
+        super().__init__(cfg)
+        self.memory = memory_symbols(cfg)
+        self.defs_of = {}  # variable -> bitset of the facts assigning it
+        for bb in cfg:
+            for stat in bb.instrs:
+                if type(stat) is BranchStat:
+                    if stat.returns:
+                        for var in self.memory:
+                            self.defs_of[var] = self.defs_of.get(var, 0) | self.bit((stat, var))
+                    continue
+                for var in stat.collect_kills():
+                    self.defs_of[var] = self.defs_of.get(var, 0) | self.bit(stat)
+
+    def visit_Stat(self, stat):
+        kill = 0
+        for var in stat.collect_kills():
+            kill |= self.defs_of[var]
+        return (self.bit(stat), kill) if kill else (0, 0)
+
+    def visit_StoreStat(self, stat):
+        if stat.dest.alloct == 'reg':
+            return (self.bit(stat), 0) if stat.killhint else (0, 0)
+        return self.visit_Stat(stat)
+
+    def visit_BranchStat(self, stat):
+        if stat.returns:
+            return self.bits((stat, var) for var in self.memory), 0
+        return 0, 0
+
+    def reaching(self, stat, b, var):
+        """The statements assigning var that reach stat, in block b"""
+        for s, before, after in self.stat_facts(b):
+            if s is stat:
+                return {f[0] if type(f) is tuple else f for f in self.fact_set(before & self.defs_of.get(var, 0))}
+        raise ValueError('statement not in block ' + repr(b))
+
+
+class Expressions(DataFlow):
+    """Base of the analyses whose facts are the expressions computed by the
+    statements: (op, srca, srcb) for a BinStat, (op, src) for a UnaryStat and
+    ('load', symbol) for a LoadStat. An expression is killed by an assignment
+    to any of its operands; loads are also killed by a store to the variable
+    they read, and all of them by a call or by a store through a pointer."""
+
+    forward = True
+    may = False
+
+    def __init__(self, cfg):
+        super().__init__(cfg)
+        self.using = {}  # variable -> bitset of the expressions it is an operand of
+        self.loads = 0  # bitset of the load expressions
+        for bb in cfg:
+            for stat in bb.instrs:
+                expr = self.expression(stat)
+                if expr is None:
+                    continue
+                bit = self.bit(expr)
+                for var in expr[1:]:
+                    self.using[var] = self.using.get(var, 0) | bit
+                if expr[0] == 'load':
+                    self.loads |= bit
+
+    @staticmethod
+    def expression(stat):
+        t = type(stat)
+        if t is BinStat:
+            return stat.op, stat.srca, stat.srcb
+        if t is UnaryStat:
+            return stat.op, stat.src
+        if t is LoadStat and not stat.usehint:
+            return 'load', stat.symbol
+        return None
+
+    def killed(self, stat):
+        kill = 0
+        for var in stat.collect_kills():
+            kill |= self.using.get(var, 0)
+        return kill
+
+    def visit_Stat(self, stat):
+        return 0, self.killed(stat)
+
+    def visit_BinStat(self, stat):
+        kill = self.killed(stat)
+        gen = self.bit(self.expression(stat))
+        if self.forward:  # t <- t + 1 does not leave t + 1 computed
+            gen &= ~kill
+        return gen, kill
+
+    visit_UnaryStat = visit_BinStat
+
+    def visit_LoadStat(self, stat):
+        if stat.usehint:  # a load from an array, through a pointer
+            return 0, self.killed(stat)
+        return self.visit_BinStat(stat)
+
+    def visit_StoreStat(self, stat):
+        if stat.dest.alloct == 'reg':
+            return 0, self.killed(stat) | self.loads
+        return 0, self.killed(stat)
+
+    def visit_BranchStat(self, stat):
+        return 0, self.loads if stat.returns else 0
+
+
+class AvailableExpressions(Expressions):
+    """The expressions computed on every path to each point, and not killed
+    since: computing them again can be replaced by a copy"""
+
+
+class VeryBusyExpressions(Expressions):
+    """The expressions computed on every path from each point, before any of
+    their operands changes: they can be hoisted there"""
+
+    forward = False
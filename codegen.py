@@ -9,21 +9,14 @@ correspond to. Alternatively, they can return a list where:
 This feature can be used only by IR nodes that are contained in a Block, and
 is used for adding constant literals."""
 
-from datalayout import *
-from ir import *
-
-localconsti = 0
-
-
-def new_local_const_label():
-    global localconsti
-    lab = '.const' + repr(localconsti)
-    localconsti += 1
-    return lab
-
-
-def new_local_const(val):
-    lab = new_local_const_label()
+from datalayout import LocalSymbolLayout
+from ir import Symbol, IRNode, Block, StatList, DefinitionList, FunctionDef, BinStat, PrintCommand, ReadCommand, \
+    BranchStat, EmptyStat, LoadPtrToSym, StoreStat, LoadStat, LoadImmStat, UnaryStat, PointerType
+from codegenhelp import REG_FP, REG_SCRATCH, REG_SP, REG_LR, REGS_CALLEESAVE, REGS_CALLERSAVE, get_register_string, \
+    save_regs, restore_regs, comment, codegen_append
+
+def new_local_const(ctx, val):
+    lab = ctx.new_local_const_label()
     trail = lab + ':\n\t.word ' + val + '\n'
     return lab, trail
 
@@ -41,8 +34,12 @@ Symbol.codegen = symbol_codegen
 
 
 def irnode_codegen(self, regalloc):
-    res = ['\t' + comment("irnode " + repr(id(self)) + ' type ' + repr(type(self))), '']
-    if 'children' in dir(self) and len(self.children):
+    res = ['\t' + comment("irnode type " + type(self).__name__), '']
+    return children_codegen(self, regalloc, res)
+
+
+def children_codegen(self, regalloc, res):
+    if len(self.children):
         for node in self.children:
             try:
                 try:
@@ -60,7 +57,18 @@ def irnode_codegen(self, regalloc):
 IRNode.codegen = irnode_codegen
 
 
-def block_codegen(self, regalloc):
+def statlist_codegen(self, regalloc):
+    """After lowering, the only StatList is the flat body of each procedure,
+    which is not worth a comment"""
+    return children_codegen(self, regalloc, ['', ''])
+
+
+StatList.codegen = statlist_codegen
+
+
+def block_codegen(self, regalloc, defs=True):
+    """defs is False for the main program, whose procedures are compiled as
+    separate units (see units.py)"""
     res = [comment('block'), '']
     for sym in self.symtab:
         res = codegen_append(res, sym.codegen(regalloc))
@@ -87,10 +95,11 @@ def block_codegen(self, regalloc):
     res[0] = res[0] + res[1]
     res[1] = ''
 
-    try:
-        res = codegen_append(res, self.defs.codegen(regalloc))
-    except Exception:
-        pass
+    if defs:
+        try:
+            res = codegen_append(res, self.defs.codegen(regalloc))
+        except Exception:
+            pass
 
     return res[0] + res[1]
 
@@ -245,7 +254,7 @@ def ldptrto_codegen(self, regalloc):
         else:
             res = '\tsub ' + rd + ', ' + get_register_string(REG_FP) + ', #' + repr(-off) + '\n'
     else:
-        lab, tmp = new_local_const(ai.symname)
+        lab, tmp = new_local_const(regalloc.ctx, ai.symname)
         trail += tmp
         res = '\tldr ' + rd + ', ' + lab + '\n'
     return [res + regalloc.gen_spill_store_if_necessary(self.dest), trail]
@@ -265,7 +274,7 @@ def storestat_codegen(self, regalloc):
         if type(ai) is LocalSymbolLayout:
             dest = '[' + get_register_string(REG_FP) + ', #' + ai.symname + ']'
         else:
-            lab, tmp = new_local_const(ai.symname)
+            lab, tmp = new_local_const(regalloc.ctx, ai.symname)
             trail += tmp
             res += '\tldr ' + get_register_string(REG_SCRATCH) + ', ' + lab + '\n'
             dest = '[' + get_register_string(REG_SCRATCH) + ']'
@@ -297,7 +306,7 @@ def loadstat_codegen(self, regalloc):
         if type(ai) is LocalSymbolLayout:
             src = '[' + get_register_string(REG_FP) + ', #' + ai.symname + ']'
         else:
-            lab, tmp = new_local_const(ai.symname)
+            lab, tmp = new_local_const(regalloc.ctx, ai.symname)
             trail += tmp
             res += '\tldr ' + get_register_string(REG_SCRATCH) + ', ' + lab + '\n'
             src = '[' + get_register_string(REG_SCRATCH) + ']'
@@ -332,7 +341,7 @@ def loadimm_codegen(self, regalloc):
         res = '\t' + op + rd + ', #' + repr(rv) + '\n'
         trail = ''
     else:
-        lab, trail = new_local_const(repr(val))
+        lab, trail = new_local_const(regalloc.ctx, repr(val))
         res = '\tldr ' + rd + ', ' + lab + '\n'
     return [res + regalloc.gen_spill_store_if_necessary(self.dest), trail]
 
@@ -361,8 +370,10 @@ def unarystat_codegen(self, regalloc):
 UnaryStat.codegen = unarystat_codegen
 
 
-def generate_code(program, regalloc):
+def generate_code(units):
+    """Final assembly step: the code of the main program followed by the code of
+    the procedures, one string for each unit (see units.py)"""
     res = '\t.text\n'
     res += '\t.arch armv6\n'
     res += '\t.syntax unified\n'
-    return res + program.codegen(regalloc)
+    return res + ''.join(units)
@@ -2,7 +2,7 @@
 
 """Helper functions used by the code generator"""
 
-from regalloc import *
+from regalloc import RegisterAllocation
 
 REG_FP = 11
 REG_SCRATCH = 12
@@ -27,7 +27,12 @@ clean() {
 echo 'cleaning leftovers...'
 clean
 echo 'generating assembly...'
-python3 main.py $SRCDIR/$SRCFILE -o $OBJDIR/$DSTOBJ > /dev/null
+# use the compile server if one is running (see server.py)
+if [ -n "$PL0_SOCKET" ] && [ -S "$PL0_SOCKET" ]; then
+    python3 server.py compile --socket $PL0_SOCKET $SRCDIR/$SRCFILE -o $OBJDIR/$DSTOBJ > /dev/null
+else
+    python3 main.py $SRCDIR/$SRCFILE -o $OBJDIR/$DSTOBJ > /dev/null
+fi
 if [ $? -ne 0 ]; then
     echo 'error: assembly generation failed'
     exit 1
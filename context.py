@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+"""State of a single compilation.
+Everything that used to be a process-wide counter (temporaries, labels, entries
+of the literal pools) lives here, together with the tables used for interning
+names and types. A fresh CompilationContext is created for every program, so
+that any number of programs can be compiled in the same process, one after the
+other, always producing the same output for the same input.
+The backend works on one procedure at a time (see units.py), each with its own
+context derived through unit_context()."""
+
+from ir import Symbol, Type, PointerType, TYPENAMES
+
+
+class CompilationContext(object):
+    def __init__(self, prefix=''):
+        # prepended to the names of labels and literal pool entries
+        self.prefix = prefix
+        self.tempcount = 0
+        self.labelcount = 0
+        self.constcount = 0
+        self.names = {}
+        self.types = {}
+
+    def new_temporary(self, stype):
+        """A new temporary, i.e. a symbol allocated to a register"""
+        temp = Symbol(name="t" + repr(self.tempcount), stype=stype, alloct="reg")
+        self.tempcount += 1
+        return temp
+
+    def new_label(self, target=None):
+        self.labelcount += 1
+        return Symbol(name=self.prefix + "label" + repr(self.labelcount), stype=TYPENAMES["label"], value=target)
+
+    def new_local_const_label(self):
+        """Label of a new entry in the literal pool of the current function"""
+        lab = '.' + self.prefix + 'const' + repr(self.constcount)
+        self.constcount += 1
+        return lab
+
+    def unit_context(self, prefix):
+        """Context for compiling a single procedure: the counters start from
+        zero, so that the code of the procedure does not depend on the other
+        procedures; prefix keeps its labels distinct from theirs. Names and
+        types are shared."""
+        ctx = CompilationContext(prefix)
+        ctx.names = self.names
+        ctx.types = self.types
+        return ctx
+
+    def intern(self, name):
+        """Return the canonical copy of an identifier"""
+        return self.names.setdefault(name, name)
+
+    def int_type(self, size, unsigned=False):
+        """Integer type of a given size in bits, shared by all the temporaries
+        that need it"""
+        key = ("int", size, unsigned)
+        if key not in self.types:
+            self.types[key] = Type(None, size, "Int", ["unsigned"] if unsigned else [])
+        return self.types[key]
+
+    def pointer_type(self, ptrto):
+        key = ("ptr", ptrto)
+        if key not in self.types:
+            self.types[key] = PointerType(ptrto)
+        return self.types[key]
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+"""Graphviz dot output of the IR tree and of the control flow graphs.
+Only needed for debugging (main.py --dot), so it is imported on demand."""
+
+from support import get_node_list
+
+
+def dotty_wrapper(fout):
+    """Main function for graphviz dot output generation"""
+
+    def dotty_function(irnode):
+        from ir import Stat
+
+        res = repr(id(irnode)) + ' ['
+        if isinstance(irnode, Stat):
+            res += 'shape=box,'
+        res += 'label="' + repr(type(irnode)) + ' ' + repr(id(irnode))
+        try:
+            res += ': ' + irnode.value
+        except Exception:
+            pass
+        try:
+            res += ': ' + irnode.name
+        except Exception:
+            pass
+        try:
+            res += ': ' + getattr(irnode, 'symbol').name
+        except Exception:
+            pass
+        res += '" ];\n'
+
+        if len(irnode.children):
+            for pos, node in enumerate(irnode.children):
+                res += repr(id(irnode)) + ' -> ' + repr(id(node)) + ' [pos=' + repr(pos) + '];\n'
+                if type(node) == str:
+                    res += repr(id(node)) + ' [label=' + node + '];\n'
+        for d in irnode.child_slots[1:]:
+            node = getattr(irnode, d)
+            if node is not None:
+                res += repr(id(irnode)) + ' -> ' + repr(id(node)) + ';\n'
+        if 'target' in irnode.info_slots:
+            node = irnode.target
+            res += repr(id(irnode)) + ' -> ' + repr(id(node.value)) + ' [label=' + node.name + '];\n'
+        fout.write(res)
+        return res
+
+    return dotty_function
+
+
+def print_dotty(root, filename):
+    """Print a graphviz dot representation to file"""
+    fout = open(filename, "w")
+    fout.write("digraph G {\n")
+    node_list = get_node_list(root)
+    dotty = dotty_wrapper(fout)
+    for n in node_list:
+        dotty(n)
+    fout.write("}\n")
+
+
+def write_cfg(cfg, f):
+    """Write the nodes and edges of a CFG to the open dot file f"""
+    for n in cfg:
+        f.write(repr(n))
+    h = cfg.heads()
+    for p in h:
+        bb = h[p]
+        if p == 'global':
+            f.write('main [shape=box];\n')
+            f.write('main -> ' + repr(id(bb)) + ' [label="' + repr(bb.live_in) + '"];\n')
+        else:
+            f.write(p.symbol.name + ' [shape=box];\n')
+            f.write(p.symbol.name + ' -> ' + repr(id(bb)) + ' [label="' + repr(bb.live_in) + '"];\n')
+
+
+def print_cfgs_to_dot(cfgs, filename):
+    """Print several CFGs (e.g. one for each procedure) in the same graphviz
+    dot file"""
+    with open(filename, "w") as f:
+        f.write("digraph G {\n")
+        for cfg in cfgs:
+            write_cfg(cfg, f)
+        f.write("}\n")
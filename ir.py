@@ -2,24 +2,17 @@
 
 """Intermediate Representation
 Could be improved by relying less on class hierarchy and more on string tags 
-and/or duck typing. Includes lowering and flattening functions. Every node must
-have a lowering function or a code generation function (codegen functions are
-in a separate module though)."""
+and/or duck typing. Every high level node must be handled by the lowering
+(lowering.py), and every low level node must have a code generation function
+(codegen functions are in a separate module too)."""
 
-from codegenhelp import *
+from functools import reduce
+from tracing import tracer, DEBUG, VERBOSE
 
-# UTILITIES
+_trace = tracer('ir')
 
-# as the same may suggest, count how many
-# temporaries have been instantiated so far
-tempcount = 0
-
-
-def new_temporary(symtab, type):
-    global tempcount
-    temp = Symbol(name="t" + str(tempcount), stype=type, alloct="reg")
-    tempcount += 1
-    return temp
+# NOTE: temporaries and labels are created through the CompilationContext
+# (see context.py) used by the lowering.
 
 
 # TYPES
@@ -38,6 +31,8 @@ TYPE_QUALIFIERS = ["unsigned"]
 
 
 class Type:
+    __slots__ = ("name", "size", "basetype", "qual_list")
+
     def __init__(self, name, size, basetype, qualifiers=None):
         if qualifiers is None:
             qualifiers = []
@@ -57,6 +52,8 @@ class Type:
 
 
 class ArrayType(Type):
+    __slots__ = ("dims",)
+
     def __init__(self, name, dims, basetype):
         """dims is a list of dimensions: dims = [5]: array of 5 elements;
         dims = [5, 5]: 5x5 matrix; and so on"""
@@ -71,6 +68,8 @@ class ArrayType(Type):
 
 
 class StructType(Type):  # currently unused
+    __slots__ = ("fields",)
+
     def __init__(self, name, size, fields):
         self.fields = fields
         realsize = sum([f.size for f in self.fields])
@@ -81,21 +80,25 @@ class StructType(Type):  # currently unused
 
 
 class LabelType(Type):
+    """Type of the labels. New labels are created by
+    CompilationContext.new_label()"""
+
+    __slots__ = ()
+
     def __init__(self):
         super().__init__("label", 0, "Label", [])
-        self.ids = 0
-
-    def __call__(self, target=None):
-        self.ids += 1
-        return Symbol(name="label" + repr(self.ids), stype=self, value=target)
 
 
 class FunctionType(Type):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__("function", 0, "Function", [])
 
 
 class PointerType(Type):
+    __slots__ = ("pointstotype",)
+
     def __init__(self, ptrto):
         """ptrto is the type of the object that this pointer points to."""
         super().__init__("&" + ptrto.name, 32, "Int", ["unsigned"])
@@ -127,6 +130,8 @@ class Symbol:
         4. imm: allocation to an immediate
     """
 
+    __slots__ = ("name", "stype", "value", "alloct", "allocinfo", "npar")
+
     def __init__(self, name, stype, npar=None, value=None, alloct="auto"):
         self.name = name
         self.stype = stype
@@ -158,11 +163,13 @@ class Symbol:
 # variable names
 class SymbolTable(list):
     def find(self, name):
-        print("Looking up", name)
+        if _trace.level >= VERBOSE:
+            _trace("Looking up", name)
         for s in self:
             if s.name == name:
                 return s
-        print("Looking up failed!")
+        if _trace.level >= DEBUG:
+            _trace("Looking up", name, "failed!")
         return None
 
     def __repr__(self):
@@ -175,11 +182,176 @@ class SymbolTable(list):
         return [symb for symb in self if symb.stype not in barred_types]
 
 
+# TRAVERSAL
+# Every class of IR node declares in child_slots the attributes that hold other
+# nodes (or lists of nodes), in the order they are visited: a fixed order keeps
+# the numbering of temporaries and labels deterministic. Note that the same node
+# can be reachable from two slots (e.g. PrintStat.children and PrintStat.expr),
+# in which case it is visited twice.
+# The traversals use an explicit stack, so that deep trees do not hit the
+# recursion limit, and read each slot only when they get to it, so that the
+# nodes can be replaced while the tree is being visited.
+
+
+def child_nodes(node):
+    """The nodes in the child slots of node"""
+    for slot in node.child_slots:
+        value = getattr(node, slot)
+        if type(value) is list or type(value) is StatSeq:
+            for child in value:
+                if isinstance(child, IRNode):
+                    yield child
+        elif isinstance(value, IRNode):
+            yield value
+
+
+def preorder(root):
+    """All the nodes of the tree rooted in root, each one before its children"""
+    stack = [iter((root,))]
+    while stack:
+        node = next(stack[-1], None)
+        if node is None:
+            stack.pop()
+        else:
+            yield node
+            stack.append(child_nodes(node))
+
+
+def postorder(root):
+    """All the nodes of the tree rooted in root, each one after its children"""
+    stack = [(root, child_nodes(root))]
+    while stack:
+        node, children = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            yield node
+        else:
+            stack.append((child, child_nodes(child)))
+
+
+# STATEMENT SEQUENCES
+# The children of a StatList form an intrusive doubly linked list, threaded
+# through the seq_prev and seq_next slots of the nodes themselves. Appending,
+# inserting, removing and replacing a statement, and appending a whole
+# sequence, take constant time, regardless of the length of the list.
+# The parent of a statement is always the StatList that owns its sequence.
+
+
+class StatSeq(object):
+    """The statements of a StatList, in order. Supports iteration (also while
+    the current statement is being replaced), len() and a constant time `in'"""
+    __slots__ = ("owner", "head", "tail", "size")
+
+    def __init__(self, owner, nodes=()):
+        self.owner = owner
+        self.head = None
+        self.tail = None
+        self.size = 0
+        for node in nodes:
+            self.append(node)
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        node = self.head
+        while node is not None:
+            # read the link first: node may be replaced before we get back here
+            nxt = node.seq_next
+            yield node
+            node = nxt
+
+    def __reversed__(self):
+        node = self.tail
+        while node is not None:
+            prev = node.seq_prev
+            yield node
+            node = prev
+
+    def __contains__(self, node):
+        return (isinstance(node, IRNode) and node.parent is self.owner
+                and (node.seq_prev is not None or self.head is node))
+
+    def _link(self, node, prev, nxt):
+        node.parent = self.owner
+        node.seq_prev = prev
+        node.seq_next = nxt
+        if prev is None:
+            self.head = node
+        else:
+            prev.seq_next = node
+        if nxt is None:
+            self.tail = node
+        else:
+            nxt.seq_prev = node
+
+    def append(self, node):
+        self._link(node, self.tail, None)
+        self.size += 1
+
+    def insert_before(self, ref, node):
+        """Insert node before ref; with ref None, at the end"""
+        self._link(node, ref.seq_prev if ref is not None else self.tail, ref)
+        self.size += 1
+
+    def insert_after(self, ref, node):
+        """Insert node after ref; with ref None, at the beginning"""
+        self._link(node, ref, ref.seq_next if ref is not None else self.head)
+        self.size += 1
+
+    def remove(self, node):
+        if node.seq_prev is None:
+            self.head = node.seq_next
+        else:
+            node.seq_prev.seq_next = node.seq_next
+        if node.seq_next is None:
+            self.tail = node.seq_prev
+        else:
+            node.seq_next.seq_prev = node.seq_prev
+        node.seq_prev = node.seq_next = None
+        self.size -= 1
+
+    def replace(self, old, new):
+        self._link(new, old.seq_prev, old.seq_next)
+        old.seq_prev = old.seq_next = None
+
+    def extend(self, seq):
+        """Move all the statements of seq to the end of this sequence"""
+        if seq.head is None:
+            return
+        if seq.owner is not self.owner:
+            for node in seq:
+                node.parent = self.owner
+        seq.head.seq_prev = self.tail
+        if self.tail is None:
+            self.head = seq.head
+        else:
+            self.tail.seq_next = seq.head
+        self.tail = seq.tail
+        self.size += seq.size
+        seq.head = seq.tail = None
+        seq.size = 0
+
+
 # IRNODE
 # structure of a generic IR node
 class IRNode:  # abstract
+    # seq_prev and seq_next link the statements of a StatList, see StatSeq
+    __slots__ = ("parent", "children", "symtab", "seq_prev", "seq_next")
+    # attributes holding other nodes, see child_nodes()
+    child_slots = ("children",)
+    # other attributes shown by __repr__
+    info_slots = ()
+    # attributes of the low level statements holding the symbols they read
+    # (use_slots) and those they assign (def_slots), see ssa.py
+    use_slots = ()
+    def_slots = ()
+
     def __init__(self, parent=None, children=None, symtab=None):
         self.parent = parent
+        self.seq_prev = None
+        self.seq_next = None
         if children:
             self.children = children[:]
             for c in self.children:
@@ -203,23 +375,6 @@ class IRNode:  # abstract
         except Exception:
             pass
 
-        attrs = {
-            "body",
-            "cond",
-            "value",
-            "thenpart",
-            "elsepart",
-            "symbol",
-            "call",
-            "step",
-            "expr",
-            "target",
-            "defs",
-            "global_symtab",
-            "local_symtab",
-            "offset",
-        } & set(dir(self))
-
         res = repr(type(self)) + " " + repr(id(self)) + " {\n"
         if self.parent is not None:
             res += "parent = " + repr(id(self.parent)) + "\n"
@@ -232,12 +387,12 @@ class IRNode:  # abstract
         res = label + res
 
         # print 'NODE', type(self), id(self)
-        if "children" in dir(self) and len(self.children):
+        if len(self.children):
             res += "\tchildren:\n"
             for node in self.children:
                 rep = repr(node)
                 res += "\n".join(["\t" + s for s in rep.split("\n")]) + "\n"
-        for d in attrs:
+        for d in self.child_slots[1:] + self.info_slots:
             node = getattr(self, d)
             rep = repr(node)
             res += (
@@ -247,65 +402,19 @@ class IRNode:  # abstract
         return res
 
     def navigate(self, action):
-        attrs = {
-            "body",
-            "cond",
-            "value",
-            "thenpart",
-            "elsepart",
-            "symbol",
-            "call",
-            "step",
-            "expr",
-            "target",
-            "defs",
-            "global_symtab",
-            "local_symtab",
-            "offset",
-        } & set(dir(self))
-        if "children" in dir(self) and len(self.children):
-            print("navigating children of", type(self), id(self), len(self.children))
-            for node in self.children:
-                try:
-                    node.navigate(action)
-                except Exception:
-                    pass
-        for d in attrs:
-            try:
-                getattr(self, d).navigate(action)
-                print("successfully navigated attr ", d, " of", type(self), id(self))
-            except Exception:
-                pass
-        action(self)
+        """Apply action to every node of the subtree, in post-order"""
+        for node in postorder(self):
+            action(node)
 
     def replace(self, old, new):
         new.parent = self
-        if "children" in dir(self) and len(self.children) and old in self.children:
+        if old in self.children:
             self.children[self.children.index(old)] = new
             return True
-        attrs = {
-            "body",
-            "cond",
-            "value",
-            "thenpart",
-            "elsepart",
-            "symbol",
-            "call",
-            "step",
-            "expr",
-            "target",
-            "defs",
-            "global_symtab",
-            "local_symtab",
-            "offset",
-        } & set(dir(self))
-        for d in attrs:
-            try:
-                if getattr(self, d) == old:
-                    setattr(self, d, new)
-                    return True
-            except Exception:
-                pass
+        for d in self.child_slots[1:]:
+            if getattr(self, d) is old:
+                setattr(self, d, new)
+                return True
         return False
 
     def get_function(self):
@@ -326,30 +435,20 @@ class IRNode:  # abstract
 # CONST and VAR
 
 class Const(IRNode):
+    __slots__ = ("value", "symbol")
+    info_slots = ("value", "symbol")
+
     def __init__(self, parent=None, value=0, symb=None, symtab=None):
         super().__init__(parent, None, symtab)
         self.value = value
         self.symbol = symb
 
-    def lower(self):
-        if self.symbol is None:
-            new = new_temporary(self.symtab, TYPENAMES["int"])
-            loadst = LoadImmStat(
-                dest=new, val=self.value, symtab=self.symtab
-            )  # constant lowered into an load immediate stmt
-        else:
-            new = new_temporary(self.symtab, self.symbol.stype)
-            loadst = LoadStat(
-                dest=new, symbol=self.symbol, symtab=self.symtab
-            )  # variable lowered into a load statement
-        return self.parent.replace(
-            self, StatList(children=[loadst], symtab=self.symtab)
-        )
-
-
 class Var(IRNode):
     """loads in a temporary the value pointed to by the symbol"""
 
+    __slots__ = ("symbol",)
+    info_slots = ("symbol",)
+
     def __init__(self, parent=None, var=None, symtab=None):
         super().__init__(parent, None, symtab)
         self.symbol = var
@@ -357,19 +456,13 @@ class Var(IRNode):
     def collect_uses(self):
         return [self.symbol]
 
-    def lower(self):
-        """Var translates to a load statement to the same temporary that is used in
-        a following stage for doing the computations (destination())"""
-        new = new_temporary(self.symtab, self.symbol.stype)
-        loadst = LoadStat(dest=new, symbol=self.symbol, symtab=self.symtab)
-        return self.parent.replace(
-            self, StatList(children=[loadst], symtab=self.symtab)
-        )
-
-
 class ArrayElement(IRNode):
     """loads in a temporary the value pointed by: the symbol + the index"""
 
+    __slots__ = ("symbol", "offset")
+    child_slots = ("children", "offset")
+    info_slots = ("symbol",)
+
     def __init__(self, parent=None, var=None, offset=None, symtab=None):
         """offset can NOT be a list of exps in case of multi-d arrays; it should
         have already been flattened beforehand"""
@@ -382,27 +475,12 @@ class ArrayElement(IRNode):
         a += self.offset.collect_uses()
         return a
 
-    def lower(self):
-        global TYPENAMES
-        dest = new_temporary(self.symtab, self.symbol.stype.basetype)
-        off = self.offset.destination()
-
-        statl = [self.offset]
-
-        ptrreg = new_temporary(self.symtab, PointerType(self.symbol.stype.basetype))
-        loadptr = LoadPtrToSym(dest=ptrreg, symbol=self.symbol, symtab=self.symtab)
-        src = new_temporary(self.symtab, PointerType(self.symbol.stype.basetype))
-        add = BinStat(dest=src, op="plus", srca=ptrreg, srcb=off, symtab=self.symtab)
-        statl += [loadptr, add]
-
-        statl += [LoadStat(dest=dest, symbol=src, symtab=self.symtab)]
-        return self.parent.replace(self, StatList(children=statl, symtab=self.symtab))
-
-
 # EXPRESSIONS
 
 
 class Expr(IRNode):  # abstract
+    __slots__ = ()
+
     def get_operator(self):
         return self.children[0]
 
@@ -417,45 +495,22 @@ class Expr(IRNode):  # abstract
 
 
 class BinExpr(Expr):
+    __slots__ = ()
+
     def get_operands(self):
         return self.children[1:]
 
-    def lower(self):
-        srca = self.children[1].destination()
-        srcb = self.children[2].destination()
-
-        # Type promotion.
-        if ("unsigned" in srca.stype.qual_list) and (
-            "unsigned" in srcb.stype.qual_list
-        ):
-            desttype = Type(
-                None, max(srca.stype.size, srcb.stype.size), "Int", ["unsigned"]
-            )
-        else:
-            desttype = Type(None, max(srca.stype.size, srcb.stype.size), "Int")
-
-        dest = new_temporary(self.symtab, desttype)
-
-        stmt = BinStat(
-            dest=dest, op=self.children[0], srca=srca, srcb=srcb, symtab=self.symtab
-        )
-        statl = [self.children[1], self.children[2], stmt]
-        return self.parent.replace(self, StatList(children=statl, symtab=self.symtab))
-
-
 class UnExpr(Expr):
+    __slots__ = ()
+
     def get_operand(self):
         return self.children[1]
 
-    def lower(self):
-        src = self.children[1].destination()
-        dest = new_temporary(self.symtab, src.stype)
-        stmt = UnaryStat(dest=dest, op=self.children[0], src=src, symtab=self.symtab)
-        statl = [self.children[1], stmt]
-        return self.parent.replace(self, StatList(children=statl, symtab=self.symtab))
-
 # looks like this is just a jump to a label
 class CallExpr(Expr):
+    __slots__ = ("symbol",)
+    info_slots = ("symbol",)
+
     def __init__(self, parent=None, function=None, parameters=None, symtab=None):
         super().__init__(parent, [], symtab)
         self.symbol = function
@@ -472,6 +527,8 @@ class CallExpr(Expr):
 # STATEMENTS
 
 class Stat(IRNode):  # abstract
+    __slots__ = ("label", "live_in", "live_out")
+
     def __init__(self, parent=None, children=None, symtab=None):
         super().__init__(parent, children, symtab)
         self.label = None
@@ -493,6 +550,9 @@ class Stat(IRNode):  # abstract
 class CallStat(Stat):
     """Procedure call"""
 
+    __slots__ = ("call",)
+    child_slots = ("children", "call")
+
     def __init__(self, parent=None, call_expr=None, symtab=None):
         super().__init__(parent, [], symtab)
         self.call = call_expr
@@ -503,13 +563,10 @@ class CallStat(Stat):
             [TYPENAMES["function"], TYPENAMES["label"]]
         )
 
-    def lower(self):
-        dest = self.call.symbol
-        bst = BranchStat(target=dest, symtab=self.symtab, returns=True)
-        return self.parent.replace(self, bst)
-
-
 class IfStat(Stat):
+    __slots__ = ("cond", "thenpart", "elsepart")
+    child_slots = ("children", "cond", "thenpart", "elsepart")
+
     def __init__(
         self, parent=None, cond=None, thenpart=None, elsepart=None, symtab=None
     ):
@@ -522,43 +579,10 @@ class IfStat(Stat):
         if self.elsepart:
             self.elsepart.parent = self
 
-    def lower(self):
-        exit_label = TYPENAMES["label"]()
-        exit_stat = EmptyStat(self.parent, symtab=self.symtab)
-        exit_stat.set_label(exit_label)
-        if self.elsepart:
-            then_label = TYPENAMES["label"]()
-            self.thenpart.set_label(then_label)
-            branch_to_then = BranchStat(
-                None, self.cond.destination(), then_label, self.symtab
-            )
-            branch_to_exit = BranchStat(None, None, exit_label, self.symtab)
-            stat_list = StatList(
-                self.parent,
-                [
-                    self.cond,
-                    branch_to_then,
-                    self.elsepart,
-                    branch_to_exit,
-                    self.thenpart,
-                    exit_stat,
-                ],
-                self.symtab,
-            )
-            return self.parent.replace(self, stat_list)
-        else:
-            branch_to_exit = BranchStat(
-                None, self.cond.destination(), exit_label, self.symtab, negcond=True
-            )
-            stat_list = StatList(
-                self.parent,
-                [self.cond, branch_to_exit, self.thenpart, exit_stat],
-                self.symtab,
-            )
-            return self.parent.replace(self, stat_list)
-
-
 class WhileStat(Stat):
+    __slots__ = ("cond", "body")
+    child_slots = ("children", "cond", "body")
+
     def __init__(self, parent=None, cond=None, body=None, symtab=None):
         super().__init__(parent, [], symtab)
         self.cond = cond
@@ -566,23 +590,10 @@ class WhileStat(Stat):
         self.cond.parent = self
         self.body.parent = self
 
-    def lower(self):
-        entry_label = TYPENAMES["label"]()
-        exit_label = TYPENAMES["label"]()
-        exit_stat = EmptyStat(self.parent, symtab=self.symtab)
-        exit_stat.set_label(exit_label)
-        self.cond.set_label(entry_label)
-        branch = BranchStat(
-            None, self.cond.destination(), exit_label, self.symtab, negcond=True
-        )
-        loop = BranchStat(None, None, entry_label, self.symtab)
-        stat_list = StatList(
-            self.parent, [self.cond, branch, self.body, loop, exit_stat], self.symtab
-        )
-        return self.parent.replace(self, stat_list)
-
-
 class ForStat(Stat):
+    __slots__ = ("init", "cond", "step", "body")
+    child_slots = ("children", "init", "cond", "step", "body")
+
     def __init__(
         self, parent=None, init=None, cond=None, step=None, body=None, symtab=None
     ):
@@ -615,35 +626,11 @@ class ForStat(Stat):
             4. body
         """
 
-    def lower(self):
-
-        # LOOP label
-        loop_label = TYPENAMES["label"]()
-        self.cond.set_label(loop_label)
-        loop = BranchStat(None, None, loop_label, self.symtab)
-
-        # OUT label
-        out_label = TYPENAMES["label"]()
-        exit_stat = EmptyStat(self.parent, symtab=self.symtab)
-        exit_stat.set_label(out_label)
-        """cond == None -> branch always taken.
-        If negcond is True and Cond != None, the branch is taken when cond is false,
-        otherwise the branch is taken when cond is true.
-        If returns is True, this is a branch-and-link instruction."""
-        branch = BranchStat(
-            None, self.cond.destination(), out_label, self.symtab, negcond=True
-        )
-
-        # StatList to give as output
-        stat_list = StatList(
-            self.parent,
-            [self.init, self.cond, branch, self.body, self.step, loop, exit_stat],
-            self.symtab,
-        )
-        return self.parent.replace(self, stat_list)
-
-
 class AssignStat(Stat):
+    __slots__ = ("symbol", "expr", "offset")
+    child_slots = ("children", "expr", "offset")
+    info_slots = ("symbol",)
+
     def __init__(self, parent=None, target=None, offset=None, expr=None, symtab=None):
         super().__init__(parent, [], symtab)
         self.symbol = target
@@ -674,34 +661,10 @@ class AssignStat(Stat):
     def collect_kills(self):
         return [self.symbol]
 
-    def lower(self):
-        """Assign statements translate to a store stmt, with the symbol and a
-        temporary as parameters."""
-
-        src = self.expr.destination()
-        dst = self.symbol
-
-        stats = [self.expr]
-
-        if self.offset:
-            off = self.offset.destination()
-            desttype = dst.stype
-            if type(desttype) is ArrayType:  # this is always true at the moment
-                desttype = desttype.basetype
-            ptrreg = new_temporary(self.symtab, PointerType(desttype))
-            loadptr = LoadPtrToSym(dest=ptrreg, symbol=dst, symtab=self.symtab)
-            dst = new_temporary(self.symtab, PointerType(desttype))
-            add = BinStat(
-                dest=dst, op="plus", srca=ptrreg, srcb=off, symtab=self.symtab
-            )
-            stats += [self.offset, loadptr, add]
-
-        stats += [StoreStat(dest=dst, symbol=src, symtab=self.symtab)]
-
-        return self.parent.replace(self, StatList(children=stats, symtab=self.symtab))
-
-
 class ReturnStat(Stat):
+    __slots__ = ("expr", "ret_param_symbol", "end_label")
+    child_slots = ("children", "expr")
+
     def __init__(self, parent=None, exp=None, symtab=None):
         super().__init__(parent, [], symtab)
         self.expr = exp
@@ -717,20 +680,10 @@ class ReturnStat(Stat):
 
 
 
-    def lower(self):
-        print("[DEBUG] ReturnStat.expr : ", self.expr)
-        # evaluate exp
-        # store value in ret param
-        stlist = [
-                self.expr, 
-                StoreStat(dest=self.ret_param_symbol, symbol=self.expr.destination(), symtab=self.symtab)
-            ]
-
-        stlist += [RetStat(use=self.ret_param_symbol)]
-        stlist = StatList(children=stlist, symtab=self.symtab)
-        return self.parent.replace(self, stlist)
-
 class RetStat(Stat):  # low-level node
+    __slots__ = ("use",)
+    use_slots = ("use",)
+
     def __init__(self, use=None, parent=None, children=None, symtab=None):
         super().__init__(parent, children, symtab)
         self.use = use
@@ -741,6 +694,9 @@ class RetStat(Stat):  # low-level node
         
 
 class PrintStat(Stat):
+    __slots__ = ("expr",)
+    child_slots = ("children", "expr")
+
     def __init__(self, parent=None, exp=None, symtab=None):
         super().__init__(parent, [exp], symtab)
         self.expr = exp
@@ -748,13 +704,10 @@ class PrintStat(Stat):
     def collect_uses(self):
         return self.expr.collect_uses()
 
-    def lower(self):
-        pc = PrintCommand(src=self.expr.destination(), symtab=self.symtab)
-        stlist = StatList(children=[self.expr, pc], symtab=self.symtab)
-        return self.parent.replace(self, stlist)
-
-
 class PrintCommand(Stat):  # low-level node
+    __slots__ = ("src",)
+    use_slots = ("src",)
+
     def __init__(self, parent=None, src=None, symtab=None):
         super().__init__(parent, [], symtab)
         self.src = src
@@ -769,17 +722,15 @@ class PrintCommand(Stat):  # low-level node
 
 
 class ReadStat(Stat):
+    __slots__ = ()
+
     def __init__(self, parent=None, symtab=None):
         super().__init__(parent, [], symtab)
 
-    def lower(self):
-        tmp = new_temporary(self.symtab, TYPENAMES["int"])
-        read = ReadCommand(dest=tmp, symtab=self.symtab)
-        stlist = StatList(children=[read], symtab=self.symtab)
-        return self.parent.replace(self, stlist)
-
-
 class ReadCommand(Stat):  # low-level node
+    __slots__ = ("dest",)
+    def_slots = ("dest",)
+
     def __init__(self, parent=None, dest=None, symtab=None):
         super().__init__(parent, [], symtab)
         self.dest = dest
@@ -800,6 +751,10 @@ class ReadCommand(Stat):  # low-level node
 
 
 class BranchStat(Stat):  # low-level node
+    __slots__ = ("cond", "negcond", "target", "returns")
+    info_slots = ("cond", "target")
+    use_slots = ("cond",)
+
     def __init__(
         self,
         parent=None,
@@ -844,13 +799,23 @@ class BranchStat(Stat):  # low-level node
 
 
 class EmptyStat(Stat):  # low-level node
+    __slots__ = ()
+
     pass
 
     def collect_uses(self):
         return []
 
+    def human_repr(self):
+        return "nop"
+
 
 class LoadPtrToSym(Stat):  # low-level node
+    __slots__ = ("symbol", "dest")
+    info_slots = ("symbol",)
+    use_slots = ("symbol",)
+    def_slots = ("dest",)
+
     def __init__(self, parent=None, dest=None, symbol=None, symtab=None):
         """Loads to the 'dest' symbol the location in memory (as an absolute
         address) of 'symbol'. This instruction is used as a starting point for
@@ -878,6 +843,13 @@ class LoadPtrToSym(Stat):  # low-level node
 
 class StoreStat(Stat):  # low-level node
     # store the symbol to the specified destination + offset
+    __slots__ = ("symbol", "dest", "killhint")
+    info_slots = ("symbol",)
+    # dest is read when it is a temporary (a pointer); as a variable in memory
+    # it is assigned, but only temporaries are renamed in SSA form
+    use_slots = ("symbol", "dest")
+    def_slots = ("killhint",)
+
     def __init__(self, parent=None, dest=None, symbol=None, killhint=None, symtab=None):
         """Stores the value in the 'symbol' temporary (register) to 'dest' which
         can be a symbol allocated in memory, or a temporary (symbol allocated to a
@@ -914,6 +886,11 @@ class StoreStat(Stat):  # low-level node
 
 
 class LoadStat(Stat):  # low-level node
+    __slots__ = ("symbol", "dest", "usehint")
+    info_slots = ("symbol",)
+    use_slots = ("symbol", "usehint")
+    def_slots = ("dest",)
+
     def __init__(self, parent=None, dest=None, symbol=None, usehint=None, symtab=None):
         """Loads the value in symbol to dest, which must be a temporary. 'symbol'
         can be a symbol allocated in memory, or a temporary (symbol allocated to a
@@ -946,6 +923,9 @@ class LoadStat(Stat):  # low-level node
 
 
 class LoadImmStat(Stat):  # low-level node
+    __slots__ = ("val", "dest")
+    def_slots = ("dest",)
+
     def __init__(self, parent=None, dest=None, val=0, symtab=None):
         super().__init__(parent, [], symtab)
         self.val = val
@@ -967,6 +947,10 @@ class LoadImmStat(Stat):  # low-level node
 
 
 class BinStat(Stat):  # low-level node
+    __slots__ = ("dest", "op", "srca", "srcb")
+    use_slots = ("srca", "srcb")
+    def_slots = ("dest",)
+
     def __init__(
         self, parent=None, dest=None, op=None, srca=None, srcb=None, symtab=None
     ):
@@ -1002,6 +986,10 @@ class BinStat(Stat):  # low-level node
 
 
 class UnaryStat(Stat):  # low-level node
+    __slots__ = ("dest", "op", "src")
+    use_slots = ("src",)
+    def_slots = ("dest",)
+
     def __init__(self, parent=None, dest=None, op=None, src=None, symtab=None):
         super().__init__(parent, [], symtab)
         self.dest = dest
@@ -1025,16 +1013,48 @@ class UnaryStat(Stat):  # low-level node
         return repr(self.dest) + " <- " + self.op + " " + repr(self.src)
 
 
+class PhiStat(Stat):  # low-level node, only found in SSA form (see ssa.py)
+    __slots__ = ("dest", "var", "srcs")
+
+    def __init__(self, parent=None, var=None, symtab=None):
+        super().__init__(parent, [], symtab)
+        self.var = var  # the temporary before renaming
+        self.dest = var
+        self.srcs = {}  # predecessor basic block -> temporary
+
+    def collect_kills(self):
+        return [self.dest]
+
+    def collect_uses(self):
+        return list(self.srcs.values())
+
+    def destination(self):
+        return self.dest
+
+    def human_repr(self):
+        return repr(self.dest) + " <- phi(" + ", ".join(repr(s) for s in self.srcs.values()) + ")"
+
+
 class StatList(Stat):  # low-level node
+    __slots__ = ()
+
     def __init__(self, parent=None, children=None, symtab=None):
-        print("StatList : new", id(self))
-        super().__init__(parent, children, symtab)
+        if _trace.level >= VERBOSE:
+            _trace("StatList : new", id(self))
+        super().__init__(parent, None, symtab)
+        self.children = StatSeq(self, children or ())
 
     def append(self, elem):
-        elem.parent = self
-        print("StatList: appending", id(elem), "of type", type(elem), "to", id(self))
+        if _trace.level >= VERBOSE:
+            _trace("StatList: appending", id(elem), "of type", type(elem), "to", id(self))
         self.children.append(elem)
 
+    def replace(self, old, new):
+        if old in self.children:
+            self.children.replace(old, new)
+            return True
+        return super().replace(old, new)
+
     def collect_uses(self):
         u = []
         for c in self.children:
@@ -1042,51 +1062,26 @@ class StatList(Stat):  # low-level node
         return u
 
     def print_content(self):
-        print("StatList", id(self), ": [", end=" ")
-        for n in self.children:
-            print(id(n), end=" ")
-        print("]")
-
-    def flatten(self):
-        """Remove nested StatLists"""
-        if type(self.parent) == StatList:
-            print("Flattening", id(self), "into", id(self.parent))
-            if self.get_label():
-                emptystat = EmptyStat(self, symtab=self.symtab)
-                self.children.insert(0, emptystat)
-                emptystat.set_label(self.get_label())
-            for c in self.children:
-                c.parent = self.parent
-            i = self.parent.children.index(self)
-            self.parent.children = (
-                self.parent.children[:i] + self.children + self.parent.children[i + 1 :]
-            )
-            return True
-        else:
-            print(
-                "Not flattening",
-                id(self),
-                "into",
-                id(self.parent),
-                "of type",
-                type(self.parent),
-            )
-            return False
+        _trace("StatList", id(self), ": [", *[id(n) for n in self.children], "]")
 
     def destination(self):
-        for i in range(-1, -len(self.children) - 1, -1):
+        for c in reversed(self.children):
             try:
-                return self.children[i].destination()
+                return c.destination()
             except Exception:
                 pass
         return None
 
 class IncExpr(IRNode):
+    __slots__ = ("symbol", "op")
+    info_slots = ("symbol",)
+
     def __init__(self, parent=None, var=None, op=None, symtab=None):
         super().__init__(parent, [], symtab)
         self.symbol = var
         self.op = op
-        print("[OPERATOR]: ", op)
+        if _trace.level >= DEBUG:
+            _trace("[OPERATOR]: ", op)
         # no idea what this does, copied from AssignStat(Stat)
         try:
             self.symbol.parent = self
@@ -1100,34 +1095,16 @@ class IncExpr(IRNode):
         return [self.symbol]
 
 
-    def lower(self):
-        statements = []
-        
-        # loading var
-        new_ld_d = new_temporary(self.symtab, self.symbol.stype)
-        statements += [LoadStat(dest=new_ld_d, symbol=self.symbol, symtab=self.symtab)]
-        
-        # loading 1 in an immediate
-        new_li1_d = new_temporary(self.symtab, self.symbol.stype)
-        statements += [LoadImmStat(dest=new_li1_d, val=1, symtab=self.symtab)]
-        
-        # adding 1 to var
-        new_inc_d = new_temporary(self.symtab, self.symbol.stype)
-        statements += [BinStat(dest=new_inc_d, op='plus', srca=new_ld_d, srcb=new_li1_d, symtab=self.symtab)]
-        
-        # storing the result
-        statements += [StoreStat(dest=self.symbol, symbol=new_inc_d, symtab=self.symtab)]
-        
-        statements += [DestRedirectStat(self.parent, dest=new_ld_d, symtab=self.symtab)]
-        
-        return self.parent.replace(self, StatList(children=statements, symtab=self.symtab))
-
 class IncExpr2(IRNode):
+    __slots__ = ("symbol", "op")
+    info_slots = ("symbol",)
+
     def __init__(self, parent=None, var=None, op=None, symtab=None):
         super().__init__(parent, [], symtab)
         self.symbol = var
         self.op = op
-        print("[OPERATOR]: ", op)
+        if _trace.level >= DEBUG:
+            _trace("[OPERATOR]: ", op)
 
         try:
             self.symbol.parent = self
@@ -1148,6 +1125,10 @@ class IncExpr2(IRNode):
 
 
 class Block(Stat):
+    __slots__ = ("global_symtab", "body", "defs", "stackroom")
+    child_slots = ("children", "defs", "body")
+    info_slots = ("global_symtab",)
+
     def __init__(self, parent=None, gl_sym=None, lc_sym=None, defs=None, body=None):
         super().__init__(parent, [], lc_sym)
         self.global_symtab = gl_sym
@@ -1161,6 +1142,9 @@ class Block(Stat):
 # DEFINITIONS
 
 class Definition(IRNode):
+    __slots__ = ("symbol",)
+    info_slots = ("symbol",)
+
     def __init__(self, parent=None, symbol=None):
         super().__init__(parent, [], None)
         self.parent = parent
@@ -1168,6 +1152,9 @@ class Definition(IRNode):
 
 
 class FunctionDef(Definition):
+    __slots__ = ("body",)
+    child_slots = ("children", "body")
+
     def __init__(self, parent=None, symbol=None, body=None):
         super().__init__(parent, symbol)
         self.body = body
@@ -1180,6 +1167,8 @@ class FunctionDef(Definition):
 
 
 class DefinitionList(IRNode):
+    __slots__ = ()
+
     def __init__(self, parent=None, children=None):
         super().__init__(parent, children, None)
 
@@ -1190,9 +1179,6 @@ class DefinitionList(IRNode):
 
 def print_stat_list(node):
     """Navigation action: print"""
-    print(type(node), id(node))
+    _trace(type(node), id(node))
     if type(node) == StatList:
-        print("StatList", id(node), ": [", end=" ")
-        for n in node.children:
-            print(id(n), end=" ")
-        print("]")
+        node.print_content()
@@ -2,6 +2,9 @@
 
 """Simple lexer for PL/0 using generators"""
 
+import mmap
+import re
+
 # Tokens can have multiple definitions if needed
 TOKEN_DEFS = {
     "lparen": ["("],
@@ -47,66 +50,184 @@ TOKEN_DEFS = {
 }
 
 
+# Keywords are scanned as words (maximal munch) and only then looked up, so that
+# an identifier such as "dots" is not split into "do" followed by "ts".
+# Everything else is punctuation, matched longest first.
+KEYWORDS = {s: t for t, ss in TOKEN_DEFS.items() for s in ss if s.isalpha()}
+SYMBOLS = {s: t for t, ss in TOKEN_DEFS.items() for s in ss if not s.isalpha()}
+
+# One master regex for the whole lexer. The order of the alternatives matters:
+# numbers must be tried before words because \w also matches digits. Words and
+# spaces are ASCII only, as they are for the bytes of MappedLexer.
+TOKEN_REGEX = re.compile(
+    r"(?P<space>\s+)"
+    r"|(?P<comment>\{[^}]*\}?)"
+    r"|(?P<number>[0-9]+)"
+    r"|(?P<word>\w+)"
+    r"|(?P<symbol>"
+    + "|".join(re.escape(s) for s in sorted(SYMBOLS, key=len, reverse=True))
+    + ")",
+    re.ASCII
+)
+BYTES_TOKEN_REGEX = re.compile(TOKEN_REGEX.pattern.encode())
+
+
 class Lexer:
     """The lexer. Decomposes a string in tokens."""
 
     def __init__(self, text):
         self.text = text
         self.pos = 0
-        self.str_to_token = list([(s, t) for t, ss in TOKEN_DEFS.items() for s in ss])
-        self.str_to_token.sort(key=lambda a: -len(a[0]))
-
-    def skip_whitespace(self):
-        in_comment = False
-        while self.pos < len(self.text) and (
-            self.text[self.pos].isspace() or self.text[self.pos] == "{" or in_comment
-        ):
-            if self.text[self.pos] == "{" and not in_comment:
-                in_comment = True
-            elif in_comment and self.text[self.pos] == "}":
-                in_comment = False
-            self.pos += 1
-
-    def check_symbol(self):
-        for s, t in self.str_to_token:
-            if self.text[self.pos : self.pos + len(s)].lower() == s:
-                self.pos += len(s)
-                return t, s
-        return None, None
-
-    def check_regex(self, regex):
-        import re
-
-        match = re.match(regex, self.text[self.pos :])
-        if not match:
-            return None
-        found = match.group(0)
-        self.pos += len(found)
-        return found
+        # position of the last token produced, 1-based
+        self.line = 1
+        self.col = 1
+        self.line_start = 0
+
+    def newlines(self, start, end):
+        """Update line tracking for a skipped region (whitespace or comment)"""
+        n = self.text.count("\n", start, end)
+        if n:
+            self.line += n
+            self.line_start = self.text.rfind("\n", start, end) + 1
 
     def tokens(self):
-        """Returns a generator which will produce a stream of (token identifier, token value) pairs."""
+        """Returns a generator which will produce a stream of (token identifier, token value) pairs.
+        The stream always ends with an illegal "end of file" token, so that the
+        parser never keeps on looking at a stale symbol."""
 
-        while self.pos < len(self.text):
-            self.skip_whitespace()
-            t, s = self.check_symbol()
-            if s:
-                yield t, s
+        text = self.text
+        match = TOKEN_REGEX.match
+        keywords = KEYWORDS
+        symbols = SYMBOLS
+        end = len(text)
+        while self.pos < end:
+            m = match(text, self.pos)
+            if m is None:
+                self.col = self.pos - self.line_start + 1
+                yield "illegal", text[self.pos]
+                return
+            kind = m.lastgroup
+            start = self.pos
+            self.pos = m.end()
+            if kind == "space" or kind == "comment":
+                self.newlines(start, self.pos)
                 continue
-            t = self.check_regex(r"[0-9]+")
-            if t:
-                yield "number", int(t)
-                continue
-            t = self.check_regex(r"\w+")
-            if t:
-                yield "ident", t
+            self.col = start - self.line_start + 1
+            s = m.group()
+            if kind == "word":
+                t = keywords.get(s.lower())
+                if t:
+                    yield t, s.lower()
+                else:
+                    yield "ident", s
+            elif kind == "number":
+                yield "number", int(s)
+            else:
+                yield symbols[s], s
+        self.col = self.pos - self.line_start + 1
+        yield "illegal", "end of file"
+
+    def value(self, token):
+        """Value of a token as produced by tokens(). Here this is the value
+        itself; MappedLexer builds it on demand."""
+        return token
+
+
+def read_source(filename):
+    """The text of a source file, as MappedLexer sees it: the line endings
+    are left alone, and the bytes that are not valid UTF-8 are kept as
+    surrogates, so that encoding the text gives back the bytes of the file"""
+    with open(filename, "r", encoding="utf-8", errors="surrogateescape", newline="") as f:
+        return f.read()
+
+
+class MappedLexer(Lexer):
+    """Zero-copy lexer working directly on a bytes-like object (typically the
+    mmap of the source file, see open()).
+    The tokens are (token identifier, (start, end)) pairs, where the offsets
+    refer to the source buffer; the actual value of a token is only built when
+    value() is called on it, so lexing a huge file keeps memory flat."""
+
+    def __init__(self, buffer, file=None):
+        super().__init__(buffer)
+        self.file = file
+
+    @staticmethod
+    def open(filename):
+        f = open(filename, "rb")
+        try:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty files cannot be mapped
+            buffer = b""
+        return MappedLexer(buffer, f)
+
+    def close(self):
+        if isinstance(self.text, mmap.mmap):
+            self.text.close()
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def newlines(self, start, end):
+        i = self.text.find(b"\n", start, end)
+        while i >= 0:
+            self.line += 1
+            self.line_start = i + 1
+            i = self.text.find(b"\n", i + 1, end)
+
+    def tokens(self):
+        """Same as Lexer.tokens(), but values are replaced by (start, end)
+        offsets in the buffer. Only words that may be keywords are ever copied
+        out of the buffer."""
+
+        text = self.text
+        match = BYTES_TOKEN_REGEX.match
+        keywords = KEYWORDS
+        keyword_sizes = {len(k) for k in KEYWORDS}
+        symbols = SYMBOLS
+        end = len(text)
+        while self.pos < end:
+            m = match(text, self.pos)
+            start = self.pos
+            if m is None:
+                self.col = start - self.line_start + 1
+                n = 1  # the whole character, if it takes more than a byte in UTF-8
+                while n < 4 and start + n < end and text[start + n] & 0xc0 == 0x80:
+                    n += 1
+                yield "illegal", (start, start + n)
+                return
+            kind = m.lastgroup
+            self.pos = m.end()
+            if kind == "space" or kind == "comment":
+                self.newlines(start, self.pos)
                 continue
-            try:
-                t = self.text[self.pos]
-            except Exception:
-                t = "end of file"  # at end of file this will fail because self.pos >= len(self.text)
-            yield "illegal", t
-            break
+            self.col = start - self.line_start + 1
+            span = (start, self.pos)
+            if kind == "word":
+                t = None
+                if self.pos - start in keyword_sizes:
+                    t = keywords.get(text[start:self.pos].decode().lower())
+                yield (t, span) if t else ("ident", span)
+            elif kind == "number":
+                yield "number", span
+            else:
+                yield symbols[text[start:self.pos].decode()], span
+        self.col = self.pos - self.line_start + 1
+        yield "illegal", (end, end)
+
+    def value(self, token):
+        if token is None:
+            return None
+        start, end = token
+        if start == end:
+            return "end of file"
+        return bytes(self.text[start:end]).decode(errors="replace")
 
 
 # Test support
@@ -1,14 +1,41 @@
 #!/usr/bin/env python3
 
 """Logging function using decorators
-Usage: decorate monitored function with '@logger'"""
+Usage: decorate monitored methods with '@logger'
+The methods are traced by the 'parser' tracer at VERBOSE level. While that
+level is not enabled the original (undecorated) method is left in the class, so
+the hook costs nothing; changing the level swaps the wrappers in and out."""
 
+from tracing import tracer, VERBOSE
 
-def logger(f):
+_trace = tracer('parser')
+
+# (class, attribute name, original function) of every hooked method
+_hooked = []
+
+
+def _traced(f):
     def wrapped(*args, **kwargs):
-        print('start', f)
+        _trace('start', f.__qualname__)
         res = f(*args, **kwargs)
-        print('end', f)
+        _trace('end', f.__qualname__)
         return res
 
     return wrapped
+
+
+def _install(level):
+    for owner, name, f in _hooked:
+        setattr(owner, name, _traced(f) if level >= VERBOSE else f)
+
+
+class logger(object):
+    def __init__(self, f):
+        self.f = f
+
+    def __set_name__(self, owner, name):
+        _hooked.append((owner, name, self.f))
+        setattr(owner, name, _traced(self.f) if _trace.level >= VERBOSE else self.f)
+
+
+_trace.on_change(_install)
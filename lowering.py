@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+
+"""Lowering: translation of the high level IR built by the parser into low
+level statements (loads, stores, arithmetic on temporaries, branches).
+The tree of each procedure is walked once, and the low level statements are
+appended in order to a single flat StatList, which replaces the body of the
+procedure. Expressions are lowered by methods that return the temporary
+holding their value, so there is no need for nested StatLists or for a
+flattening pass afterwards.
+Labels are numbered when the statement they belong to has been lowered
+completely (i.e. those of the inner statements first), and the branches to
+them are patched at that point."""
+
+from ir import TYPENAMES, ArrayType, StatList, StatSeq, EmptyStat, BranchStat, LoadPtrToSym, StoreStat, \
+    LoadStat, LoadImmStat, BinStat, UnaryStat, PrintCommand, ReadCommand, RetStat
+from support import Visitor
+from tracing import tracer, DEBUG
+
+_trace = tracer('lowering')
+
+
+class Lowering(Visitor):
+    """Emits the low level statements of a tree into the StatList out.
+    The visit_ method of each class of high level nodes either emits the code
+    of a statement, or emits the code computing the value of an expression and
+    returns the temporary it ends up in."""
+
+    def __init__(self, ctx, out):
+        super().__init__()
+        self.ctx = ctx
+        self.seq = out.children  # where the statements are emitted
+
+    def emit(self, stat):
+        self.seq.append(stat)
+        return stat
+
+    def lower(self, node):
+        if _trace.level >= DEBUG:
+            _trace('Lowering', type(node), id(node))
+        return self.dispatch(node)
+
+    def value(self, node):
+        """Lower an expression, and return the temporary holding its value"""
+        dest = self.lower(node)
+        if dest is None:
+            raise RuntimeError(type(node).__name__ + ' used as an expression')
+        return dest
+
+    def lower_aside(self, node):
+        """Lower a statement into a separate sequence, to be emitted later with
+        self.seq.extend(). The code of a statement is not always emitted in the
+        order in which its parts are numbered"""
+        seq, self.seq = self.seq, StatSeq(self.seq.owner)
+        try:
+            self.lower(node)
+            return self.seq
+        finally:
+            self.seq = seq
+
+    def generic_visit(self, node):
+        raise RuntimeError('cannot lower ' + type(node).__name__)
+
+    # EXPRESSIONS
+
+    def visit_Const(self, node):
+        if node.symbol is None:
+            dest = self.ctx.new_temporary(TYPENAMES['int'])
+            self.emit(LoadImmStat(dest=dest, val=node.value, symtab=node.symtab))
+        else:
+            dest = self.ctx.new_temporary(node.symbol.stype)
+            self.emit(LoadStat(dest=dest, symbol=node.symbol, symtab=node.symtab))
+        return dest
+
+    def visit_Var(self, node):
+        dest = self.ctx.new_temporary(node.symbol.stype)
+        self.emit(LoadStat(dest=dest, symbol=node.symbol, symtab=node.symtab))
+        return dest
+
+    def visit_ArrayElement(self, node):
+        off = self.value(node.offset)
+        basetype = node.symbol.stype.basetype
+        dest = self.ctx.new_temporary(basetype)
+        ptrreg = self.ctx.new_temporary(self.ctx.pointer_type(basetype))
+        src = self.ctx.new_temporary(self.ctx.pointer_type(basetype))
+        self.emit(LoadPtrToSym(dest=ptrreg, symbol=node.symbol, symtab=node.symtab))
+        self.emit(BinStat(dest=src, op='plus', srca=ptrreg, srcb=off, symtab=node.symtab))
+        self.emit(LoadStat(dest=dest, symbol=src, symtab=node.symtab))
+        return dest
+
+    def visit_BinExpr(self, node):
+        srca = self.value(node.children[1])
+        srcb = self.value(node.children[2])
+        # type promotion
+        unsigned = 'unsigned' in srca.stype.qual_list and 'unsigned' in srcb.stype.qual_list
+        dest = self.ctx.new_temporary(self.ctx.int_type(max(srca.stype.size, srcb.stype.size), unsigned))
+        self.emit(BinStat(dest=dest, op=node.children[0], srca=srca, srcb=srcb, symtab=node.symtab))
+        return dest
+
+    def visit_UnExpr(self, node):
+        src = self.value(node.children[1])
+        dest = self.ctx.new_temporary(src.stype)
+        self.emit(UnaryStat(dest=dest, op=node.children[0], src=src, symtab=node.symtab))
+        return dest
+
+    def visit_IncExpr(self, node):
+        """x++: the value is the one before the increment"""
+        stype = node.symbol.stype
+        old = self.ctx.new_temporary(stype)
+        one = self.ctx.new_temporary(stype)
+        new = self.ctx.new_temporary(stype)
+        self.emit(LoadStat(dest=old, symbol=node.symbol, symtab=node.symtab))
+        self.emit(LoadImmStat(dest=one, val=1, symtab=node.symtab))
+        self.emit(BinStat(dest=new, op='plus', srca=old, srcb=one, symtab=node.symtab))
+        self.emit(StoreStat(dest=node.symbol, symbol=new, symtab=node.symtab))
+        return old
+
+    def visit_ReadStat(self, node):
+        """The value of a read is the number read"""
+        dest = self.ctx.new_temporary(TYPENAMES['int'])
+        self.emit(ReadCommand(dest=dest, symtab=node.symtab))
+        return dest
+
+    # STATEMENTS
+
+    def visit_StatList(self, node):
+        for stat in node.children:
+            self.lower(stat)
+
+    def visit_EmptyStat(self, node):
+        self.emit(node)
+
+    def visit_CallStat(self, node):
+        # the parameters are ignored
+        self.emit(BranchStat(target=node.call.symbol, symtab=node.symtab, returns=True))
+
+    def visit_AssignStat(self, node):
+        src = self.value(node.expr)
+        dst = node.symbol
+        if node.offset:
+            off = self.value(node.offset)
+            desttype = dst.stype
+            if type(desttype) is ArrayType:  # this is always true at the moment
+                desttype = desttype.basetype
+            ptrreg = self.ctx.new_temporary(self.ctx.pointer_type(desttype))
+            self.emit(LoadPtrToSym(dest=ptrreg, symbol=dst, symtab=node.symtab))
+            dst = self.ctx.new_temporary(self.ctx.pointer_type(desttype))
+            self.emit(BinStat(dest=dst, op='plus', srca=ptrreg, srcb=off, symtab=node.symtab))
+        self.emit(StoreStat(dest=dst, symbol=src, symtab=node.symtab))
+
+    def visit_PrintStat(self, node):
+        self.emit(PrintCommand(src=self.value(node.expr), symtab=node.symtab))
+
+    def visit_ReturnStat(self, node):
+        src = self.value(node.expr)
+        self.emit(StoreStat(dest=node.ret_param_symbol, symbol=src, symtab=node.symtab))
+        self.emit(RetStat(use=node.ret_param_symbol))
+
+    def visit_IfStat(self, node):
+        cond = self.value(node.cond)
+        if node.elsepart:
+            # cond; branch to then; else; branch to exit; then; exit
+            then_stat = EmptyStat(symtab=node.symtab)
+            then = self.lower_aside(node.thenpart)
+            then.insert_after(None, then_stat)
+            branch_to_then = self.emit(BranchStat(None, cond, None, node.symtab))
+            self.lower(node.elsepart)
+            branch_to_exit = self.emit(BranchStat(None, None, None, node.symtab))
+            self.seq.extend(then)
+        else:
+            # cond; branch to exit if false; then; exit
+            branch_to_exit = self.emit(BranchStat(None, cond, None, node.symtab, negcond=True))
+            self.lower(node.thenpart)
+        exit_stat = self.emit(EmptyStat(symtab=node.symtab))
+
+        exit_label = self.ctx.new_label()
+        exit_stat.set_label(exit_label)
+        branch_to_exit.target = exit_label
+        if node.elsepart:
+            then_label = self.ctx.new_label()
+            then_stat.set_label(then_label)
+            branch_to_then.target = then_label
+
+    def visit_WhileStat(self, node):
+        # entry: cond; branch to exit if false; body; branch to entry; exit
+        entry_stat = self.emit(EmptyStat(symtab=node.symtab))
+        cond = self.value(node.cond)
+        branch = self.emit(BranchStat(None, cond, None, node.symtab, negcond=True))
+        self.lower(node.body)
+        loop = self.emit(BranchStat(None, None, None, node.symtab))
+        exit_stat = self.emit(EmptyStat(symtab=node.symtab))
+
+        entry_label = self.ctx.new_label()
+        exit_label = self.ctx.new_label()
+        entry_stat.set_label(entry_label)
+        exit_stat.set_label(exit_label)
+        branch.target = exit_label
+        loop.target = entry_label
+
+    def visit_ForStat(self, node):
+        # init; loop: cond; branch to out if false; body; step; branch to loop; out
+        self.lower(node.init)
+        loop_stat = self.emit(EmptyStat(symtab=node.symtab))
+        cond = self.value(node.cond)
+        branch = self.emit(BranchStat(None, cond, None, node.symtab, negcond=True))
+        step = self.lower_aside(node.step)  # the step comes before the body
+        self.lower(node.body)
+        self.seq.extend(step)
+        loop = self.emit(BranchStat(None, None, None, node.symtab))
+        exit_stat = self.emit(EmptyStat(symtab=node.symtab))
+
+        loop_label = self.ctx.new_label()
+        out_label = self.ctx.new_label()
+        loop_stat.set_label(loop_label)
+        exit_stat.set_label(out_label)
+        branch.target = out_label
+        loop.target = loop_label
+
+
+def lower_block(block, ctx, defs=True):
+    """Replace the body of block with the flat StatList of its low level
+    statements. If defs is True, the procedures defined in the block are
+    lowered too, before the body."""
+    if defs:
+        for fun in block.defs.children:
+            lower_block(fun.body, ctx)
+    out = StatList(block, symtab=block.body.symtab)
+    Lowering(ctx, out).lower(block.body)
+    block.body = out
+    return out
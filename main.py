@@ -4,83 +4,298 @@
 
 import lexer
 import parser
-from support import *
-from datalayout import *
-from cfg import *
-from regalloc import *
-from codegen import *
-
-# reducing headcaches while debugging
-import colored_traceback
-colored_traceback.add_hook()
-
-def compile_program(text):
-    lex = lexer.Lexer(text)
-    pars = parser.Parser(lex)
-    res = pars.program()
-    print("\n", res, "\n")
-
-    res.navigate(print_stat_list)
-    # we want a return here because we're not
-    # ready for the next part
-    # return 0
-
-    node_list = get_node_list(res)
-    for n in node_list:
-        print(type(n), id(n), "->", type(n.parent), id(n.parent))
-    print("\nTotal nodes in IR:", len(node_list), "\n")
-
-    res.navigate(lowering)
-
-    node_list = get_node_list(res)
-    print("\n", res, "\n")
-    for n in node_list:
-        print(type(n), id(n))
-        try:
-            n.flatten()
-        except Exception:
-            pass
-    # res.navigate(flattening)
-    print("\n", res, "\n")
-
-    print_dotty(res, "log.dot")
-
-    print("\n\nDATALAYOUT\n\n")
-    perform_data_layout(res)
-    print("\n", res, "\n")
-
-    cfg = CFG(res)
-    cfg.liveness()
-    cfg.print_liveness()
-    cfg.print_cfg_to_dot("cfg.dot")
-
-    print("\n\nREGALLOC\n\n")
-    ra = LinearScanRegisterAllocator(cfg, 11)
-    reg_alloc = ra()
-    print(reg_alloc)
-
-    print("\n\nCODEGEN\n\n")
-    code = generate_code(res, reg_alloc)
-    print(code)
+from context import CompilationContext
+from ir import print_stat_list
+from support import get_node_list, count_nodes
+from datalayout import perform_data_layout
+from codegen import generate_code
+from units import split_units, parallel_backend
+from passes import PassManager, PASSES, pipeline
+from tracing import tracer, set_levels, INFO, DEBUG
 
+# the modules only needed for debugging, profiling or caching (dot output,
+# colored tracebacks, the profiler, the cache) are imported when requested,
+# to keep the startup of the compiler fast
+
+_trace = tracer('driver')
+
+PHASES = ["parse", "lower", "layout", "opt", "cfg", "liveness", "regalloc", "codegen", "backend"]
+
+
+class NullProfiler(object):
+    """Stand-in for profiler.PhaseProfiler when profiling is disabled (it is
+    here so that profiler.py is not imported otherwise)"""
+
+    enabled = False
+
+    def phase(self, name):
+        return self
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+    def record(self, **metrics):
+        pass
+
+    def finish(self):
+        pass
+
+
+NO_PROFILER = NullProfiler()
+
+
+def compile_program(source, dot=False, profiler=NO_PROFILER, ctx=None, cache=None, options=None, tac=False,
+                    passes=(), print_after=(), jobs=1):
+    """Compile a program. source is either the text of the program or an
+    already initialized lexer (e.g. a lexer.MappedLexer).
+    If dot is True, the IR and the CFG are also dumped to log.dot and cfg.dot.
+    Each phase is measured by profiler (see profiler.PhaseProfiler).
+    All the state of the compilation is kept in ctx; by default a new
+    CompilationContext is used.
+    If cache (a cache.CompileCache) is given, the code of each procedure is
+    looked up there first, and only the procedures not found in it go through
+    the backend; options are the options that are part of the cache key.
+    With tac, the CFG, liveness and register allocation work on the compact
+    three-address code of tac.py (the generated code is the same).
+    passes are the names of the optimization passes to run on each unit (see
+    passes.pipeline()), and print_after those after which the code of the
+    unit is printed to stderr.
+    With jobs > 1, the backend of the units runs in that many worker
+    processes (phase "backend" instead of cfg, liveness, regalloc and
+    codegen), unless the CFG must be dumped to cfg.dot."""
+    if ctx is None:
+        ctx = CompilationContext()
+    lex = lexer.Lexer(source) if isinstance(source, str) else source
+    pars = parser.Parser(lex, ctx)
+    if _trace.level >= INFO:
+        _trace("PARSING")
+    with profiler.phase("parse"):
+        res = pars.program()
+    if profiler.enabled:
+        profiler.record(ir_nodes=count_nodes(res))
+
+    if _trace.level >= DEBUG:
+        _trace("\n", res, "\n")
+        res.navigate(print_stat_list)
+        node_list = get_node_list(res)
+        for n in node_list:
+            _trace(type(n), id(n), "->", type(n.parent), id(n.parent))
+        _trace("Total nodes in IR:", len(node_list))
+
+    units = split_units(res, ctx)
+    if _trace.level >= INFO:
+        _trace("LOWERING")
+    with profiler.phase("lower"):
+        if cache is not None:
+            for unit in units:
+                if unit.lookup(cache, options) and _trace.level >= INFO:
+                    _trace("reusing the code of", unit.name, "from the cache")
+        todo = [unit for unit in units if unit.code is None]
+        for unit in todo:
+            unit.lower()
+    if profiler.enabled:
+        profiler.record(ir_nodes=count_nodes(res), temporaries=sum(u.ctx.tempcount for u in todo),
+                        units=len(units), reused_units=len(units) - len(todo))
+    if _trace.level >= DEBUG:
+        _trace("\n", res, "\n")
+
+    if dot:
+        from dotty import print_dotty
+        print_dotty(res, "log.dot")
+
+    if _trace.level >= INFO:
+        _trace("DATALAYOUT")
+    with profiler.phase("layout"):
+        perform_data_layout(res)
+    if _trace.level >= DEBUG:
+        _trace("\n", res, "\n")
+
+    manager = PassManager(passes, print_after)
+    if passes:
+        if _trace.level >= INFO:
+            _trace("OPTIMIZATION")
+        with profiler.phase("opt"):
+            for unit in todo:
+                manager.run(unit)
+        if profiler.enabled:
+            profiler.record(passes=manager.report(), ir_nodes=count_nodes(res))
+
+    if jobs > 1 and len(todo) > 1 and not dot:
+        if _trace.level >= INFO:
+            _trace("BACKEND in", jobs, "processes")
+        with profiler.phase("backend"):
+            stats = parallel_backend(todo, jobs, 11, tac)
+            code = generate_code([unit.code for unit in units])
+        if profiler.enabled:
+            profiler.record(basic_blocks=sum(s["basic_blocks"] for s in stats),
+                            temporaries=sum(s["temporaries"] for s in stats), spills=sum(s["spills"] for s in stats))
+    else:
+        with profiler.phase("cfg"):
+            for unit in todo:
+                manager.require(unit, "cfg", tac)
+        if profiler.enabled:
+            profiler.record(basic_blocks=sum(len(u.cfg) for u in todo))
+        with profiler.phase("liveness"):
+            for unit in todo:
+                manager.require(unit, "liveness", tac)
+        if tracer('cfg').level >= DEBUG:
+            for unit in todo:
+                unit.cfg.print_liveness()
+        if dot:
+            from dotty import print_cfgs_to_dot
+            print_cfgs_to_dot([u.cfg for u in todo if u.tac is None], "cfg.dot")
+
+        if _trace.level >= INFO:
+            _trace("REGALLOC")
+        with profiler.phase("regalloc"):
+            for unit in todo:
+                unit.allocate_registers(11)
+        if profiler.enabled:
+            profiler.record(temporaries=sum(len(u.allocator.allvars) for u in todo),
+                            spills=sum(u.regalloc.numspill for u in todo))
+        if _trace.level >= DEBUG:
+            for unit in todo:
+                _trace(unit.name, unit.regalloc)
+
+        if _trace.level >= INFO:
+            _trace("CODEGEN")
+        with profiler.phase("codegen"):
+            for unit in todo:
+                unit.codegen()
+            code = generate_code([unit.code for unit in units])
+    if profiler.enabled:
+        profiler.record(asm_lines=code.count("\n"))
+    if _trace.level >= DEBUG:
+        _trace(code)
+
+    if cache is not None and todo:
+        for unit in todo:
+            cache.put(unit.key, unit.code, evict=False)
+        cache.evict()
+
+    return code
+
+
+def compile_cached(source, cache, options=None, **kwargs):
+    """compile_program through a cache.CompileCache (if cache is not None).
+    options are the options that affect the generated code, and are part of
+    the cache key; kwargs are passed on to compile_program. On a miss, the
+    code of the procedures that did not change is still taken from the
+    cache."""
+    if cache is None:
+        return compile_program(source, **kwargs)
+    key = cache.key(source if isinstance(source, str) else source.text, options)
+    code = cache.get(key)
+    if code is None:
+        code = compile_program(source, cache=cache, options=options, **kwargs)
+        cache.put(key, code)
+    elif _trace.level >= INFO:
+        _trace("cache hit", key)
     return code
 
 
+def colored_excepthook(*exc_info):
+    """sys.excepthook that loads colored_traceback (reducing headaches while
+    debugging) only when there actually is a traceback to print"""
+    import sys
+    sys.excepthook = sys.__excepthook__
+    try:
+        import colored_traceback
+        colored_traceback.add_hook()
+    except ImportError:
+        pass
+    sys.excepthook(*exc_info)
+
+
 def driver_main():
+    import argparse
+    import os
+    import sys
+    import time
     from lexer import __test_program
 
-    test_program = __test_program
-    import sys
+    sys.excepthook = colored_excepthook
+
+    argp = argparse.ArgumentParser(description="PL/0 compiler")
+    argp.add_argument("source", nargs="?", help="source file (default: the test program in lexer.py)")
+    argp.add_argument("output", nargs="?", help="assembly output file")
+    argp.add_argument("-o", dest="output_opt", metavar="OUTPUT", help="assembly output file")
+    argp.add_argument("--mmap", action="store_true",
+                      help="lex the source file in place through mmap instead of reading it")
+    argp.add_argument("--trace", metavar="SPEC", default="",
+                      help="trace levels per subsystem, e.g. 'all=1,parser=3' (1: phases, 2: nodes, 3: tokens)")
+    argp.add_argument("--dot", action="store_true", help="dump the IR and the CFG to log.dot and cfg.dot")
+    argp.add_argument("--tac", action="store_true",
+                      help="run the backend passes on compact three-address code (same output, less memory)")
+    argp.add_argument("-O", dest="opt", type=int, choices=(0, 1, 2), default=0,
+                      help="optimization level (default: 0)")
+    argp.add_argument("--disable-pass", metavar="PASS", action="append", default=[], choices=sorted(PASSES),
+                      help="do not run this optimization pass (can be repeated)")
+    argp.add_argument("--print-after", metavar="PASS", action="append", default=[], choices=sorted(PASSES),
+                      help="print the code of each procedure to stderr after this pass (can be repeated)")
+    argp.add_argument("-j", dest="jobs", type=int, default=1,
+                      help="run the backend of the procedures in this many worker processes (default: 1)")
+    argp.add_argument("--ssa", action="store_true",
+                      help="debugging: round-trip the temporaries through SSA form before the other passes "
+                           "(not an optimization, the code stays the same)")
+    argp.add_argument("--profile", metavar="REPORT", nargs="?", const="profile.json",
+                      help="write a JSON report with time, memory and size of each phase (default: profile.json)")
+    argp.add_argument("--profile-no-memory", action="store_true",
+                      help="do not trace memory while profiling (tracemalloc skews the timings)")
+    argp.add_argument("--cprofile", metavar="PHASE", choices=PHASES,
+                      help="also run PHASE under cProfile (phases: " + ", ".join(PHASES) + ")")
+    argp.add_argument("--cprofile-out", metavar="FILE", help="cProfile dump file (default: PHASE.prof)")
+    argp.add_argument("--cache-dir", metavar="DIR", default=os.environ.get("PL0_CACHE_DIR"),
+                      help="reuse the assembly generated for the same source (default: $PL0_CACHE_DIR)")
+    argp.add_argument("--cache-size", metavar="MB", type=int, default=64,
+                      help="maximum size of the cache (default: 64 MB)")
+    args = argp.parse_args()
+    set_levels(args.trace)
+    if _trace.level >= INFO:
+        _trace(sys.argv)
+    output = args.output_opt or args.output
+
+    profiler = NO_PROFILER
+    if args.profile or args.cprofile:
+        from profiler import PhaseProfiler
+        profiler = PhaseProfiler(not args.profile_no_memory, args.cprofile, args.cprofile_out)
+        profiler.info = {
+            "source": args.source,
+            "source_bytes": os.path.getsize(args.source) if args.source else len(__test_program),
+            "python": sys.version.split()[0],
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+
+    # the cache would skip the very things we want to look at
+    cache = None
+    if args.cache_dir and not (args.dot or profiler.enabled):
+        from cache import CompileCache
+        cache = CompileCache(args.cache_dir, args.cache_size * 1024 * 1024)
+
+    passes = pipeline(args.opt, args.disable_pass, args.ssa)
+    kwargs = {"dot": args.dot, "profiler": profiler, "tac": args.tac, "passes": passes,
+              "print_after": args.print_after, "jobs": args.jobs}
+    options = {"passes": ",".join(passes)} if passes else None
+    if args.source is None:
+        code = compile_cached(__test_program, cache, options, **kwargs)
+    elif args.mmap:
+        with lexer.MappedLexer.open(args.source) as lex:
+            code = compile_cached(lex, cache, options, **kwargs)
+    else:
+        code = compile_cached(lexer.read_source(args.source), cache, options, **kwargs)
 
-    print(sys.argv)
-    if len(sys.argv) >= 2:
-        with open(sys.argv[1], "r") as inf:
-            test_program = inf.read()
-    code = compile_program(test_program)
+    profiler.finish()
+    if args.profile:
+        profiler.write_json(args.profile)
 
-    if len(sys.argv) > 2:
-        with open(sys.argv[-1], "w") as outf:
+    if output:
+        with open(output, "w") as outf:
             outf.write(code)
+    else:
+        print(code)
 
 
 if __name__ == "__main__":
@@ -20,40 +20,55 @@
 import ir
 from logger import logger
 from functools import reduce
+from tracing import tracer, DEBUG, VERBOSE
+
+_trace = tracer('parser')
 
 # top down parser
 class Parser:
-    def __init__(self, the_lexer):
+    def __init__(self, the_lexer, ctx):
+        self.ctx = ctx                      # the CompilationContext
         self.sym = None
-        self.value = None                   # name of the token
+        self.token = None                   # raw value of the token, see value
         self.new_sym = None
         self.new_value = None
+        self.lexer = the_lexer
         self.the_lexer = the_lexer.tokens() # generator of new symbols
 
     def getsym(self):
         """Update sym"""
         try:
             self.sym = self.new_sym
-            self.value = self.new_value
+            self.token = self.new_value
             self.new_sym, self.new_value = next(self.the_lexer)
         except StopIteration:
             return 2
-        print("getsym:", self.new_sym, self.new_value)
+        if _trace.level >= VERBOSE:
+            _trace("getsym:", self.new_sym, self.lexer.value(self.new_value))
         return 1
 
+    @property
+    def value(self):
+        """Value of the current token. The lexer may build it lazily, so only
+        ask for it when it is actually needed."""
+        return self.lexer.value(self.token)
+
     def error(self, msg):
-        print("\033[31m", msg, self.new_sym, self.new_value, "\033[39m")
+        where = repr(self.lexer.line) + ":" + repr(self.lexer.col) + ":"
+        print("\033[31m", where, msg, self.new_sym, self.lexer.value(self.new_value), "\033[39m")
 
     # functions used to consume symbols: accept, expect
 
     # accepts any symbol passed as parameter
     def accept(self, s):
-        print("accepting", s, "==", self.new_sym)
+        if _trace.level >= VERBOSE:
+            _trace("accepting", s, "==", self.new_sym)
         return self.getsym() if self.new_sym == s else 0
 
     # imposes next symbol is s, otherwise error
     def expect(self, s):
-        print("expecting", s)
+        if _trace.level >= VERBOSE:
+            _trace("expecting", s)
         if self.accept(s):
             return 1
         self.error("expect: unexpected symbol")
@@ -111,7 +126,8 @@ class Parser:
             offs = self.array_offset(symtab)
             if offs is None:
                 if self.accept('inc'):
-                    print("DEBUG: inc operator parsed")
+                    if _trace.level >= DEBUG:
+                        _trace("inc operator parsed")
                     return ir.IncExpr(var=var, symtab=symtab)
                 else:
                     return ir.Var(var=var, symtab=symtab)
@@ -193,7 +209,8 @@ class Parser:
             expr = self.expression(symtab)
             if self.new_sym in ["eql", "neq", "lss", "leq", "gtr", "geq"]:
                 self.getsym()
-                print("condition operator", self.sym, self.new_sym)
+                if _trace.level >= VERBOSE:
+                    _trace("condition operator", self.sym, self.new_sym)
                 op = self.sym
                 expr2 = self.expression(symtab)
                 return ir.BinExpr(children=[op, expr, expr2], symtab=symtab)
@@ -252,7 +269,8 @@ class Parser:
             while self.accept("semicolon"):
                 statement_list.append(self.statement(symtab))
             self.expect("endsym")
-            statement_list.print_content()
+            if _trace.level >= DEBUG:
+                statement_list.print_content()
             return statement_list
         
         # if-elif-else construct
@@ -347,7 +365,7 @@ class Parser:
             # procedure parameters parsing. grammar production:
             # procedure [ '(' VAR var (',' VAR var)* ';')* ')']
             self.expect("ident")
-            fname = self.value
+            fname = self.ctx.intern(self.value)
             count = 0
             if self.accept("lparen"):
                 self.vardef(parameters, alloct)
@@ -358,7 +376,8 @@ class Parser:
             self.expect("rparen")
             # self.expect("semicolon")
             local_vars.append(ir.Symbol(fname, ir.TYPENAMES["function"], npar=count))
-            print(f"DEBUG: function {fname} with {count} parameters")
+            if _trace.level >= DEBUG:
+                _trace(f"function {fname} with {count} parameters")
             fbody = self.block(local_vars)
             defs.append(ir.FunctionDef(symbol=local_vars.find(fname), body=fbody))
         stat = self.statement(ir.SymbolTable(symtab[:] + local_vars))
@@ -367,7 +386,7 @@ class Parser:
     @logger
     def constdef(self, local_vars, alloct="auto"):
         self.expect("ident")
-        name = self.value
+        name = self.ctx.intern(self.value)
         self.expect("eql")
         self.expect("number")
         local_vars.append(
@@ -375,7 +394,7 @@ class Parser:
         )
         while self.accept("comma"):
             self.expect("ident")
-            name = self.value
+            name = self.ctx.intern(self.value)
             self.expect("eql")
             self.expect("number")
             local_vars.append(
@@ -385,7 +404,7 @@ class Parser:
     @logger
     def vardef(self, symtab, alloct="auto"):
         self.expect("ident")
-        name = self.value
+        name = self.ctx.intern(self.value)
         size = []
         while self.accept("lspar"):
             self.expect("number")
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+
+"""Pass manager for the optimizations on the low level statements.
+The passes run on one unit (see units.py) at a time, after lowering and data
+layout and before the backend. Every pass declares the analyses it needs
+(cfg, liveness, dominators, and the dataflow analyses of cfg.py, see
+DATAFLOW) and whether it changed the code; the manager computes each analysis
+only when a pass (or the backend, see require()) asks for it, and throws
+them all away after a change, so that e.g. the liveness
+computed for dce is reused by the register allocator if dce removed nothing.
+The optimization levels are lists of passes (see LEVELS); for each pass the
+manager records the time it took and how many statements it added or removed."""
+
+import time
+
+from ir import StatList, EmptyStat, BranchStat, LoadStat, LoadImmStat, LoadPtrToSym, BinStat, UnaryStat
+from support import iter_nodes
+from tracing import tracer, INFO
+
+_trace = tracer('passes')
+
+# the dataflow analyses of cfg.py, by name
+DATAFLOW = {
+    'reaching-defs': 'ReachingDefinitions',
+    'available-exprs': 'AvailableExpressions',
+    'very-busy-exprs': 'VeryBusyExpressions',
+}
+ANALYSES = ('cfg', 'liveness', 'dominators') + tuple(DATAFLOW)  # all of them depend on the first
+
+
+class Pass(object):
+    """A transformation of the low level statements of a unit. run() returns
+    whether the code changed"""
+
+    name = None
+    requires = ()  # analyses that must be up to date when run() is called
+
+    def run(self, unit):
+        raise NotImplementedError
+
+
+def is_temporary(symbol):
+    return symbol is not None and symbol.alloct == 'reg'
+
+
+def _wrap(value):
+    """value as a 32 bit signed integer, like the registers hold it"""
+    value &= 0xffffffff
+    return value - 0x100000000 if value & 0x80000000 else value
+
+
+def _divide(a, b):
+    q = abs(a) // abs(b)  # sdiv truncates towards zero
+    return -q if (a < 0) != (b < 0) else q
+
+
+BINARY = {
+    'plus': lambda a, b: a + b,
+    'minus': lambda a, b: a - b,
+    'times': lambda a, b: a * b,
+    'slash': lambda a, b: _divide(a, b) if b else None,
+    'eql': lambda a, b: int(a == b),
+    'neq': lambda a, b: int(a != b),
+    'lss': lambda a, b: int(a < b),
+    'leq': lambda a, b: int(a <= b),
+    'gtr': lambda a, b: int(a > b),
+    'geq': lambda a, b: int(a >= b),
+}
+
+UNARY = {
+    'plus': lambda a: a,
+    'minus': lambda a: -a,
+    'odd': lambda a: a & 1,
+}
+
+
+def replace_stat(old, new):
+    """Put new in the place of old in its StatList, with the label of old"""
+    if old.get_label():
+        new.set_label(old.get_label())
+        old.label = None
+    new.parent = old.parent
+    old.parent.children.replace(old, new)
+
+
+def def_counts(root):
+    """temporary -> how many statements assign it"""
+    res = {}
+    for sl in iter_nodes(root, StatList):
+        for stat in sl.children:
+            for slot in stat.def_slots:
+                v = getattr(stat, slot)
+                if is_temporary(v):
+                    res[v] = res.get(v, 0) + 1
+    return res
+
+
+def constants(root, ndefs):
+    """temporary -> value, for the temporaries assigned only once, by a
+    LoadImmStat"""
+    res = {}
+    for sl in iter_nodes(root, StatList):
+        for stat in sl.children:
+            if type(stat) is LoadImmStat and ndefs.get(stat.dest) == 1:
+                res[stat.dest] = stat.val
+    return res
+
+
+class ConstantFolding(Pass):
+    """Compute the operations on constant temporaries at compile time"""
+
+    name = 'const-fold'
+
+    def run(self, unit):
+        ndefs = def_counts(unit.root())
+        consts = constants(unit.root(), ndefs)
+        changed = False
+        for sl in iter_nodes(unit.root(), StatList):
+            for stat in sl.children:
+                t = type(stat)
+                if t is BinStat and stat.srca in consts and stat.srcb in consts and stat.op in BINARY:
+                    val = BINARY[stat.op](consts[stat.srca], consts[stat.srcb])
+                elif t is UnaryStat and stat.src in consts and stat.op in UNARY:
+                    val = UNARY[stat.op](consts[stat.src])
+                else:
+                    continue
+                if val is None:
+                    continue
+                val = _wrap(val)
+                replace_stat(stat, LoadImmStat(dest=stat.dest, val=val, symtab=stat.symtab))
+                if ndefs[stat.dest] == 1:  # then it is a constant for the following statements too
+                    consts[stat.dest] = val
+                changed = True
+        return changed
+
+
+class BranchFolding(Pass):
+    """Turn the conditional branches on a constant condition into
+    unconditional branches, or remove them"""
+
+    name = 'branch-fold'
+
+    def run(self, unit):
+        consts = constants(unit.root(), def_counts(unit.root()))
+        changed = False
+        for sl in iter_nodes(unit.root(), StatList):
+            for stat in sl.children:
+                if type(stat) is not BranchStat or stat.returns or stat.cond not in consts:
+                    continue
+                if bool(consts[stat.cond]) != stat.negcond:
+                    stat.cond = None
+                    stat.negcond = False
+                else:
+                    replace_stat(stat, EmptyStat(symtab=stat.symtab))
+                changed = True
+        return changed
+
+
+class DeadCodeElimination(Pass):
+    """Remove the statements without side effects that assign a temporary
+    which is not live after them"""
+
+    name = 'dce'
+    requires = ('liveness',)
+    PURE = (LoadStat, LoadImmStat, LoadPtrToSym, BinStat, UnaryStat)
+
+    def run(self, unit):
+        changed = False
+        for bb in unit.cfg:
+            live = set(bb.live_out)
+            for stat in reversed(bb.instrs):
+                if type(stat) in self.PURE and is_temporary(stat.dest) and stat.dest not in live:
+                    if stat.get_label():
+                        replace_stat(stat, EmptyStat(symtab=stat.symtab))
+                    else:
+                        stat.parent.children.remove(stat)
+                    changed = True
+                    continue
+                live.difference_update(stat.collect_kills() if hasattr(stat, 'collect_kills') else ())
+                live.update(stat.collect_uses())
+        return changed
+
+
+class SSARoundTrip(Pass):
+    """Translate the temporaries into SSA form and back (see ssa.py), so
+    that each definition gets a temporary of its own"""
+
+    name = 'ssa'
+    requires = ('dominators',)
+
+    def run(self, unit):
+        from ssa import SSAForm
+        temps = unit.ctx.tempcount
+        for cfg in unit.cfg.functions:
+            SSAForm(cfg, unit.ctx).destruct()
+        return unit.ctx.tempcount != temps  # any renaming uses new temporaries
+
+
+PASSES = {p.name: p for p in (SSARoundTrip, ConstantFolding, BranchFolding, DeadCodeElimination)}
+
+LEVELS = {
+    0: [],
+    1: ['const-fold', 'dce'],
+    2: ['const-fold', 'branch-fold', 'dce', 'dce'],
+}
+
+
+def pipeline(level=0, disabled=(), ssa=False):
+    """Names of the passes run at an optimization level, without the disabled
+    ones; with ssa, the temporaries go through SSA form first"""
+    names = (['ssa'] if ssa else []) + LEVELS[level]
+    return [name for name in names if name not in disabled]
+
+
+def unit_size(unit):
+    """Number of low level statements of a unit"""
+    return sum(len(sl.children) for sl in iter_nodes(unit.root(), StatList))
+
+
+class PassStats(object):
+    def __init__(self, name):
+        self.name = name
+        self.runs = 0
+        self.changed = 0
+        self.wall = 0.0
+        self.size_before = 0
+        self.size_after = 0
+
+    def as_dict(self):
+        return {'pass': self.name, 'runs': self.runs, 'changed': self.changed, 'wall': self.wall,
+                'stats_before': self.size_before, 'stats_after': self.size_after}
+
+
+class PassManager(object):
+    """Runs a list of passes (by name) on the units, and keeps track of the
+    analyses that are up to date for each unit. print_after is a collection
+    of pass names: the code of the unit is written to out after each of
+    them."""
+
+    def __init__(self, names, print_after=(), out=None):
+        self.passes = [PASSES[name]() for name in names]
+        self.print_after = set(print_after)
+        self.out = out
+        self.valid = {}  # unit -> the analyses computed on its current code
+        self.stats = []  # a PassStats per entry in passes
+        for p in self.passes:
+            self.stats.append(PassStats(p.name))
+
+    def require(self, unit, analysis, tac=False):
+        """Make sure an analysis of the unit is up to date. With tac, the CFG
+        and the liveness are those of tac.py (dominators are not available
+        there)"""
+        if analysis not in ANALYSES:
+            raise ValueError('unknown analysis ' + repr(analysis))
+        valid = self.valid.setdefault(unit, set())
+        if 'cfg' in valid and (unit.tac is not None) != tac:
+            valid.clear()
+        if analysis in valid:
+            return
+        if analysis == 'cfg':
+            unit.build_cfg(tac)
+        else:
+            self.require(unit, 'cfg', tac)
+            if analysis == 'liveness':
+                unit.cfg.liveness()
+            elif analysis == 'dominators':
+                unit.cfg.dominators()
+            else:
+                import cfg
+                unit.cfg.dataflow(getattr(cfg, DATAFLOW[analysis]))
+        valid.add(analysis)
+
+    def invalidate(self, unit):
+        self.valid.pop(unit, None)
+
+    def run(self, unit):
+        for p, st in zip(self.passes, self.stats):
+            start = time.perf_counter()
+            for analysis in p.requires:
+                self.require(unit, analysis)
+            before = unit_size(unit)
+            changed = p.run(unit)
+            if changed:
+                self.invalidate(unit)
+            after = unit_size(unit)
+            st.runs += 1
+            st.changed += bool(changed)
+            st.wall += time.perf_counter() - start
+            st.size_before += before
+            st.size_after += after
+            if _trace.level >= INFO:
+                _trace(p.name, 'on', unit.name, '{:.4f}s'.format(time.perf_counter() - start),
+                       before, '->', after, 'statements')
+            if p.name in self.print_after:
+                self.print_unit(unit, p.name)
+
+    def print_unit(self, unit, name):
+        import sys
+        out = self.out or sys.stderr
+        out.write('*** ' + unit.name + ' after ' + name + '\n')
+        for sl in iter_nodes(unit.root(), StatList):
+            for stat in sl.children:
+                out.write('\t' + repr(stat) + '\n')
+
+    def report(self):
+        return [st.as_dict() for st in self.stats]
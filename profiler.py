@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+"""Per-phase profiler for the compiler driver.
+For each phase of the compilation it records wall time, CPU time and peak
+memory (traced by tracemalloc from the start of the first phase), plus whatever
+metrics the driver attaches to it (IR node count, basic blocks, temporaries,
+spills...). The result can be saved as a JSON report. Optionally, one selected
+phase is also run under cProfile.
+Note that tracemalloc slows everything down a lot: use trace_memory=False for
+accurate timings."""
+
+import time
+from contextlib import contextmanager
+
+
+class Phase(object):
+    def __init__(self, name):
+        self.name = name
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.peak_memory = 0
+        self.metrics = {}
+
+    def as_dict(self):
+        res = {'name': self.name, 'wall': self.wall, 'cpu': self.cpu, 'peak_memory': self.peak_memory}
+        res.update(self.metrics)
+        return res
+
+
+class PhaseProfiler(object):
+    """Collects the statistics of the phases of one compilation"""
+
+    enabled = True
+
+    def __init__(self, trace_memory=True, cprofile_phase=None, cprofile_file=None):
+        self.phases = []
+        self.trace_memory = trace_memory
+        self.cprofile_phase = cprofile_phase
+        self.cprofile_file = cprofile_file or (str(cprofile_phase) + '.prof')
+        self.info = {}
+        self.started_tracing = False
+
+    @contextmanager
+    def phase(self, name):
+        ph = Phase(name)
+        self.phases.append(ph)
+        if self.trace_memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.started_tracing = True
+            tracemalloc.reset_peak()
+        prof = None
+        if name == self.cprofile_phase:
+            import cProfile
+            prof = cProfile.Profile()
+            prof.enable()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield ph
+        finally:
+            ph.wall = time.perf_counter() - wall
+            ph.cpu = time.process_time() - cpu
+            if prof:
+                prof.disable()
+                prof.dump_stats(self.cprofile_file)
+            if self.trace_memory:
+                import tracemalloc
+                ph.peak_memory = tracemalloc.get_traced_memory()[1]
+
+    def finish(self):
+        """Stop memory tracing, if this profiler started it"""
+        if self.started_tracing:
+            import tracemalloc
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def record(self, **metrics):
+        """Attach metrics to the last phase"""
+        self.phases[-1].metrics.update(metrics)
+
+    def report(self):
+        return {
+            'info': self.info,
+            'total': {
+                'wall': sum(p.wall for p in self.phases),
+                'cpu': sum(p.cpu for p in self.phases),
+                'peak_memory': max([p.peak_memory for p in self.phases], default=0),
+            },
+            'phases': [p.as_dict() for p in self.phases],
+        }
+
+    def write_json(self, filename):
+        import json
+        with open(filename, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+            f.write('\n')
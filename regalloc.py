@@ -4,7 +4,10 @@
 Assumes that all temporaries can be allocated to any register (because of this,
 it does not work with non integer types)."""
 
-from cfg import *
+from cfg import remove_non_regs
+from tracing import tracer, INFO, DEBUG
+
+_trace = tracer('regalloc')
 
 # the register of all spilled temporaries is set to SPILL_FLAG
 SPILL_FLAG = 999
@@ -18,13 +21,15 @@ class RegisterAllocation(object):
     as late as possible, and spilled again as soon as possible. This class is
     responsible for filling these registers."""
 
-    def __init__(self, vartoreg, numspill, nregs):
+    def __init__(self, vartoreg, numspill, nregs, ctx):
         self.vartoreg = vartoreg
         self.numspill = numspill
         self.nregs = nregs
         self.vartospillframeoffset = dict()
         self.spillregi = 0
         self.spillframeoffseti = 0
+        # the CompilationContext, used by the code generator
+        self.ctx = ctx
 
     def update(self, otherra):
         self.vartoreg.update(otherra.vartoreg)
@@ -76,9 +81,10 @@ class LinearScanRegisterAllocator(object):
     """The register allocator. Produces RegisterAllocation objects from a control
     flow graph."""
 
-    def __init__(self, cfg, nregs):
+    def __init__(self, cfg, nregs, ctx):
         self.cfg = cfg
         self.nregs = nregs
+        self.ctx = ctx
 
         # liveness of a variable on entry to each instruction
         # in order of start point
@@ -90,13 +96,25 @@ class LinearScanRegisterAllocator(object):
     def compute_liveness_intervals(self):
         """computes liveness intervals for the whole program. Note that the CFG
         is flattened: this is the reason why the linear scan register allocation
-        algorithm does not handle liveness holes properly"""
+        algorithm does not handle liveness holes properly.
+        A temporary live on entry to (or on exit from) a block is live from
+        the start (or up to the end) of the block, as found by the liveness
+        analysis: this extends the intervals along the back edges of loops,
+        where a temporary can be used before its last definition in layout
+        order"""
         inst_index = 0
         min_gen = {}
         max_use = {}
         vars = set()
 
         for bb in self.cfg:
+            live_in = remove_non_regs(bb.live_in)
+            for var in live_in:
+                if not var in min_gen:
+                    min_gen[var] = inst_index
+                max_use[var] = inst_index
+            vars |= live_in
+
             for i in bb.instrs:
                 try:
                     kill = list(i.collect_kills())
@@ -118,12 +136,19 @@ class LinearScanRegisterAllocator(object):
 
                 inst_index += 1
 
+            # up to the first instruction of the next block
+            live_out = remove_non_regs(bb.live_out)
+            for var in live_out:
+                if not var in min_gen:
+                    min_gen[var] = inst_index
+                max_use[var] = inst_index
+            vars |= live_out
+
         for v in vars:
             gen = min_gen[v]
             kill = max_use[v]
-            self.varliveness.insert(0, {"var": v, "interv": range(gen, kill)})
-        print("DEBUG:")
-        print(self.varliveness)
+            # a temporary that is never used still needs a register where it is assigned
+            self.varliveness.insert(0, {"var": v, "interv": range(gen, max(kill, gen + 1))})
         self.varliveness.sort(key=lambda x: x['interv'][0])
         self.allvars = list(vars)
 
@@ -132,8 +157,8 @@ class LinearScanRegisterAllocator(object):
                 graph coloring algorithm known as "left-edge")"""
 
         self.compute_liveness_intervals()
-        print('LIVENESS INTERVALS:')
-        print(self.varliveness)
+        if _trace.level >= DEBUG:
+            _trace('LIVENESS INTERVALS:', self.varliveness)
 
         live = []
         freeregs = set(range(0, self.nregs - 2))  # -2 for spill room
@@ -171,5 +196,7 @@ class LinearScanRegisterAllocator(object):
             # sort the active intervals by increasing end point
             live.sort(key=lambda li: li['interv'][-1])
 
-        return RegisterAllocation(self.vartoreg, numspill, self.nregs)
+        if _trace.level >= INFO:
+            _trace(len(self.varliveness), 'temporaries,', numspill, 'spilled')
+        return RegisterAllocation(self.vartoreg, numspill, self.nregs, self.ctx)
 
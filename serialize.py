@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+
+"""Binary format of a lowered unit (see units.py), for caching the work of
+the frontend and for shipping the backend work to other processes.
+The tree of a unit holds references to parents, symbol tables and symbols
+shared with the rest of the program, so it cannot be pickled by itself. Here
+types, symbols and symbol tables are numbered and written once in tables,
+and the nodes refer to them by number. Everything is a flat sequence of
+integers (with the strings in a table of their own), written and read with
+array and struct:
+
+    header   magic, FORMAT_VERSION, size of the integers (4 or 8 bytes),
+             number of strings, number of integers
+    strings  length of each string, then the UTF-8 text of all of them
+    ints     context, types, symbols, symbol tables, then the nodes in
+             pre-order
+
+A unit must be lowered and laid out before it is dumped: only the nodes that
+can be there at that point (the low level statements, StatList, Block,
+DefinitionList, FunctionDef) are supported."""
+
+import gc
+import struct
+import sys
+from array import array
+
+from context import CompilationContext
+from datalayout import LocalSymbolLayout, GlobalSymbolLayout
+from ir import TYPENAMES, Type, ArrayType, PointerType, Symbol, SymbolTable, Block, DefinitionList, FunctionDef, \
+    StatList, EmptyStat, LoadStat, LoadImmStat, LoadPtrToSym, StoreStat, BinStat, UnaryStat, BranchStat, PrintCommand, \
+    ReadCommand, RetStat
+
+MAGIC = b'PL0U'
+FORMAT_VERSION = 1  # change it whenever the format changes
+
+_HEADER = struct.Struct('<4sHBII')
+_SWAP = sys.byteorder != 'little'  # the arrays are stored little endian
+
+NONE = -1
+
+# kinds of types
+T_BUILTIN, T_INT, T_ARRAY, T_POINTER = range(4)
+# kinds of symbols: temporaries, and everything else
+S_TEMP, S_FULL = range(2)
+# kinds of values of symbols, and of the layout of symbols
+V_NONE, V_INT, V_STR = range(3)
+L_NONE, L_LOCAL, L_GLOBAL = range(3)
+
+# the attributes of the low level statements, other than label and symtab:
+# 's' a symbol, 'i' an integer, 'o' an operator (a string), 'b' a bool
+STATEMENTS = (
+    (EmptyStat, ()),
+    (LoadStat, (('dest', 's'), ('symbol', 's'), ('usehint', 's'))),
+    (LoadImmStat, (('dest', 's'), ('val', 'i'))),
+    (LoadPtrToSym, (('dest', 's'), ('symbol', 's'))),
+    (StoreStat, (('dest', 's'), ('symbol', 's'), ('killhint', 's'))),
+    (BinStat, (('dest', 's'), ('op', 'o'), ('srca', 's'), ('srcb', 's'))),
+    (UnaryStat, (('dest', 's'), ('op', 'o'), ('src', 's'))),
+    (BranchStat, (('cond', 's'), ('target', 's'), ('returns', 'b'), ('negcond', 'b'))),
+    (PrintCommand, (('src', 's'),)),
+    (ReadCommand, (('dest', 's'),)),
+    (RetStat, (('use', 's'),)),
+)
+N_STATLIST, N_BLOCK, N_DEFLIST, N_FUNDEF = range(len(STATEMENTS), len(STATEMENTS) + 4)
+_STAT_CODE = {cls: code for code, (cls, fields) in enumerate(STATEMENTS)}
+
+
+class Writer(object):
+    def __init__(self):
+        self.ints = array('q')
+        self.strings = []
+        self.string_ids = {}
+        self.types = {}  # id(type) -> number
+        self.symbols = {}  # id(symbol) -> number
+        self.symtabs = {}  # id(symtab) -> number
+        self.keep = []  # the objects numbered by id(), so that the ids stay valid
+        # the tables are written to separate arrays, the nodes after them
+        self.type_ints = array('q')
+        self.symbol_ints = array('q')
+        self.symtab_ints = array('q')
+
+    def string(self, s):
+        i = self.string_ids.get(s)
+        if i is None:
+            i = self.string_ids[s] = len(self.strings)
+            self.strings.append(s)
+        return i
+
+    def type(self, t):
+        i = self.types.get(id(t))
+        if i is not None:
+            return i
+        out = self.type_ints
+        if TYPENAMES.get(t.name) is t:
+            rec = (T_BUILTIN, self.string(t.name))
+        elif type(t) is PointerType:
+            rec = (T_POINTER, self.type(t.pointstotype))
+        elif type(t) is ArrayType:
+            rec = (T_ARRAY, self.string(t.name), self.type(t.basetype), len(t.dims)) + tuple(t.dims)
+        elif type(t) is Type:
+            rec = (T_INT, self.string(t.name), t.size, self.string(t.basetype), 'unsigned' in t.qual_list)
+        else:
+            raise ValueError('cannot serialize the type ' + repr(t.name))
+        # the types it depends on are numbered first
+        i = self.types[id(t)] = len(self.types)
+        self.keep.append(t)
+        out.extend(rec)
+        return i
+
+    def symbol(self, s):
+        if s is None:
+            return NONE
+        i = self.symbols.get(id(s))
+        if i is not None:
+            return i
+        if s.alloct == 'reg' and s.value is None and s.npar is None and s.allocinfo is None:
+            rec = (S_TEMP, self.string(s.name), self.type(s.stype))  # most of them
+        else:
+            rec = self.full_symbol(s)
+        i = self.symbols[id(s)] = len(self.symbols)
+        self.keep.append(s)
+        self.symbol_ints.extend(rec)
+        return i
+
+    def full_symbol(self, s):
+        rec = [S_FULL, self.string(s.name), self.type(s.stype), self.string(s.alloct),
+               NONE if s.npar is None else s.npar]
+        if type(s.value) is int:
+            rec += (V_INT, s.value)
+        elif type(s.value) is str:
+            rec += (V_STR, self.string(s.value))
+        else:  # labels point to their statement, which sets it again when loaded
+            rec += (V_NONE, 0)
+        ai = s.allocinfo
+        if ai is None:
+            rec += (L_NONE,)
+        elif type(ai) is LocalSymbolLayout:
+            rec += (L_LOCAL, self.string(ai.symname), ai.fpreloff, ai.bsize)
+        else:
+            rec += (L_GLOBAL, self.string(ai.symname), ai.bsize)
+        return rec
+
+    def symtab(self, st):
+        if st is None:
+            return NONE
+        i = self.symtabs.get(id(st))
+        if i is None:
+            syms = [self.symbol(s) for s in st]
+            i = self.symtabs[id(st)] = len(self.symtabs)
+            self.keep.append(st)
+            self.symtab_ints.append(len(syms))
+            self.symtab_ints.extend(syms)
+        return i
+
+    def node(self, node):
+        out = self.ints
+        code = _STAT_CODE.get(type(node))
+        if code is not None:
+            out.extend((code, self.symtab(node.symtab), self.symbol(node.label)))
+            for attr, kind in STATEMENTS[code][1]:
+                value = getattr(node, attr)
+                if kind == 's':
+                    out.append(self.symbol(value))
+                elif kind == 'o':
+                    out.append(self.string(value))
+                else:
+                    out.append(int(value))
+        elif type(node) is StatList:
+            out.extend((N_STATLIST, self.symtab(node.symtab), self.symbol(node.label), len(node.children)))
+            for stat in node.children:
+                self.node(stat)
+        elif type(node) is Block:
+            out.extend((N_BLOCK, self.symtab(node.symtab), self.symtab(node.global_symtab), node.stackroom))
+            self.node(node.defs)
+            self.node(node.body)
+        elif type(node) is DefinitionList:
+            out.extend((N_DEFLIST, len(node.children)))
+            for fun in node.children:
+                self.node(fun)
+        elif type(node) is FunctionDef:
+            out.extend((N_FUNDEF, self.symbol(node.symbol)))
+            self.node(node.body)
+        else:
+            raise ValueError('cannot serialize ' + type(node).__name__ + ' (is the unit lowered?)')
+
+    def getvalue(self, ctx):
+        """The bytes of everything written so far; ctx is the context of the
+        unit"""
+        ints = array('q', (self.string(ctx.prefix), ctx.tempcount, ctx.labelcount, ctx.constcount,
+                           len(self.types), len(self.symbols), len(self.symtabs)))
+        ints += self.type_ints
+        ints += self.symbol_ints
+        ints += self.symtab_ints
+        ints += self.ints
+        if -0x80000000 <= min(ints) and max(ints) <= 0x7fffffff:
+            ints = array('i', ints)  # half the size, unless there are big constants
+        text = [s.encode() for s in self.strings]
+        lengths = array('I', [len(b) for b in text])
+        if _SWAP:
+            ints.byteswap()
+            lengths.byteswap()
+        return b''.join((_HEADER.pack(MAGIC, FORMAT_VERSION, ints.itemsize, len(text), len(ints)), lengths.tobytes(),
+                         b''.join(text), ints.tobytes()))
+
+
+class Reader(object):
+    def __init__(self, data):
+        data = memoryview(data)
+        magic, version, width, nstrings, nints = _HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError('not a serialized unit')
+        if version != FORMAT_VERSION:
+            raise ValueError('unit serialized with format ' + repr(version) + ', expected ' + repr(FORMAT_VERSION))
+        pos = _HEADER.size
+        lengths = array('I')
+        lengths.frombytes(data[pos:pos + 4 * nstrings])
+        if _SWAP:
+            lengths.byteswap()
+        pos += 4 * nstrings
+        self.strings = []
+        for n in lengths:
+            self.strings.append(str(data[pos:pos + n], 'utf-8'))
+            pos += n
+        ints = array('i' if width == 4 else 'q')
+        ints.frombytes(data[pos:pos + width * nints])
+        if _SWAP:
+            ints.byteswap()
+        self.ints = ints.tolist()  # much faster to index and slice
+        self.pos = 0
+
+    def next(self):
+        self.pos += 1
+        return self.ints[self.pos - 1]
+
+    def take(self, n):
+        self.pos += n
+        return self.ints[self.pos - n:self.pos]
+
+    def context(self):
+        ctx = CompilationContext(self.strings[self.next()])
+        ctx.tempcount, ctx.labelcount, ctx.constcount = self.take(3)
+        ntypes, nsymbols, nsymtabs = self.take(3)
+        strings = self.strings
+        self.types = []
+        for i in range(ntypes):
+            kind = self.next()
+            if kind == T_BUILTIN:
+                t = TYPENAMES[strings[self.next()]]
+            elif kind == T_POINTER:
+                t = PointerType(self.types[self.next()])
+            elif kind == T_ARRAY:
+                name, base, ndims = self.take(3)
+                t = ArrayType(strings[name], list(self.take(ndims)), self.types[base])
+            else:
+                name, size, base, unsigned = self.take(4)
+                t = Type(strings[name], size, strings[base], ['unsigned'] if unsigned else [])
+            self.types.append(t)
+        self.symbols = []
+        for i in range(nsymbols):
+            if self.next() == S_TEMP:
+                name, stype = self.take(2)
+                self.symbols.append(Symbol(strings[name], self.types[stype], alloct='reg'))
+                continue
+            name, stype, alloct, npar, vkind, value, lkind = self.take(7)
+            if vkind == V_STR:
+                value = strings[value]
+            elif vkind == V_NONE:
+                value = None
+            s = Symbol(strings[name], self.types[stype], None if npar == NONE else npar, value, strings[alloct])
+            if lkind == L_LOCAL:
+                symname, off, bsize = self.take(3)
+                s.allocinfo = LocalSymbolLayout(strings[symname], off, bsize)
+            elif lkind == L_GLOBAL:
+                symname, bsize = self.take(2)
+                s.allocinfo = GlobalSymbolLayout(strings[symname], bsize)
+            self.symbols.append(s)
+        self.symtabs = []
+        for i in range(nsymtabs):
+            self.symtabs.append(SymbolTable(self.symbols[x] for x in self.take(self.next())))
+        return ctx
+
+    def symbol(self, i):
+        return None if i == NONE else self.symbols[i]
+
+    def symtab(self, i):
+        return None if i == NONE else self.symtabs[i]
+
+    def node(self):
+        code = self.next()
+        if code < len(STATEMENTS):
+            cls, fields = STATEMENTS[code]
+            symtab, label = self.take(2)
+            kwargs = {}
+            for (attr, kind), value in zip(fields, self.take(len(fields))):
+                if kind == 's':
+                    kwargs[attr] = self.symbol(value)
+                elif kind == 'o':
+                    kwargs[attr] = self.strings[value]
+                elif kind == 'b':
+                    kwargs[attr] = bool(value)
+                else:
+                    kwargs[attr] = value
+            node = cls(symtab=self.symtab(symtab), **kwargs)
+        elif code == N_STATLIST:
+            symtab, label, n = self.take(3)
+            node = StatList(children=[self.node() for i in range(n)], symtab=self.symtab(symtab))
+        elif code == N_BLOCK:
+            symtab, global_symtab, stackroom = self.take(3)
+            defs = self.node()
+            node = Block(gl_sym=self.symtab(global_symtab), lc_sym=self.symtab(symtab), defs=defs, body=self.node())
+            node.stackroom = stackroom
+            return node
+        elif code == N_DEFLIST:
+            return DefinitionList(children=[self.node() for i in range(self.next())])
+        elif code == N_FUNDEF:
+            symbol = self.symbol(self.next())
+            return FunctionDef(symbol=symbol, body=self.node())
+        else:
+            raise ValueError('unknown node ' + repr(code))
+        if label != NONE:
+            node.set_label(self.symbols[label])
+        return node
+
+
+def dump_unit(unit):
+    """The bytes of a lowered unit. The procedures of the main program are not
+    part of its unit, so they are left out"""
+    w = Writer()
+    root = unit.node
+    if isinstance(root, Block):
+        # only the code of the main program, with the same symbol tables
+        w.ints.extend((N_BLOCK, w.symtab(root.symtab), w.symtab(root.global_symtab), root.stackroom,
+                       N_DEFLIST, 0))
+        w.node(root.body)
+    else:
+        w.node(root)
+    return w.getvalue(unit.ctx)
+
+
+def load_unit(data):
+    """A units.Unit from the bytes written by dump_unit()"""
+    from units import Unit
+    # the cyclic garbage collector would scan the new nodes over and over
+    # while they are created, doubling the time
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        r = Reader(data)
+        ctx = r.context()
+        unit = Unit(r.node(), ctx)
+    finally:
+        if enabled:
+            gc.enable()
+    if r.pos != len(r.ints):
+        raise ValueError('trailing data after the unit')
+    return unit
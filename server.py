@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+"""Persistent compile server, and its client.
+The server keeps the compiler loaded and accepts compile requests over a Unix
+domain socket; each request is served in a forked child, so that concurrent
+clients really run in parallel and no state leaks from one request to the next.
+Usage:
+    server.py serve [--socket PATH]
+    server.py compile [--socket PATH] SOURCE [-o OUTPUT]
+The protocol is one JSON object per line in each direction:
+    request:  {"source": "...", "filename": "..."}
+    response: {"ok": true, "assembly": "...", "diagnostics": "...",
+               "error": null, "time": 0.012}
+The client only imports the standard library, so it starts quickly."""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import time
+
+DEFAULT_SOCKET = os.environ.get('PL0_SOCKET') or '/tmp/pl0com-' + repr(os.getuid()) + '.sock'
+
+
+def compile_request(request):
+    """Compile the source of a request. The output of the compiler (parse
+    errors, traces) is returned as diagnostics"""
+    import io
+    from contextlib import redirect_stdout, redirect_stderr
+    from main import compile_program
+
+    out = io.StringIO()
+    code = None
+    error = None
+    with redirect_stdout(out), redirect_stderr(out):
+        try:
+            code = compile_program(request['source'])
+        except Exception as e:
+            error = type(e).__name__ + ': ' + str(e)
+    return {'ok': error is None, 'assembly': code, 'diagnostics': out.getvalue(), 'error': error}
+
+
+def serve(path):
+    import socketserver
+
+    class CompileHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            start = time.perf_counter()
+            line = self.rfile.readline()
+            if not line.strip():
+                return  # the client went away without asking anything
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict) or not isinstance(request.get('source'), str):
+                    raise ValueError('expected an object with a "source" string')
+                name = request.get('filename') or '<stdin>'
+                response = compile_request(request)
+            except ValueError as e:
+                response = {'ok': False, 'assembly': None, 'diagnostics': '', 'error': 'bad request: ' + str(e)}
+                name = '<bad request>'
+            response['time'] = time.perf_counter() - start
+            try:
+                self.wfile.write(json.dumps(response).encode() + b'\n')
+            except (BrokenPipeError, ConnectionResetError):
+                name += ' (client gone)'
+            print('{} {:8.2f} ms {}'.format('ok  ' if response['ok'] else 'FAIL', response['time'] * 1000, name),
+                  file=sys.stderr, flush=True)
+
+    class CompileServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+        pass
+
+    # pay for the imports (and the first compilation) once, before forking
+    compile_request({'source': 'VAR x; BEGIN x := 1 END.'})
+
+    if os.path.exists(path):
+        os.unlink(path)
+    with CompileServer(path, CompileHandler) as server:
+        print('serving on', path, file=sys.stderr, flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(path)
+
+
+def request_compile(path, source, filename=None):
+    """Client side: send a source to the server and return its response"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(path)
+        s.sendall(json.dumps({'source': source, 'filename': filename}).encode() + b'\n')
+        with s.makefile('rb') as f:
+            return json.loads(f.readline())
+
+
+def client_main(args):
+    with open(args.source, 'r') as inf:
+        source = inf.read()
+    start = time.perf_counter()
+    res = request_compile(args.socket, source, args.source)
+    sys.stdout.write(res['diagnostics'])
+    if not res['ok']:
+        print('error:', res['error'], file=sys.stderr)
+        return 1
+    if args.output:
+        with open(args.output, 'w') as outf:
+            outf.write(res['assembly'])
+    else:
+        sys.stdout.write(res['assembly'])
+    if args.verbose:
+        print('compiled in {:.2f} ms, {:.2f} ms round trip'.format(
+            res['time'] * 1000, (time.perf_counter() - start) * 1000), file=sys.stderr)
+    return 0
+
+
+def server_main():
+    argp = argparse.ArgumentParser(description="PL/0 compile server")
+    sub = argp.add_subparsers(dest="command", required=True)
+    serve_cmd = sub.add_parser("serve", help="run the server")
+    serve_cmd.add_argument("--socket", default=DEFAULT_SOCKET, help="socket path (default: " + DEFAULT_SOCKET + ")")
+    compile_cmd = sub.add_parser("compile", help="compile a file on a running server")
+    compile_cmd.add_argument("--socket", default=DEFAULT_SOCKET, help="socket path (default: " + DEFAULT_SOCKET + ")")
+    compile_cmd.add_argument("source")
+    compile_cmd.add_argument("-o", dest="output", help="assembly output file")
+    compile_cmd.add_argument("-v", dest="verbose", action="store_true", help="report the latency")
+    args = argp.parse_args()
+
+    if args.command == "serve":
+        serve(args.socket)
+        return 0
+    return client_main(args)
+
+
+if __name__ == "__main__":
+    sys.exit(server_main())
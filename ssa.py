@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+"""Static single assignment form of the temporaries of a unit.
+Lowering creates a new temporary for every value, but the optimizations can
+assign the same temporary more than once; in SSA form every temporary has
+exactly one definition again, and phi nodes pick the right one where
+different definitions meet. Variables in memory are not touched.
+The phi nodes only live in the SSAForm (by basic block), while the
+statements are renamed in place, so the code generator never sees them:
+destruct() replaces the phis with copies (UnaryStat 'plus') in the StatList
+before register allocation."""
+
+from ir import PhiStat, UnaryStat, EmptyStat, BranchStat
+
+
+def is_temporary(symbol):
+    return symbol is not None and symbol.alloct == 'reg'
+
+
+def uses(stat):
+    return [getattr(stat, s) for s in stat.use_slots]
+
+
+def defs(stat):
+    return [getattr(stat, s) for s in stat.def_slots]
+
+
+class SSAForm(object):
+    """SSA form of the temporaries of a cfg.CFG, built by the constructor
+    (semi-pruned: phi nodes are placed only for the temporaries that are live
+    across basic blocks). ctx is the CompilationContext of the unit, for
+    the new temporaries."""
+
+    def __init__(self, cfg, ctx):
+        self.cfg = cfg
+        self.ctx = ctx
+        self.dom = cfg.dominators()
+        self.phis = [[] for bb in cfg]  # block -> its phi nodes
+        self.place_phis()
+        self.rename()
+
+    def place_phis(self):
+        defsites = {}  # temporary -> blocks assigning it
+        nonlocal_temps = set()  # temporaries used in a block before being assigned there
+        for b, bb in enumerate(self.cfg):
+            assigned = set()
+            for i in bb.instrs:
+                for v in uses(i):
+                    if is_temporary(v) and v not in assigned:
+                        nonlocal_temps.add(v)
+                for v in defs(i):
+                    if is_temporary(v):
+                        assigned.add(v)
+                        defsites.setdefault(v, set()).add(b)
+
+        df = self.dom.frontiers()
+        for v, sites in defsites.items():
+            if v not in nonlocal_temps or len(sites) < 2 and not any(df[b] for b in sites):
+                continue
+            has_phi = set()
+            work = sorted(sites)
+            while work:
+                for d in sorted(df[work.pop()]):
+                    if d not in has_phi:
+                        has_phi.add(d)
+                        self.phis[d].append(PhiStat(var=v, symtab=self.cfg[d].instrs[0].symtab))
+                        if d not in sites:
+                            work.append(d)
+
+    def rename(self):
+        """Give each definition a temporary of its own (the first one met keeps
+        the original), visiting the dominator tree in pre-order"""
+        names = {}  # original temporary -> stack of the names currently reaching
+        first = set()
+
+        def define(v):
+            if v in first:
+                name = self.ctx.new_temporary(v.stype)
+            else:
+                first.add(v)
+                name = v
+            names.setdefault(v, []).append(name)
+            return name
+
+        children = self.dom.children()
+        work = [(True, e) for e in reversed(self.dom.entries)]
+        while work:
+            enter, b = work.pop()
+            if not enter:
+                for v in b:  # the temporaries defined in the block
+                    names[v].pop()
+                continue
+            defined = []
+            for phi in self.phis[b]:
+                phi.dest = define(phi.var)
+                defined.append(phi.var)
+            for i in self.cfg[b].instrs:
+                for slot in i.use_slots:
+                    stack = names.get(getattr(i, slot))
+                    if stack:
+                        setattr(i, slot, stack[-1])
+                for slot in i.def_slots:
+                    v = getattr(i, slot)
+                    if is_temporary(v):
+                        setattr(i, slot, define(v))
+                        defined.append(v)
+            for s in self.dom.succ[b]:
+                for phi in self.phis[s]:
+                    stack = names.get(phi.var)
+                    phi.srcs[b] = stack[-1] if stack else phi.var
+            work.append((False, defined))
+            work.extend((True, c) for c in reversed(children[b]))
+
+    def destruct(self):
+        """Leave SSA form: each phi gets a new temporary, assigned at the end of
+        every predecessor and copied to the destination of the phi at the
+        beginning of its block. The new temporary keeps the copies of
+        different phis (or of the same phi, along different edges) from
+        clobbering each other, so no edge needs to be split."""
+        for b, phis in enumerate(self.phis):
+            after = None
+            for phi in phis:
+                tmp = self.ctx.new_temporary(phi.dest.stype)
+                for p, src in phi.srcs.items():
+                    self.insert_at_end(p, UnaryStat(dest=tmp, op='plus', src=src, symtab=phi.symtab))
+                after = self.insert_at_start(b, UnaryStat(dest=phi.dest, op='plus', src=tmp, symtab=phi.symtab),
+                                             after)
+        self.phis = [[] for bb in self.cfg]
+
+    def insert_at_end(self, b, stat):
+        """Insert stat in block b, before its final branch if there is one"""
+        instrs = self.cfg[b].instrs
+        last = instrs[-1]
+        if isinstance(last, BranchStat) and not last.returns:
+            last.parent.children.insert_before(last, stat)
+            instrs.insert(len(instrs) - 1, stat)
+        else:
+            last.parent.children.insert_after(last, stat)
+            instrs.append(stat)
+
+    def insert_at_start(self, b, stat, after=None):
+        """Insert stat at the beginning of block b, after its label and after
+        the statement after (if not None). Returns stat"""
+        instrs = self.cfg[b].instrs
+        if after is None:
+            first = instrs[0]
+            if first.get_label() and not isinstance(first, EmptyStat):
+                # the label must stay before the new statement
+                after = EmptyStat(symtab=first.symtab)
+                after.set_label(first.get_label())
+                first.label = None
+                first.parent.children.insert_before(first, after)
+                instrs.insert(0, after)
+            elif first.get_label():
+                after = first
+        if after is None:
+            instrs[0].parent.children.insert_before(instrs[0], stat)
+            instrs.insert(0, stat)
+        else:
+            after.parent.children.insert_after(after, stat)
+            instrs.insert(instrs.index(after) + 1, stat)
+        return stat
+
+    def __repr__(self):
+        res = ''
+        for b, bb in enumerate(self.cfg):
+            res += 'BB' + repr(b) + ' idom ' + repr(self.dom.idom[b]) + '\n'
+            for phi in self.phis[b]:
+                res += '\t' + phi.human_repr() + '\n'
+            for i in bb.instrs:
+                res += '\t' + repr(i) + '\n'
+        return res
@@ -5,121 +5,75 @@ the same thing in this compiler).
 These functions expose high level interfaces (passes) for actions that can be
 applied to multiple IR nodes."""
 
+from ir import postorder
 
-def get_node_list(root):
-    """Get a list of all nodes in the AST"""
 
-    def register_nodes(l):
-        def r(node):
-            if node not in l:
-                l.append(node)
+def iter_nodes(root, kind=None):
+    """Generate all the nodes of the tree rooted in root, in post-order (the
+    same order navigate() uses), each one only once even if it can be reached
+    from more than one slot. If kind is given (a class, or a tuple of
+    classes) only the nodes of that kind are generated.
+    Runs in linear time; being a generator, the tree should not be modified
+    while iterating on it (use get_node_list() for that)."""
+    seen = set()
+    for node in postorder(root):
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        if kind is None or isinstance(node, kind):
+            yield node
 
-        return r
 
-    node_list = []
-    root.navigate(register_nodes(node_list))
-    return node_list
+def get_node_list(root, kind=None):
+    """Get a list of all nodes in the AST (of the given kind)"""
+    return list(iter_nodes(root, kind))
+
+
+def count_nodes(root):
+    return sum(1 for n in iter_nodes(root))
 
 
 def get_symbol_tables(root):
     """Get a list of all symtabs in the AST"""
+    seen = set()
+    res = []
+    for node in iter_nodes(root):
+        for symtab in (node.symtab, getattr(node, 'global_symtab', None)):
+            if symtab is not None and id(symtab) not in seen:
+                seen.add(id(symtab))
+                res.append(symtab)
+    return res
+
+
+class Visitor(object):
+    """Base class for the passes that handle each class of nodes in a
+    different way. visit(root) calls, for every node in post-order, the method
+    visit_<class name> for the class of the node or for the closest of its
+    base classes that has one; generic_visit() is called for the nodes with no
+    such method. The result of the pass is whatever the methods accumulate in
+    the visitor object."""
+
+    def __init__(self):
+        self._methods = {}
+
+    def visit(self, root):
+        for node in iter_nodes(root):
+            self.dispatch(node)
+        return self
+
+    def dispatch(self, node):
+        cls = type(node)
+        method = self._methods.get(cls)
+        if method is None:
+            method = self.generic_visit
+            for base in cls.__mro__:
+                if hasattr(self, 'visit_' + base.__name__):
+                    method = getattr(self, 'visit_' + base.__name__)
+                    break
+            self._methods[cls] = method
+        return method(node)
+
+    def generic_visit(self, node):
+        pass
+
 
-    def register_nodes(l):
-        def r(node):
-            try:
-                if node.symtab not in l:
-                    l.append(node.symtab)
-            except Exception:
-                pass
-            try:
-                if node.lc_sym not in l:
-                    l.append(node.symtab)
-            except Exception:
-                pass
-
-        return r
-
-    node_list = []
-    root.navigate(register_nodes(node_list))
-    return node_list
-
-
-def lowering(node):
-    """Lowering action for a node
-    (all high level nodes can be lowered to lower-level representation"""
-    try:
-        check = node.lower()
-        print('Lowering', type(node), id(node))
-        if not check:
-            print('Failed!')
-    except Exception as e:
-        print('Cannot lower', id(node), type(node), e)
-        pass  # lowering not yet implemented for this class
-
-
-def flattening(node):
-    """Flattening action for a node
-    (only StatList nodes are actually flattened)"""
-    try:
-        check = node.flatten()
-        print('Flattening', type(node), id(node))
-        if not check:
-            print('Failed!')
-    except Exception as e:
-        # print type(node), e
-        pass  # this type of node cannot be flattened
-
-
-def dotty_wrapper(fout):
-    """Main function for graphviz dot output generation"""
-
-    def dotty_function(irnode):
-        from ir import Stat
-        attrs = {'body', 'cond', 'thenpart', 'elsepart', 'call', 'step', 'expr', 'target', 'defs'} & set(
-            dir(irnode))
-
-        res = repr(id(irnode)) + ' ['
-        if isinstance(irnode, Stat):
-            res += 'shape=box,'
-        res += 'label="' + repr(type(irnode)) + ' ' + repr(id(irnode))
-        try:
-            res += ': ' + irnode.value
-        except Exception:
-            pass
-        try:
-            res += ': ' + irnode.name
-        except Exception:
-            pass
-        try:
-            res += ': ' + getattr(irnode, 'symbol').name
-        except Exception:
-            pass
-        res += '" ];\n'
-
-        if 'children' in dir(irnode) and len(irnode.children):
-            for node in irnode.children:
-                res += repr(id(irnode)) + ' -> ' + repr(id(node)) + ' [pos=' + repr(
-                    irnode.children.index(node)) + '];\n'
-                if type(node) == str:
-                    res += repr(id(node)) + ' [label=' + node + '];\n'
-        for d in attrs:
-            node = getattr(irnode, d)
-            if d == 'target':
-                res += repr(id(irnode)) + ' -> ' + repr(id(node.value)) + ' [label=' + node.name + '];\n'
-            else:
-                res += repr(id(irnode)) + ' -> ' + repr(id(node)) + ';\n'
-        fout.write(res)
-        return res
-
-    return dotty_function
-
-
-def print_dotty(root, filename):
-    """Print a graphviz dot representation to file"""
-    fout = open(filename, "w")
-    fout.write("digraph G {\n")
-    node_list = get_node_list(root)
-    dotty = dotty_wrapper(fout)
-    for n in node_list:
-        dotty(n)
-    fout.write("}\n")
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+
+"""Compact three-address code for the backend.
+The low level statements of a unit are encoded in parallel arrays (opcode,
+dest, srca, srcb, imm), one element per statement, with the symbols replaced
+by dense integer ids. Every instruction kills at most its dest and uses at
+most its srca and srcb, so the CFG, the liveness analysis (on bitsets: bit i
+stands for the symbol with id i) and the register allocation read the arrays
+directly, instead of asking each Stat for new lists of uses and kills.
+The code generator still works on the Stat objects (TACFunction.stats), with
+the register allocation computed here. Enabled by main.py --tac; the
+generated code is the same."""
+
+from array import array
+
+from ir import StatList, EmptyStat, BranchStat, LoadStat, LoadImmStat, LoadPtrToSym, StoreStat, BinStat, \
+    UnaryStat, PrintCommand, ReadCommand, RetStat
+from regalloc import LinearScanRegisterAllocator
+from support import iter_nodes
+from tracing import tracer
+
+_trace = tracer('cfg')
+
+# opcodes; the operands not listed are NONE
+NOP = 0  # no operation (a placeholder for a label)
+LOAD = 1  # dest <- srca (a variable, or a pointer if srca is a register); srcb: use hint
+LOADIMM = 2  # dest <- imm
+LOADPTR = 3  # dest <- &srca
+STORE = 4  # dest <- srca (a variable in memory)
+STORE_IND = 5  # [srcb] <- srca; dest: kill hint
+BIN = 6  # dest <- srca OPERATORS[imm] srcb
+UN = 7  # dest <- OPERATORS[imm] srca
+BRANCH = 8  # branch to the label imm
+BRANCH_TRUE = 9  # branch to the label imm if srca
+BRANCH_FALSE = 10  # branch to the label imm if not srca
+CALL = 11  # call the function imm
+PRINT = 12  # print srca
+READ = 13  # dest <- number read
+RET = 14  # return srca
+
+OPCODE_NAMES = ('nop', 'load', 'loadimm', 'loadptr', 'store', 'store_ind', 'bin', 'un', 'branch',
+                'branch_true', 'branch_false', 'call', 'print', 'read', 'ret')
+
+BRANCHES = (BRANCH, BRANCH_TRUE, BRANCH_FALSE)
+
+OPERATORS = ('plus', 'minus', 'times', 'slash', 'eql', 'neq', 'lss', 'leq', 'gtr', 'geq', 'odd')
+
+NONE = -1
+
+
+class TACFunction(object):
+    """The low level statements of a unit (see units.py) in three-address form"""
+
+    def __init__(self, root):
+        self.op = array('B')
+        self.dest = array('i')
+        self.srca = array('i')
+        self.srcb = array('i')
+        self.imm = array('q')
+        self.symbols = []  # id -> Symbol
+        self.ids = {}  # Symbol -> id
+        self.isreg = bytearray()  # id -> whether the symbol is a temporary
+        self.labels = {}  # instruction -> id of its label
+        self.stats = []  # instruction -> the Stat it encodes
+        # (first, last + 1, symbols live at the exit) for the code of each
+        # StatList, i.e. of each function in the unit
+        self.lists = []
+        for sl in iter_nodes(root, StatList):
+            start = len(self.op)
+            for stat in sl.children:
+                self.append(stat)
+            fun = sl.get_function()
+            exit_live = 0
+            if fun != 'global':
+                for sym in fun.get_global_symbols():
+                    exit_live |= 1 << self.id(sym)
+            self.lists.append((start, len(self.op), exit_live))
+
+    def __len__(self):
+        return len(self.op)
+
+    def id(self, symbol):
+        if symbol is None:
+            return NONE
+        i = self.ids.get(symbol)
+        if i is None:
+            i = self.ids[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+            self.isreg.append(symbol.alloct == 'reg')
+        return i
+
+    def emit(self, op, dest=NONE, srca=NONE, srcb=NONE, imm=0):
+        self.op.append(op)
+        self.dest.append(dest)
+        self.srca.append(srca)
+        self.srcb.append(srcb)
+        self.imm.append(imm)
+
+    def append(self, stat):
+        encode = _ENCODERS.get(type(stat))
+        if encode is None:
+            raise RuntimeError('no three-address form for ' + type(stat).__name__)
+        label = stat.get_label()
+        if label:
+            self.labels[len(self.op)] = self.id(label)
+        self.stats.append(stat)
+        encode(self, stat)
+
+    def symbol_set(self, bits):
+        """The symbols in a bitset"""
+        res = set()
+        while bits:
+            low = bits & -bits
+            res.add(self.symbols[low.bit_length() - 1])
+            bits ^= low
+        return res
+
+    def human_repr(self, i):
+        ops = [self.symbols[x].name if x >= 0 else '-' for x in (self.dest[i], self.srca[i], self.srcb[i])]
+        return OPCODE_NAMES[self.op[i]] + ' ' + ' '.join(ops) + ' ' + repr(self.imm[i])
+
+
+def _encode_store(tac, stat):
+    if stat.dest.alloct == 'reg':
+        tac.emit(STORE_IND, tac.id(stat.killhint), tac.id(stat.symbol), tac.id(stat.dest))
+    else:
+        tac.emit(STORE, tac.id(stat.dest), tac.id(stat.symbol))
+
+
+def _encode_branch(tac, stat):
+    if stat.returns:
+        tac.emit(CALL, imm=tac.id(stat.target))
+    elif stat.cond is None:
+        tac.emit(BRANCH, imm=tac.id(stat.target))
+    else:
+        tac.emit(BRANCH_FALSE if stat.negcond else BRANCH_TRUE, srca=tac.id(stat.cond), imm=tac.id(stat.target))
+
+
+_ENCODERS = {
+    EmptyStat: lambda tac, stat: tac.emit(NOP),
+    LoadStat: lambda tac, stat: tac.emit(LOAD, tac.id(stat.dest), tac.id(stat.symbol), tac.id(stat.usehint)),
+    LoadImmStat: lambda tac, stat: tac.emit(LOADIMM, tac.id(stat.dest), imm=stat.val),
+    LoadPtrToSym: lambda tac, stat: tac.emit(LOADPTR, tac.id(stat.dest), tac.id(stat.symbol)),
+    StoreStat: _encode_store,
+    BinStat: lambda tac, stat: tac.emit(BIN, tac.id(stat.dest), tac.id(stat.srca), tac.id(stat.srcb),
+                                        OPERATORS.index(stat.op)),
+    UnaryStat: lambda tac, stat: tac.emit(UN, tac.id(stat.dest), tac.id(stat.src), imm=OPERATORS.index(stat.op)),
+    BranchStat: _encode_branch,
+    PrintCommand: lambda tac, stat: tac.emit(PRINT, srca=tac.id(stat.src)),
+    ReadCommand: lambda tac, stat: tac.emit(READ, tac.id(stat.dest)),
+    RetStat: lambda tac, stat: tac.emit(RET, srca=tac.id(stat.use)),
+}
+
+
+class TACCFG(object):
+    """Control flow graph of a TACFunction. Basic block b is made of the
+    instructions from start[b] to end[b] (excluded); next[b] is the block
+    that follows it (NONE after an unconditional branch) and target[b] the
+    block it branches to (NONE if it does not end with a branch). Procedure
+    calls do not end a basic block."""
+
+    def __init__(self, tac):
+        self.tac = tac
+        self.start = array('i')
+        self.end = array('i')
+        self.next = array('i')
+        self.target = array('i')
+        self.exit_live = []  # block -> symbols live when leaving the function from it
+        self.live_in = []
+        self.live_out = []
+
+        label_block = {}  # label id -> block
+        op = tac.op
+        for start, end, exit_live in tac.lists:
+            first = len(self.start)
+            bstart = start
+            for i in range(start, end):
+                if i in tac.labels:
+                    if i > bstart:
+                        self._add(bstart, i, exit_live)
+                        bstart = i
+                    label_block[tac.labels[i]] = len(self.start)
+                if op[i] in BRANCHES:
+                    self._add(bstart, i + 1, exit_live)
+                    bstart = i + 1
+            if bstart < end:
+                self._add(bstart, end, exit_live)
+            # fall through to the next block of the same function
+            for b in range(first, len(self.start) - 1):
+                if op[self.end[b] - 1] != BRANCH:
+                    self.next[b] = b + 1
+
+        for b in range(len(self.start)):
+            last = self.end[b] - 1
+            if op[last] in BRANCHES:
+                try:
+                    self.target[b] = label_block[tac.imm[last]]
+                except KeyError:
+                    raise Exception(repr(tac.symbols[tac.imm[last]]) + ' not found in any BB!')
+
+    def _add(self, start, end, exit_live):
+        self.start.append(start)
+        self.end.append(end)
+        self.next.append(NONE)
+        self.target.append(NONE)
+        self.exit_live.append(exit_live)
+
+    def __len__(self):
+        return len(self.start)
+
+    def succ(self, b):
+        return [s for s in (self.target[b], self.next[b]) if s != NONE]
+
+    def preds(self):
+        """block -> list of its predecessors"""
+        res = [[] for b in range(len(self))]
+        for b in range(len(self)):
+            for s in self.succ(b):
+                res[s].append(b)
+        return res
+
+    def gen_kill(self, b):
+        """Bitsets of the symbols used before being assigned in block b, and of
+        those assigned in it"""
+        tac = self.tac
+        gen = kill = 0
+        for i in range(self.start[b], self.end[b]):
+            a, s, d = tac.srca[i], tac.srcb[i], tac.dest[i]
+            if a >= 0:
+                gen |= (1 << a) & ~kill
+            if s >= 0:
+                gen |= (1 << s) & ~kill
+            if d >= 0:
+                kill |= 1 << d
+        return gen, kill
+
+    def liveness(self):
+        """Live variable analysis, with a worklist. The blocks with no
+        successors leave the function, so the global symbols are live there"""
+        n = len(self)
+        gen = [0] * n
+        kill = [0] * n
+        for b in range(n):
+            gen[b], kill[b] = self.gen_kill(b)
+        self.live_in = [0] * n
+        self.live_out = [0] * n
+        preds = self.preds()
+        work = list(range(n))  # popped from the end, i.e. backwards
+        queued = [True] * n
+        while work:
+            b = work.pop()
+            queued[b] = False
+            succ = self.succ(b)
+            if succ:
+                out = 0
+                for s in succ:
+                    out |= self.live_in[s]
+            else:
+                out = self.exit_live[b]
+            self.live_out[b] = out
+            live_in = gen[b] | (out & ~kill[b])
+            if live_in != self.live_in[b]:
+                self.live_in[b] = live_in
+                for p in preds[b]:
+                    if not queued[p]:
+                        queued[p] = True
+                        work.append(p)
+
+    def print_liveness(self):
+        _trace('Liveness sets')
+        for b in range(len(self)):
+            _trace('BB', b, 'instructions', self.start[b], '-', self.end[b], 'next', self.next[b],
+                   'target', self.target[b])
+            _trace('live_in:', self.tac.symbol_set(self.live_in[b]))
+            _trace('live_out:', self.tac.symbol_set(self.live_out[b]))
+
+
+class TACRegisterAllocator(LinearScanRegisterAllocator):
+    """Linear scan register allocation on a TACCFG: the same algorithm, with
+    the liveness intervals read from the arrays"""
+
+    def compute_liveness_intervals(self):
+        tac = self.cfg.tac
+        isreg = tac.isreg
+        min_gen = {}
+        max_use = {}
+        # the blocks cover all the instructions, in order
+        for i in range(len(tac)):
+            d = tac.dest[i]
+            if d >= 0 and isreg[d] and d not in min_gen:
+                min_gen[d] = max_use[d] = i
+            for s in (tac.srca[i], tac.srcb[i]):
+                if s >= 0 and isreg[s]:
+                    max_use[s] = i
+        # the temporaries live across blocks, as in LinearScanRegisterAllocator
+        cfg = self.cfg
+        for b in range(len(cfg)):
+            for live, i in ((cfg.live_in[b], cfg.start[b]), (cfg.live_out[b], cfg.end[b])):
+                while live:
+                    low = live & -live
+                    live ^= low
+                    v = low.bit_length() - 1
+                    if isreg[v]:
+                        min_gen[v] = min(min_gen.get(v, i), i)
+                        max_use[v] = max(max_use.get(v, i), i)
+        # a temporary that is never used still needs a register where it is assigned
+        self.varliveness = [{"var": tac.symbols[v], "interv": range(min_gen[v], max(max_use[v], min_gen[v] + 1))}
+                            for v in sorted(max_use, key=lambda v: min_gen[v])]
+        self.allvars = [tac.symbols[v] for v in max_use]
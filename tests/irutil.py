@@ -0,0 +1,124 @@
+"""Helpers for the tests: lowered programs, hand-built low-level IR and an
+interpreter for it"""
+
+import lexer
+import parser
+from datalayout import perform_data_layout
+from ir import StatList, LoadImmStat, LoadStat, StoreStat, BinStat, UnaryStat, BranchStat, PrintCommand, \
+    EmptyStat, TYPENAMES
+from context import CompilationContext
+from passes import BINARY, UNARY, _wrap
+from regalloc import SPILL_FLAG
+from units import split_units
+
+
+def counting_loop(n=10):
+    """A loop carrying two values in temporaries:
+        i := 0; s := 0
+        while i < n do begin s := s + i; i := i + 1 end
+        print s; print i
+    Returns the context and the StatList"""
+    ctx = CompilationContext()
+    integer = TYPENAMES['int']
+    i, s, limit, cond, one = [ctx.new_temporary(integer) for k in range(5)]
+    head = ctx.new_label()
+    done = ctx.new_label()
+    test = LoadImmStat(dest=limit, val=n)
+    test.set_label(head)
+    exit = PrintCommand(src=s)
+    exit.set_label(done)
+    code = StatList(children=[
+        LoadImmStat(dest=i, val=0),
+        LoadImmStat(dest=s, val=0),
+        test,
+        BinStat(dest=cond, op='lss', srca=i, srcb=limit),
+        BranchStat(cond=cond, target=done, negcond=True),
+        LoadImmStat(dest=one, val=1),
+        BinStat(dest=s, op='plus', srca=s, srcb=i),
+        BinStat(dest=i, op='plus', srca=i, srcb=one),
+        BranchStat(target=head),
+        exit,
+        PrintCommand(src=i),
+    ])
+    return ctx, code
+
+
+def diamond(cond):
+    """A temporary assigned in both arms of an if:
+        if cond then x := 10 else x := 20; print x
+    Returns the context and the StatList"""
+    ctx = CompilationContext()
+    integer = TYPENAMES['int']
+    c, x = ctx.new_temporary(integer), ctx.new_temporary(integer)
+    other = ctx.new_label()
+    join = ctx.new_label()
+    else_ = LoadImmStat(dest=x, val=20)
+    else_.set_label(other)
+    end = PrintCommand(src=x)
+    end.set_label(join)
+    code = StatList(children=[
+        LoadImmStat(dest=c, val=cond),
+        BranchStat(cond=c, target=other, negcond=True),
+        LoadImmStat(dest=x, val=10),
+        BranchStat(target=join),
+        else_,
+        end,
+    ])
+    return ctx, code
+
+
+def run(code, vartoreg=None, limit=10000):
+    """Execute a flat StatList, returning what it prints. With vartoreg (see
+    regalloc.RegisterAllocation) the temporaries share the registers they
+    were allocated to, so that a wrong allocation changes the result.
+    Variables in memory start from 0; arrays, calls and reads are not
+    supported"""
+    def where(var):
+        if vartoreg is None or vartoreg.get(var, SPILL_FLAG) == SPILL_FLAG:
+            return var
+        return vartoreg[var]
+
+    stats = list(code.children)
+    labels = {stat.get_label(): k for k, stat in enumerate(stats) if stat.get_label()}
+    values = {}
+    out = []
+    pc = 0
+    while pc < len(stats):
+        limit -= 1
+        if limit < 0:
+            raise RuntimeError('the program does not terminate')
+        stat = stats[pc]
+        pc += 1
+        if isinstance(stat, LoadImmStat):
+            values[where(stat.dest)] = stat.val
+        elif isinstance(stat, LoadStat) and stat.symbol.alloct != 'reg':
+            values[where(stat.dest)] = values.get(stat.symbol, 0)
+        elif isinstance(stat, StoreStat) and stat.dest.alloct != 'reg':
+            values[stat.dest] = values[where(stat.symbol)]
+        elif isinstance(stat, BinStat):
+            val = BINARY[stat.op](values[where(stat.srca)], values[where(stat.srcb)])
+            if val is None:
+                raise ZeroDivisionError(repr(stat))
+            values[where(stat.dest)] = _wrap(val)
+        elif isinstance(stat, UnaryStat):
+            values[where(stat.dest)] = _wrap(UNARY[stat.op](values[where(stat.src)]))
+        elif isinstance(stat, BranchStat):
+            if stat.cond is None or bool(values[where(stat.cond)]) != stat.negcond:
+                pc = labels[stat.target]
+        elif isinstance(stat, PrintCommand):
+            out.append(values[where(stat.src)])
+        elif not isinstance(stat, EmptyStat):
+            raise NotImplementedError(type(stat).__name__)
+    return out
+
+
+def lowered_units(source):
+    """The units of a program, lowered and laid out, as compile_program()
+    leaves them before the optimization passes"""
+    ctx = CompilationContext()
+    program = parser.Parser(lexer.Lexer(source), ctx).program()
+    units = split_units(program, ctx)
+    for unit in units:
+        unit.lower()
+    perform_data_layout(program)
+    return units
@@ -0,0 +1,91 @@
+import contextlib
+import io
+import unittest
+
+from bench import generate_program
+from ir import PrintCommand
+from tests.irutil import lowered_units
+
+LOOPS = '''VAR i, j, k;
+BEGIN
+  i := 3;
+  while i > 0 do begin
+    j := 2;
+    while j > 0 do begin print j; j := j - 1 end;
+    i := i - 1
+  end;
+  k := 2;
+  while k > 0 do begin print k; k := k - 1 end
+END.
+'''
+
+
+def function_cfgs(source):
+    with contextlib.redirect_stderr(io.StringIO()):
+        units = lowered_units(source)
+    return [cfg for unit in units for cfg in unit.build_cfg().functions]
+
+
+def dominator_sets(dom):
+    """The dominators of each block, by iterating to a fixpoint"""
+    n = len(dom.idom)
+    res = [{b} if b in dom.entries else set(range(n)) for b in range(n)]
+    changed = True
+    while changed:
+        changed = False
+        for b in range(n):
+            if b in dom.entries:
+                continue
+            new = {b} | set.intersection(*[res[p] for p in dom.preds[b]])
+            if new != res[b]:
+                res[b] = new
+                changed = True
+    return res
+
+
+class DominatorsTest(unittest.TestCase):
+    def test_against_fixpoint(self):
+        for cfg in function_cfgs(generate_program(40, 3, seed=1)) + function_cfgs(LOOPS):
+            dom = cfg.dominators()
+            sets = dominator_sets(dom)
+            n = len(cfg)
+            for b in range(n):
+                strict = sets[b] - {b}
+                # the immediate dominator is the closest, i.e. the one dominated by all the others
+                idom = [d for d in strict if sets[d] == strict] or [None]
+                self.assertEqual(dom.idom[b], idom[0])
+                for a in range(n):
+                    self.assertEqual(dom.dominates(a, b), a in sets[b])
+            frontiers = dom.frontiers()
+            for a in range(n):
+                expected = {b for b in range(n) if any(a in sets[p] for p in dom.preds[b])
+                            and not (a in sets[b] and a != b)}
+                self.assertEqual(frontiers[a], expected)
+
+
+class LoopNestTest(unittest.TestCase):
+    def test_nesting(self):
+        cfg, = function_cfgs(LOOPS)
+        loops = cfg.loops()
+        self.assertEqual(sorted(loop.depth for loop in loops), [1, 1, 2])
+        inner, = [loop for loop in loops if loop.depth == 2]
+        self.assertIn(inner, inner.parent.children)
+        self.assertTrue(inner.blocks < inner.parent.blocks)
+        depths = [cfg.loop_depth(bb) for bb in cfg if any(isinstance(s, PrintCommand) for s in bb.instrs)]
+        self.assertEqual(depths, [2, 1])
+        self.assertEqual(cfg.loop_depth(cfg.entry), 0)
+
+    def test_headers_dominate_their_loops(self):
+        for cfg in function_cfgs(generate_program(40, 3, seed=2)):
+            dom = cfg.dominators()
+            for loop in cfg.loops():
+                for b in loop.blocks:
+                    self.assertTrue(dom.dominates(loop.header, b))
+                for latch in loop.latches:
+                    self.assertIn(loop.header, dom.succ[latch])
+                if loop.parent is not None:
+                    self.assertTrue(loop.blocks < loop.parent.blocks)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import os
+import tempfile
+import unittest
+
+from batch import collect_sources, check_outputs, compile_batch
+from bench import generate_program
+
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.sources = []
+        for d in ('a', 'b'):
+            os.mkdir(os.path.join(self.tmp.name, d))
+            for name, seed in (('prog', 0), (d, 1)):
+                self.sources.append(os.path.join(self.tmp.name, d, name + '.pl0'))
+                with open(self.sources[-1], 'w') as f:
+                    f.write(generate_program(5, 1, seed))
+        self.outdir = os.path.join(self.tmp.name, 'obj')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_same_name_in_different_directories(self):
+        with self.assertRaises(ValueError):
+            check_outputs(self.sources, self.outdir)
+        with self.assertRaises(ValueError):
+            list(compile_batch(self.sources, self.outdir, 1))
+        self.assertFalse(os.path.exists(self.outdir))
+
+    def test_files_given_twice(self):
+        a = os.path.join(self.tmp.name, 'a')
+        sources = collect_sources([a, os.path.join(a, 'a.pl0'), os.path.join(self.tmp.name, 'b', 'b.pl0')])
+        self.assertEqual([os.path.basename(s) for s in sources], ['a.pl0', 'prog.pl0', 'b.pl0'])
+        check_outputs(sources, self.outdir)
+
+    def test_compile(self):
+        sources = [s for s in self.sources if os.path.basename(s) != 'prog.pl0']
+        results = list(compile_batch(sources, self.outdir, 2))
+        self.assertEqual([r['source'] for r in results], sources)
+        for r in results:
+            self.assertTrue(r['ok'], r['error'])
+            self.assertTrue(os.path.getsize(r['output']))
+
+
+if __name__ == '__main__':
+    unittest.main()
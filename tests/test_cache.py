@@ -0,0 +1,54 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from bench import generate_program
+from cache import CompileCache, compiler_modules
+from lexer import MappedLexer, read_source
+from main import compile_cached, compile_program
+
+
+class CacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = CompileCache(os.path.join(self.tmp.name, 'cache'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_compiler_modules(self):
+        modules = compiler_modules()
+        for name in ('main', 'lowering', 'regalloc', 'ssa', 'tac', 'serialize'):  # some imported on demand
+            self.assertIn(name, modules)
+        for name in ('bench', 'batch', 'server'):
+            self.assertNotIn(name, modules)
+
+    def test_mmap_and_text_have_the_same_key(self):
+        path = os.path.join(self.tmp.name, 'prog.pl0')
+        with open(path, 'wb') as f:
+            f.write(generate_program(5).replace('\n', '\r\n').encode() + b'{ \xff }\r\n')
+        with MappedLexer.open(path) as lex:
+            mapped = self.cache.key(lex.text, {'passes': 'dce'})
+        self.assertEqual(self.cache.key(read_source(path), {'passes': 'dce'}), mapped)
+
+    def test_hit(self):
+        source = generate_program(10, 2)
+        code = compile_cached(source, self.cache)
+        self.assertEqual(self.cache.hits, 0)
+        self.assertEqual(compile_cached(source, self.cache), code)
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_unchanged_procedures_are_reused(self):
+        compile_cached(generate_program(10, 3), self.cache)
+        hits = self.cache.hits
+        changed = generate_program(10, 3).replace('END.', '; print x END.')
+        with contextlib.redirect_stderr(io.StringIO()):
+            code = compile_cached(changed, self.cache)
+            self.assertEqual(code, compile_program(changed))
+        self.assertEqual(self.cache.hits - hits, 3)  # all but the main program
+
+
+if __name__ == '__main__':
+    unittest.main()
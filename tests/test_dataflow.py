@@ -0,0 +1,126 @@
+import contextlib
+import io
+import unittest
+
+from analysis import successors, predecessors
+from bench import generate_program
+from cfg import CFG, ReachingDefinitions, AvailableExpressions, VeryBusyExpressions
+from context import CompilationContext
+from ir import Symbol, StatList, LoadImmStat, LoadStat, StoreStat, BinStat, BranchStat, TYPENAMES
+from tests.irutil import lowered_units
+from tests.test_analysis import LOOPS
+
+
+def naive(df):
+    """The facts at the beginning and at the end of each block, found again
+    by iterating on sets, one statement at a time, until nothing changes"""
+    cfg = df.cfg
+    n = len(cfg)
+    succ = successors(cfg)
+    preds = predecessors(succ)
+    src = preds if df.forward else succ
+    before = [None] * n
+    after = [set() if df.may else set(df.facts) for b in range(n)]
+    changed = True
+    while changed:
+        changed = False
+        for b in range(n):
+            if src[b]:
+                sets = [after[p] for p in src[b]]
+                x = set().union(*sets) if df.may else set.intersection(*sets)
+            else:
+                x = df.fact_set(df.boundary(cfg[b]))
+            before[b] = x
+            for stat in (cfg[b].instrs if df.forward else reversed(cfg[b].instrs)):
+                gen, kill = df.dispatch(stat)
+                x = df.fact_set(gen) | (x - df.fact_set(kill))
+            if x != after[b]:
+                after[b] = x
+                changed = True
+    return (before, after) if df.forward else (after, before)
+
+
+class SolverTest(unittest.TestCase):
+    def test_against_naive_fixpoint(self):
+        sources = [generate_program(30, 3, seed=seed) for seed in range(3)] + [LOOPS]
+        for source in sources:
+            with contextlib.redirect_stderr(io.StringIO()):
+                units = lowered_units(source)
+            for cfg in [cfg for unit in units for cfg in unit.build_cfg().functions]:
+                for analysis in (ReachingDefinitions, AvailableExpressions, VeryBusyExpressions):
+                    with self.subTest(analysis=analysis.__name__):
+                        df = cfg.dataflow(analysis)
+                        ins, outs = naive(df)
+                        self.assertEqual([df.fact_set(x) for x in df.ins], ins)
+                        self.assertEqual([df.fact_set(x) for x in df.outs], outs)
+                        for b in range(len(cfg)):
+                            facts = df.stat_facts(b)
+                            if facts:
+                                self.assertEqual(facts[0][1], df.ins[b])
+                                self.assertEqual(facts[-1][2], df.outs[b])
+                                for (s, before, after), nxt in zip(facts, facts[1:]):
+                                    self.assertEqual(after, nxt[1])
+
+
+class ReachingDefinitionsTest(unittest.TestCase):
+    def setUp(self):
+        ctx = CompilationContext()
+        integer = TYPENAMES['int']
+        self.x = Symbol('x', integer)
+        self.y = Symbol('y', integer)
+        one, a, b = [ctx.new_temporary(integer) for k in range(3)]
+        self.stats = {
+            'one': LoadImmStat(dest=one, val=1),
+            'x': StoreStat(dest=self.x, symbol=one),
+            'y': StoreStat(dest=self.y, symbol=one),
+            'call': BranchStat(target=Symbol('f', TYPENAMES['function']), returns=True),
+            'x again': StoreStat(dest=self.x, symbol=one),
+            'load y': LoadStat(dest=a, symbol=self.y),
+            'load x': LoadStat(dest=b, symbol=self.x),
+        }
+        self.cfg = CFG(StatList(children=list(self.stats.values())))
+        self.df = self.cfg.dataflow(ReachingDefinitions)
+
+    def reaching(self, name, var):
+        return self.df.reaching(self.stats[name], 0, var)
+
+    def test_call_reaches_the_variables_not_assigned_since(self):
+        s = self.stats
+        self.assertEqual(self.reaching('load y', self.y), {s['y'], s['call']})
+        self.assertEqual(self.reaching('load x', self.x), {s['x again']})
+
+    def test_call_kills_nothing(self):
+        s = self.stats
+        self.assertEqual(self.reaching('call', self.x), {s['x']})
+        self.assertEqual(self.reaching('x again', self.x), {s['x'], s['call']})
+
+
+class AvailableExpressionsTest(unittest.TestCase):
+    def test_straight_line(self):
+        ctx = CompilationContext()
+        integer = TYPENAMES['int']
+        x = Symbol('x', integer)
+        a, b, c, d, e, f, g = [ctx.new_temporary(integer) for k in range(7)]
+        stats = [
+            LoadImmStat(dest=a, val=1),
+            LoadStat(dest=b, symbol=x),
+            BinStat(dest=c, op='plus', srca=a, srcb=b),
+            BinStat(dest=d, op='plus', srca=a, srcb=b),  # 1: a + b and the load of x
+            StoreStat(dest=x, symbol=d),
+            BinStat(dest=e, op='plus', srca=a, srcb=b),  # 2: only a + b
+            LoadImmStat(dest=a, val=2),
+            BinStat(dest=f, op='plus', srca=a, srcb=b),  # 3: nothing
+            LoadStat(dest=g, symbol=x),  # 4: the new a + b
+        ]
+        cfg = CFG(StatList(children=stats))
+        df = cfg.dataflow(AvailableExpressions)
+        before = {id(s): df.fact_set(x) for b in range(len(cfg)) for s, x, after in df.stat_facts(b)}
+        plus, load = ('plus', a, b), ('load', x)
+        self.assertEqual(before[id(stats[3])], {plus, load})
+        self.assertEqual(before[id(stats[5])], {plus})
+        self.assertEqual(before[id(stats[7])], set())
+        self.assertEqual(before[id(stats[8])], {plus})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import random
+import unittest
+
+from ir import StatList, StatSeq, EmptyStat
+
+
+class StatSeqTest(unittest.TestCase):
+    def check(self, stats, model):
+        self.assertEqual(list(stats.children), model)
+        self.assertEqual(list(reversed(stats.children)), model[::-1])
+        self.assertEqual(len(stats.children), len(model))
+        for stat in model:
+            self.assertIn(stat, stats.children)
+            self.assertIs(stat.parent, stats)
+
+    def test_against_a_list(self):
+        rnd = random.Random(0)
+        stats = StatList()
+        model = []
+        gone = []
+        for step in range(2000):
+            op = rnd.randrange(6) if model else 0
+            if op == 0:
+                stat = EmptyStat()
+                stats.children.append(stat)
+                model.append(stat)
+            elif op in (1, 2):
+                i = rnd.randrange(len(model))
+                stat = EmptyStat()
+                if op == 1:
+                    stats.children.insert_before(model[i], stat)
+                    model.insert(i, stat)
+                else:
+                    stats.children.insert_after(model[i], stat)
+                    model.insert(i + 1, stat)
+            elif op == 3:
+                stat = model.pop(rnd.randrange(len(model)))
+                stats.children.remove(stat)
+                gone.append(stat)
+            elif op == 4:
+                i = rnd.randrange(len(model))
+                gone.append(model[i])
+                model[i] = EmptyStat()
+                stats.children.replace(gone[-1], model[i])
+            else:
+                other = StatList(children=[EmptyStat() for k in range(rnd.randrange(3))])
+                more = list(other.children)
+                stats.children.extend(other.children)
+                model += more
+                self.assertEqual(len(other.children), 0)
+            if step % 100 == 0:
+                self.check(stats, model)
+        self.check(stats, model)
+        for stat in gone:
+            self.assertNotIn(stat, stats.children)
+
+    def test_insert_at_the_ends(self):
+        stats = StatList(children=[EmptyStat()])
+        first, last = EmptyStat(), EmptyStat()
+        stats.children.insert_after(None, first)
+        stats.children.insert_before(None, last)
+        self.assertIs(next(iter(stats.children)), first)
+        self.assertIs(next(reversed(stats.children)), last)
+
+    def test_replace_while_iterating(self):
+        stats = StatList(children=[EmptyStat() for k in range(5)])
+        new = []
+        for stat in stats.children:
+            new.append(EmptyStat())
+            stats.children.replace(stat, new[-1])
+        self.check(stats, new)
+
+    def test_extend_from_another_owner(self):
+        stats = StatList(children=[EmptyStat()])
+        seq = StatSeq(StatList(), [EmptyStat(), EmptyStat()])
+        moved = list(seq)
+        stats.children.extend(seq)
+        self.assertEqual(list(stats.children)[1:], moved)
+        self.check(stats, list(stats.children))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import contextlib
+import io
+import os
+import unittest
+
+from bench import generate_program
+from lexer import Lexer, MappedLexer, KEYWORDS
+from main import compile_program
+
+SRCDIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+ODD_CORNERS = '''VAR dots, x1, Xy;  { a comment: begin end }
+BEGIN
+  dots := 12 + x1*3;{unterminated
+  ? Xy; !Xy; BeGiN x1 := x1++ END;
+  if dots <= 4 then if x1 >= 2 then x1 := 0 else x1 != 3
+END.'''
+
+
+def sources():
+    yield 'generated', generate_program(30, 3)
+    yield 'corners', ODD_CORNERS
+    yield 'crlf', ODD_CORNERS.replace('\n', '\r\n')
+    yield 'illegal', 'VAR x; BEGIN x := 1 & 2 END.'
+    yield 'non-ascii', 'VAR café; BEGIN café := 1 END.'
+    for name in sorted(os.listdir(SRCDIR)):
+        with open(os.path.join(SRCDIR, name), newline='') as f:
+            yield name, f.read()
+
+
+def token_stream(lexer):
+    """(token, value, line, col) of each token; the values as the parser
+    sees them, i.e. keywords in lower case and numbers as strings"""
+    res = []
+    for t, v in lexer.tokens():
+        v = lexer.value(v)
+        if t in KEYWORDS.values():
+            v = v.lower()
+        res.append((t, str(v), lexer.line, lexer.col))
+    return res
+
+
+class LexerTest(unittest.TestCase):
+    def test_mapped_lexer_matches(self):
+        for name, text in sources():
+            with self.subTest(source=name):
+                expected = token_stream(Lexer(text))
+                self.assertEqual(expected[-1][0], 'illegal')
+                self.assertEqual(token_stream(MappedLexer(text.encode())), expected)
+
+    def test_same_code(self):
+        for name, text in sources():
+            with self.subTest(source=name), contextlib.redirect_stderr(io.StringIO()), \
+                    contextlib.redirect_stdout(io.StringIO()):
+                try:
+                    expected = compile_program(text)
+                except Exception as e:
+                    with self.assertRaises(type(e)):
+                        compile_program(MappedLexer(text.encode()))
+                else:
+                    self.assertEqual(compile_program(MappedLexer(text.encode())), expected)
+
+    def test_keywords_are_whole_words(self):
+        tokens = [t for t, v in Lexer('do dots Begin beginning 12ab').tokens()]
+        self.assertEqual(tokens, ['dosym', 'ident', 'beginsym', 'ident', 'number', 'ident', 'illegal'])
+
+
+if __name__ == '__main__':
+    unittest.main()
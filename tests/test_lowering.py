@@ -0,0 +1,50 @@
+import contextlib
+import io
+import os
+import unittest
+
+from bench import generate_program
+from ir import StatList, Block, FunctionDef
+from main import compile_program
+from support import iter_nodes
+from tests.irutil import lowered_units
+
+SRCDIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+NESTED = '''VAR x;
+PROCEDURE outer(p)
+VAR a;
+  PROCEDURE inner(q)
+  VAR b;
+  BEGIN b := 2; print b END
+BEGIN a := 1; call inner; print a END
+BEGIN x := 3; call outer; print x END.
+'''
+
+
+def sources():
+    yield 'generated', generate_program(20, 3)
+    yield 'nested', NESTED
+    for name in ('for.pl0', 'inc.pl0', 'prog0.pl0', 'prog1.pl0', 'while.pl0'):
+        with open(os.path.join(SRCDIR, name)) as f:
+            yield name, f.read()
+
+
+class LoweringTest(unittest.TestCase):
+    def test_bodies_are_flat(self):
+        for name, source in sources():
+            with self.subTest(source=name), contextlib.redirect_stderr(io.StringIO()):
+                for unit in lowered_units(source):
+                    for stats in iter_nodes(unit.root(), StatList):
+                        self.assertIsInstance(stats.parent, Block)
+                        self.assertIsInstance(stats.parent.parent, (FunctionDef, type(None)))
+                        self.assertEqual([s for s in stats.children if isinstance(s, StatList)], [])
+
+    def test_no_node_left_without_code(self):
+        for name, source in sources():
+            with self.subTest(source=name), contextlib.redirect_stderr(io.StringIO()):
+                self.assertNotIn('irnode', compile_program(source))
+
+
+if __name__ == '__main__':
+    unittest.main()
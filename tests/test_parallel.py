@@ -0,0 +1,40 @@
+import contextlib
+import io
+import unittest
+
+from bench import generate_program
+from main import compile_program
+from passes import pipeline
+from serialize import dump_unit
+from tests.irutil import lowered_units
+from units import backend_job
+
+
+def compile_quietly(source, **kwargs):
+    with contextlib.redirect_stderr(io.StringIO()):
+        return compile_program(source, **kwargs)
+
+
+class ParallelBackendTest(unittest.TestCase):
+    def test_same_code_as_serial(self):
+        for seed in range(2):
+            source = generate_program(40, 4, seed=seed)
+            for options in ({}, {'tac': True}, {'passes': pipeline(2)}):
+                with self.subTest(seed=seed, options=sorted(options)):
+                    self.assertEqual(compile_quietly(source, jobs=2, **options),
+                                     compile_quietly(source, **options))
+
+    def test_backend_job(self):
+        with contextlib.redirect_stderr(io.StringIO()):
+            units = lowered_units(generate_program(20, 2))
+        for unit in units:
+            res = backend_job((dump_unit(unit), 11, False))
+            unit.build_cfg().liveness()
+            unit.allocate_registers(11)
+            self.assertEqual(res['code'], unit.codegen())
+            self.assertEqual(res['basic_blocks'], len(unit.cfg))
+            self.assertEqual(res['spills'], unit.regalloc.numspill)
+
+
+if __name__ == '__main__':
+    unittest.main()
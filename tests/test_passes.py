@@ -0,0 +1,98 @@
+import contextlib
+import io
+import unittest
+
+from bench import generate_program
+from ir import BinStat, BranchStat, LoadImmStat
+from main import compile_program
+from passes import PassManager, pipeline, unit_size
+from tests.irutil import lowered_units, run
+
+
+def main_unit(source):
+    with contextlib.redirect_stderr(io.StringIO()):
+        return lowered_units(source)[0]
+
+
+def outcome(code):
+    """What the code prints, or the error that stops it; None if it does not
+    stop soon (the loops of the generated programs do not always end)"""
+    try:
+        return run(code, limit=20000)
+    except ZeroDivisionError:
+        return 'division by zero'
+    except RuntimeError:
+        return None
+
+
+class OptimizationLevelsTest(unittest.TestCase):
+    def test_same_output(self):
+        tested = 0
+        for seed in range(30):
+            source = generate_program(12, seed=seed)
+            expected = outcome(main_unit(source).root())
+            if expected is None:
+                continue
+            tested += 1
+            for level in (1, 2):
+                with self.subTest(seed=seed, level=level):
+                    unit = main_unit(source)
+                    PassManager(pipeline(level)).run(unit)
+                    self.assertEqual(outcome(unit.root()), expected)
+        self.assertGreater(tested, 10)
+
+    def test_constant_folding(self):
+        unit = main_unit('VAR x; BEGIN x := 2 * 3 + 1; print x END.')
+        before = unit_size(unit)
+        PassManager(pipeline(1)).run(unit)
+        stats = list(unit.root().children)
+        self.assertFalse([s for s in stats if isinstance(s, BinStat)])
+        self.assertIn(7, [s.val for s in stats if isinstance(s, LoadImmStat)])
+        self.assertLess(unit_size(unit), before)
+        self.assertEqual(run(unit.root()), [7])
+
+    def test_branch_folding(self):
+        source = 'VAR x; BEGIN if 1 < 2 then x := 1 else x := 2; while 0 > 1 do x := 3; print x END.'
+        for level, conditional in ((1, 2), (2, 0)):
+            with self.subTest(level=level):
+                unit = main_unit(source)
+                PassManager(pipeline(level)).run(unit)
+                branches = [s for s in unit.root().children if isinstance(s, BranchStat) and s.cond is not None]
+                self.assertEqual(len(branches), conditional)
+                self.assertEqual(run(unit.root()), [1])
+
+    def test_disabled_and_report(self):
+        self.assertEqual(pipeline(2, disabled=('dce',)), ['const-fold', 'branch-fold'])
+        unit = main_unit('VAR x; BEGIN x := 2 * 3; print x END.')
+        manager = PassManager(pipeline(2))
+        manager.run(unit)
+        report = manager.report()
+        self.assertEqual([r['pass'] for r in report], pipeline(2))
+        self.assertTrue(all(r['runs'] == 1 for r in report))
+        self.assertTrue(report[0]['changed'])
+        self.assertLess(report[-1]['stats_after'], report[0]['stats_before'])
+
+    def test_analyses_are_reused(self):
+        unit = main_unit('VAR x; BEGIN x := 1; print x END.')
+        manager = PassManager([])
+        manager.require(unit, 'liveness')
+        cfg = unit.cfg
+        manager.require(unit, 'dominators')
+        manager.require(unit, 'liveness')
+        self.assertIs(unit.cfg, cfg)
+        manager.invalidate(unit)
+        manager.require(unit, 'cfg')
+        self.assertIsNot(unit.cfg, cfg)
+
+    def test_compile(self):
+        source = generate_program(20, 3)
+        with contextlib.redirect_stderr(io.StringIO()):
+            plain = compile_program(source)
+            for level in (1, 2):
+                code = compile_program(source, passes=pipeline(level))
+                self.assertIn('__pl0_start', code)
+                self.assertLessEqual(code.count('\n'), plain.count('\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import contextlib
+import io
+import os
+import re
+import unittest
+
+from bench import generate_program
+from serialize import dump_unit, load_unit, FORMAT_VERSION, _HEADER
+from tests.irutil import lowered_units
+from tests.test_lowering import NESTED
+
+SRCDIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+
+def sources():
+    yield 'generated', generate_program(30, 3)
+    yield 'nested', NESTED
+    yield 'big constant', 'VAR x; BEGIN x := 5000000000; print x; x := -7 END.'
+    for name in ('for.pl0', 'inc.pl0', 'prog1.pl0', 'while.pl0'):
+        with open(os.path.join(SRCDIR, name)) as f:
+            yield name, f.read()
+
+
+def backend(unit):
+    unit.build_cfg().liveness()
+    unit.allocate_registers(11)
+    # the comment left for a node without code names it by its id()
+    return re.sub(r'node \d+', 'node', unit.codegen())
+
+
+class SerializeTest(unittest.TestCase):
+    def test_round_trip(self):
+        for name, source in sources():
+            with self.subTest(source=name), contextlib.redirect_stderr(io.StringIO()):
+                for unit in lowered_units(source):
+                    data = dump_unit(unit)
+                    loaded = load_unit(data)
+                    self.assertEqual(dump_unit(loaded), data)
+                    self.assertEqual(loaded.name, unit.name)
+                    self.assertEqual(backend(loaded), backend(unit))
+
+    def test_integer_width(self):
+        with contextlib.redirect_stderr(io.StringIO()):
+            small, = lowered_units('VAR x; BEGIN x := 2147483647 END.')
+            big, = lowered_units('VAR x; BEGIN x := 2147483648 END.')
+        self.assertEqual(_HEADER.unpack_from(dump_unit(small))[2], 4)
+        self.assertEqual(_HEADER.unpack_from(dump_unit(big))[2], 8)
+
+    def test_bad_data(self):
+        with contextlib.redirect_stderr(io.StringIO()):
+            unit = lowered_units(generate_program(5))[0]
+        data = dump_unit(unit)
+        magic, version, width, nstrings, nints = _HEADER.unpack_from(data)
+        with self.assertRaisesRegex(ValueError, 'not a serialized unit'):
+            load_unit(b'XXXX' + data[4:])
+        with self.assertRaisesRegex(ValueError, 'format'):
+            load_unit(_HEADER.pack(magic, FORMAT_VERSION + 1, width, nstrings, nints) + data[_HEADER.size:])
+        with self.assertRaisesRegex(ValueError, 'trailing data'):
+            load_unit(_HEADER.pack(magic, version, width, nstrings, nints + 1) + data[_HEADER.size:]
+                      + bytes(width))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+from server import request_compile
+
+SRCDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SOURCE = 'VAR x; BEGIN x := 2; print x END.'
+
+
+class ServerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.tmp.name, 'pl0.sock')
+        cls.log = open(os.path.join(cls.tmp.name, 'server.log'), 'w+')
+        cls.server = subprocess.Popen([sys.executable, 'server.py', 'serve', '--socket', cls.path], cwd=SRCDIR,
+                                      stderr=cls.log)
+        deadline = time.time() + 30
+        while not os.path.exists(cls.path):
+            if time.time() > deadline or cls.server.poll() is not None:
+                raise RuntimeError('the server did not start')
+            time.sleep(0.05)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.send_signal(signal.SIGINT)
+        cls.server.wait(30)
+        cls.log.close()
+        cls.tmp.cleanup()
+
+    def send(self, data, wait_reply=True):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.connect(self.path)
+            s.sendall(data)
+            s.shutdown(socket.SHUT_WR)
+            if wait_reply:
+                with s.makefile('rb') as f:
+                    return f.readline()
+
+    def assertServing(self):
+        res = request_compile(self.path, SOURCE, 'ok.pl0')
+        self.assertTrue(res['ok'], res['error'])
+        self.assertIn('__pl0_start', res['assembly'])
+
+    def test_compile(self):
+        self.assertServing()
+
+    def test_bad_requests(self):
+        for request in (b'[1, 2]\n', b'"text"\n', b'{"filename": "x"}\n', b'{not json\n'):
+            with self.subTest(request=request):
+                res = json.loads(self.send(request))
+                self.assertFalse(res['ok'])
+                self.assertTrue(res['error'].startswith('bad request'))
+
+    def test_empty_request(self):
+        self.assertEqual(self.send(b''), b'')
+        self.assertEqual(self.send(b'\n'), b'')
+        self.assertServing()
+
+    def test_client_gone(self):
+        for i in range(3):
+            self.send(json.dumps({'source': SOURCE, 'filename': 'gone.pl0'}).encode() + b'\n', wait_reply=False)
+        self.assertServing()
+        time.sleep(0.5)  # let the children log
+        self.log.seek(0)
+        self.assertNotIn('Traceback', self.log.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import contextlib
+import io
+import unittest
+
+from bench import generate_program
+from cfg import CFG
+from main import compile_program
+from regalloc import LinearScanRegisterAllocator
+from ssa import SSAForm
+from tac import TACFunction, TACCFG, TACRegisterAllocator
+from tests.irutil import counting_loop, diamond, run
+
+
+def allocate(code, ctx, nregs=11, tac=False):
+    if tac:
+        cfg = TACCFG(TACFunction(code))
+        cfg.liveness()
+        return TACRegisterAllocator(cfg, nregs, ctx)().vartoreg
+    cfg = CFG(code)
+    cfg.liveness()
+    return LinearScanRegisterAllocator(cfg, nregs, ctx)().vartoreg
+
+
+def definitions(ssa):
+    """temporary -> number of statements (or phis) assigning it"""
+    res = {}
+    for b, bb in enumerate(ssa.cfg):
+        for stat in ssa.phis[b] + bb.instrs:
+            for slot in stat.def_slots:
+                var = getattr(stat, slot)
+                if var is not None and var.alloct == 'reg':
+                    res[var] = res.get(var, 0) + 1
+    return res
+
+
+class SSATest(unittest.TestCase):
+    def test_loop(self):
+        ctx, code = counting_loop()
+        cfg = CFG(code)
+        ssa = SSAForm(cfg, ctx)
+        head = cfg.index(cfg.label_bb[next(s.get_label() for s in code.children if s.get_label())])
+        self.assertEqual(len(ssa.phis[head]), 2)
+        for phi in ssa.phis[head]:
+            self.assertEqual(len(phi.srcs), 2)  # from before the loop and from its body
+            self.assertNotEqual(*phi.srcs.values())
+        self.assertEqual([b for b, phis in enumerate(ssa.phis) if phis], [head])
+        self.assertEqual(set(definitions(ssa).values()), {1})
+        ssa.destruct()
+        self.assertEqual(run(code), [45, 10])
+
+    def test_if(self):
+        for cond, printed in ((1, [10]), (0, [20])):
+            with self.subTest(cond=cond):
+                ctx, code = diamond(cond)
+                cfg = CFG(code)
+                ssa = SSAForm(cfg, ctx)
+                self.assertEqual([len(phis) for phis in ssa.phis], [0, 0, 0, 1])
+                self.assertEqual(set(definitions(ssa).values()), {1})
+                ssa.destruct()
+                self.assertEqual(run(code), printed)
+
+    def test_lowered_code_needs_no_phis(self):
+        # lowering assigns each temporary once, so the round trip changes nothing yet
+        source = generate_program(30, 2)
+        with contextlib.redirect_stderr(io.StringIO()):
+            self.assertEqual(compile_program(source, passes=['ssa']), compile_program(source))
+
+
+class RegisterAllocationTest(unittest.TestCase):
+    def test_loop_carried_temporaries(self):
+        ctx, code = counting_loop()
+        self.assertEqual(run(code, allocate(code, ctx)), [45, 10])
+
+    def test_loop_carried_temporaries_after_ssa(self):
+        # the copies of the phis at the end of the loop body are used at the
+        # head of the loop, along the back edge
+        ctx, code = counting_loop()
+        SSAForm(CFG(code), ctx).destruct()
+        self.assertEqual(run(code), [45, 10])
+        for tac in (False, True):
+            for nregs in range(3, 12):  # down to spilling almost everything
+                with self.subTest(tac=tac, nregs=nregs):
+                    self.assertEqual(run(code, allocate(code, ctx, nregs, tac)), [45, 10])
+
+
+if __name__ == '__main__':
+    unittest.main()
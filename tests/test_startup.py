@@ -0,0 +1,29 @@
+import os
+import subprocess
+import sys
+import unittest
+
+import bench
+
+SRCDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# imported only when asked for by an option, or by the command line driver
+ON_DEMAND = ['argparse', 'cache', 'colored_traceback', 'dotty', 'profiler', 'serialize', 'ssa', 'tac',
+             'concurrent.futures']
+
+
+class StartupTest(unittest.TestCase):
+    def test_on_demand_modules_are_not_imported(self):
+        res = subprocess.run([sys.executable, '-c', 'import sys, main; print(*sys.modules)'], cwd=SRCDIR,
+                             stdout=subprocess.PIPE, universal_newlines=True, check=True)
+        loaded = set(res.stdout.split())
+        self.assertIn('main', loaded)
+        self.assertEqual([m for m in ON_DEMAND if m in loaded], [])
+
+    def test_import_time(self):
+        times = bench.import_times('main', 5)
+        self.assertLessEqual(times['main'], bench.IMPORT_BUDGET_MS)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+"""Leveled tracing facility shared by all the passes of the compiler.
+Each subsystem has its own tracer, and trace points are written as
+
+    if _trace.level >= DEBUG:
+        _trace("something happened to", node)
+
+so that when tracing is disabled a trace point costs one attribute lookup and
+a comparison, and its arguments are never evaluated.
+Levels are set with set_levels("parser=3,ir=2") (or "all=2"), or with the
+PL0_TRACE environment variable which uses the same syntax."""
+
+import os
+import sys
+
+OFF = 0
+INFO = 1  # one line per phase
+DEBUG = 2  # one line per IR node, symbol or basic block
+VERBOSE = 3  # one line per token or grammar production
+
+SUBSYSTEMS = ['driver', 'parser', 'ir', 'lowering', 'passes', 'cfg', 'regalloc', 'codegen']
+
+
+class Tracer(object):
+    """Trace points of a single subsystem"""
+
+    def __init__(self, name):
+        self.name = name
+        self.level = OFF
+        self.listeners = []
+
+    def __call__(self, *args):
+        print(self.name + ':', *args, file=stream or sys.stderr)
+
+    def set_level(self, level):
+        self.level = level
+        for listener in self.listeners:
+            listener(level)
+
+    def on_change(self, listener):
+        """Register a function to be called with the new level every time the
+        level of this tracer changes"""
+        self.listeners.append(listener)
+
+
+TRACERS = {name: Tracer(name) for name in SUBSYSTEMS}
+
+# where the traces go; None means sys.stderr
+stream = None
+
+
+def tracer(name):
+    return TRACERS[name]
+
+
+def set_levels(spec):
+    """Parse a specification like 'all=1,parser=3' and apply it"""
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        name, sep, level = item.partition('=')
+        name = name.strip()
+        level = int(level) if sep else DEBUG
+        if name == 'all':
+            for t in TRACERS.values():
+                t.set_level(level)
+        elif name in TRACERS:
+            TRACERS[name].set_level(level)
+        else:
+            raise ValueError('unknown trace subsystem ' + repr(name))
+
+
+def disable():
+    for t in TRACERS.values():
+        t.set_level(OFF)
+
+
+set_levels(os.environ.get('PL0_TRACE', ''))
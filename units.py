@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+
+"""Compilation units of the backend.
+Lowering, liveness analysis, register allocation and code generation work on
+one unit at a time: the main program (without its procedures) and each of the
+procedures defined in it (together with the procedures nested inside it).
+Every unit has its own CompilationContext, and the names of its labels start
+with the name of the procedure, so the assembly of a unit depends only on the
+unit itself. This is what makes it possible to reuse the assembly of the
+procedures that did not change since the last build: see fingerprint()."""
+
+import codegen  # defines the codegen() methods of the IR nodes
+from ir import IRNode, Block, FunctionDef, StatSeq, Symbol, Type
+from lowering import lower_block
+from cfg import UnitCFG
+from regalloc import LinearScanRegisterAllocator
+
+
+class Unit(object):
+    def __init__(self, node, ctx):
+        """node is either the Block of the main program, or a FunctionDef"""
+        self.node = node
+        self.ctx = ctx
+        self.key = None
+        self.code = None
+        self.tac = None
+        self.cfg = None
+        self.allocator = None
+        self.regalloc = None
+
+    @property
+    def name(self):
+        if isinstance(self.node, FunctionDef):
+            return self.node.symbol.name
+        return 'main'
+
+    def root(self):
+        """Root of the part of the tree that belongs to this unit"""
+        if isinstance(self.node, Block):
+            return self.node.body  # the procedures are units of their own
+        return self.node
+
+    def lookup(self, cache, options=None):
+        """Take the assembly of this unit from a cache.CompileCache, if it is
+        there. Returns True on a hit"""
+        self.key = cache.key(fingerprint(self), dict(options or {}, unit=True))
+        self.code = cache.get(self.key)
+        return self.code is not None
+
+    def lower(self):
+        if isinstance(self.node, Block):
+            lower_block(self.node, self.ctx, defs=False)
+        else:
+            lower_block(self.node.body, self.ctx)
+
+    def build_cfg(self, tac=False):
+        """With tac, the backend passes work on the compact three-address code
+        of tac.py instead of the Stat objects"""
+        if tac:
+            from tac import TACFunction, TACCFG
+            self.tac = TACFunction(self.root())
+            self.cfg = TACCFG(self.tac)
+        else:
+            self.tac = None
+            self.cfg = UnitCFG(self.root())
+        return self.cfg
+
+    def allocate_registers(self, nregs):
+        if self.tac is not None:
+            from tac import TACRegisterAllocator
+            self.allocator = TACRegisterAllocator(self.cfg, nregs, self.ctx)
+        else:
+            self.allocator = LinearScanRegisterAllocator(self.cfg, nregs, self.ctx)
+        self.regalloc = self.allocator()
+        return self.regalloc
+
+    def codegen(self):
+        if isinstance(self.node, Block):
+            self.code = self.node.codegen(self.regalloc, defs=False)
+        else:
+            self.code = self.node.codegen(self.regalloc)
+        return self.code
+
+
+def split_units(program, ctx):
+    """The units of a program: the main program first, then the procedures in
+    the order they are defined, which is also the order of their code"""
+    units = [Unit(program, ctx.unit_context(''))]
+    for fun in program.defs.children:
+        units.append(Unit(fun, ctx.unit_context(fun.symbol.name + '.')))
+    return units
+
+
+def backend_job(job):
+    """Worker process of parallel_backend(): the backend of a unit written by
+    serialize.dump_unit(). Returns its assembly and the numbers the profiler
+    records"""
+    import gc
+    from serialize import load_unit
+    data, nregs, tac = job
+    unit = load_unit(data)
+    # the tree of the unit lives until the end of the job: keep the cyclic
+    # garbage collector from scanning it again and again
+    gc.freeze()
+    try:
+        unit.build_cfg(tac).liveness()
+        unit.allocate_registers(nregs)
+        return {'code': unit.codegen(), 'basic_blocks': len(unit.cfg), 'temporaries': len(unit.allocator.allvars),
+                'spills': unit.regalloc.numspill}
+    finally:
+        gc.unfreeze()
+
+
+def parallel_backend(units, jobs, nregs, tac=False):
+    """Run the backend (CFG, liveness, register allocation and code
+    generation) of lowered and laid out units in a pool of jobs worker
+    processes, and set the code of each unit. The units travel to the workers
+    in the format of serialize.py, the largest first so that the small ones
+    fill the gaps at the end. The labels and literal pool entries of each
+    unit already have its prefix (see CompilationContext.unit_context()), so
+    the pieces need no renumbering. Returns the result of backend_job() for
+    each unit"""
+    from concurrent.futures import ProcessPoolExecutor
+    from serialize import dump_unit
+    data = [dump_unit(unit) for unit in units]
+    order = sorted(range(len(units)), key=lambda i: -len(data[i]))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {i: pool.submit(backend_job, (data[i], nregs, tac)) for i in order}
+        res = [futures[i].result() for i in range(len(units))]
+    for unit, r in zip(units, res):
+        unit.code = r['code']
+    return res
+
+
+def fingerprint(unit):
+    """Hash of everything the assembly of a unit depends on: its subtree (before
+    lowering), the symbols it refers to, and the local symbol tables that
+    determine the layout of its stack frames. Symbols and types are described
+    by value, so that the same procedure parsed again has the same
+    fingerprint."""
+    import hashlib
+    out = []
+    if isinstance(unit.node, Block):
+        # the code of the procedures is not part of the main program
+        _describe(unit.node, out, skip=('defs',))
+    else:
+        _describe(unit.node, out)
+    return hashlib.sha256('\0'.join(out).encode()).hexdigest()
+
+
+# attributes that do not affect the code of a node: the links to the enclosing
+# nodes, scopes and sibling statements (the symbols actually used are reached
+# through the nodes), and the results of the analyses
+_SKIP_ATTRS = ('parent', 'global_symtab', 'seq_prev', 'seq_next', 'live_in', 'live_out')
+
+# sorted attributes of each class of IR nodes
+_node_attrs = {}
+
+
+def _attrs(cls):
+    if cls not in _node_attrs:
+        _node_attrs[cls] = sorted(a for c in cls.__mro__ for a in getattr(c, '__slots__', ()))
+    return _node_attrs[cls]
+
+
+def _describe(obj, out, skip=()):
+    if isinstance(obj, IRNode):
+        out.append('(' + type(obj).__name__)
+        for attr in _attrs(type(obj)):
+            if attr in _SKIP_ATTRS or attr in skip:
+                continue
+            if attr == 'symtab' and not isinstance(obj, Block):
+                continue  # the scope, not the local symbols of a block
+            out.append(attr)
+            _describe(getattr(obj, attr, None), out)
+        out.append(')')
+    elif isinstance(obj, Symbol):
+        out.append('symbol ' + obj.name + ' ' + obj.alloct + ' ' + repr(obj.npar))
+        _describe(obj.stype, out)
+        if not isinstance(obj.value, IRNode):
+            out.append(repr(obj.value))
+    elif isinstance(obj, Type):
+        out.append('type ' + repr((type(obj).__name__, obj.name, obj.size, obj.qual_list,
+                                   getattr(obj, 'dims', None))))
+        _describe(obj.basetype, out)
+    elif isinstance(obj, (list, StatSeq)):  # children and symbol tables
+        out.append('[')
+        for x in obj:
+            _describe(x, out)
+        out.append(']')
+    else:
+        out.append(repr(obj))